@@ -0,0 +1,131 @@
+"""
+Admission control
+Bounds the number of requests being served and waiting, so that a burst is
+answered with fast rejections instead of every request timing out
+"""
+
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from batching import DeadlineExceeded
+
+
+class Overloaded(Exception):
+    """The server is at capacity; the client should retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Server is at capacity")
+        self.retry_after = retry_after
+
+
+def parse_deadline(value: str, received_at: float, default_ms: float = 0) -> float:
+    """
+    Turn a deadline header into an absolute time.perf_counter() deadline.
+
+    Args:
+        value: Header value, the time budget in milliseconds (None = not sent)
+        received_at: time.perf_counter() when the request arrived
+        default_ms: Budget applied when the header is missing (0 = no deadline)
+
+    Returns:
+        Deadline, or None if the request has none
+    """
+    budget_ms = default_ms
+    if value is not None:
+        try:
+            budget_ms = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid deadline: {value!r} (expected milliseconds)")
+    if not budget_ms or budget_ms < 0:
+        return None
+    return received_at + budget_ms / 1000.0
+
+
+def check_deadline(deadline: float):
+    """Raise DeadlineExceeded if the deadline has passed"""
+    if deadline is not None and time.perf_counter() >= deadline:
+        raise DeadlineExceeded("Deadline passed before the request was served")
+
+
+class AdmissionController:
+    """
+    Limits concurrent requests with a bounded wait queue.
+
+    Up to `max_in_flight` requests are served at once; up to `max_queue` more
+    wait for a slot. Anything beyond that is rejected immediately with
+    Overloaded, and a waiting request whose deadline passes is dropped with
+    DeadlineExceeded before it does any work.
+
+    Args:
+        max_in_flight: Requests served concurrently (0 disables admission control)
+        max_queue: Requests allowed to wait for a slot
+        retry_after: Seconds suggested to rejected clients
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, retry_after: int = 1):
+        self.max_in_flight = max(0, int(max_in_flight))
+        self.max_queue = max(0, int(max_queue))
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(self.max_in_flight or 1)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_in_flight > 0
+
+    async def acquire(self, deadline: float = None):
+        if not self.enabled:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise Overloaded(self.retry_after)
+
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                self.rejected["deadline"] += 1
+                raise DeadlineExceeded("Deadline passed before the request was admitted")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.rejected["deadline"] += 1
+            raise DeadlineExceeded("Deadline passed while waiting for admission")
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self):
+        self.in_flight -= 1
+        if self.enabled:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def admit(self, deadline: float = None):
+        """Hold a slot for the duration of a request"""
+        await self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
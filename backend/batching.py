@@ -0,0 +1,187 @@
+"""
+Dynamic micro-batching for model inference
+Collects concurrent requests into a single forward pass over the batch dimension
+"""
+
+import asyncio
+import time
+from collections import Counter, deque
+
+import numpy as np
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed before its request could be served"""
+
+
+class MicroBatcher:
+    """
+    Queue that groups concurrently submitted items into batches.
+
+    A single background task pulls the first waiting item, then keeps collecting
+    until either `max_batch_size` items are gathered or `max_wait_ms` has passed
+    since the first one arrived. The whole batch is handed to `batch_fn` in one
+    call and row `i` of its result is delivered to the i-th submitter. Items
+    whose deadline has passed by the time their batch forms are failed with
+    DeadlineExceeded instead of being run.
+
+    Args:
+        batch_fn: Callable taking a list of items and returning one result per item
+        max_batch_size: Upper bound on the number of items per forward pass
+        max_wait_ms: How long the first item of a batch may wait for company
+        executor: Executor used to run `batch_fn` (None = asyncio default)
+    """
+
+    def __init__(self, batch_fn, max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 executor=None, stats_window: int = 1024):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+
+        self._queue = None
+        self._task = None
+
+        # Statistics
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=stats_window)
+        self._batch_times = deque(maxlen=stats_window)
+        self._total_items = 0
+        self._total_batches = 0
+        self._total_errors = 0
+        self._total_expired = 0
+
+    def start(self):
+        """Start the background batching task (must be called inside a running loop)"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and fail anything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _, future, _, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, item, deadline: float = None):
+        """
+        Queue one item and wait for its result.
+
+        Args:
+            item: A single (unbatched) model input
+            deadline: time.perf_counter() value after which the item is dropped
+                instead of run (None = no deadline)
+
+        Returns:
+            The row of the batch result that belongs to this item
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter(), deadline))
+        return await future
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of items waiting to be picked up by the batching task"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _collect(self):
+        """Wait for the first item, then gather more until the batch is full or the wait expires"""
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Still take whatever is already waiting, just don't wait for more
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+
+            # Drop requests whose caller already went away
+            batch = [entry for entry in batch if not entry[1].done()]
+
+            # Drop requests that can no longer be answered in time
+            now = time.perf_counter()
+            live = []
+            for entry in batch:
+                deadline = entry[3]
+                if deadline is not None and deadline <= now:
+                    self._total_expired += 1
+                    entry[1].set_exception(DeadlineExceeded("Deadline passed while waiting for a batch"))
+                else:
+                    live.append(entry)
+            batch = live
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, enqueued_at, _ in batch:
+                self._queue_waits.append(started - enqueued_at)
+
+            items = [item for item, _, _, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            except Exception as e:
+                self._total_errors += len(batch)
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self._batch_times.append(time.perf_counter() - started)
+            self._batch_sizes[len(batch)] += 1
+            self._total_batches += 1
+            self._total_items += len(batch)
+
+            for (_, future, _, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self) -> dict:
+        """Batch-size histogram and queue-wait percentiles (milliseconds)"""
+        waits = np.array(self._queue_waits) * 1000.0
+        batch_times = np.array(self._batch_times) * 1000.0
+
+        def summary(values):
+            if values.size == 0:
+                return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+            return {
+                "mean": round(float(values.mean()), 3),
+                "p50": round(float(np.percentile(values, 50)), 3),
+                "p95": round(float(np.percentile(values, 95)), 3),
+                "p99": round(float(np.percentile(values, 99)), 3),
+                "max": round(float(values.max()), 3),
+            }
+
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self.queue_depth,
+            "total_items": self._total_items,
+            "total_batches": self._total_batches,
+            "total_errors": self._total_errors,
+            "total_expired": self._total_expired,
+            "mean_batch_size": round(self._total_items / self._total_batches, 3) if self._total_batches else 0.0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self._batch_sizes.items())},
+            "queue_wait_ms": summary(waits),
+            "batch_time_ms": summary(batch_times),
+        }
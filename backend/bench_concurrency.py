@@ -0,0 +1,137 @@
+"""
+Concurrency benchmark for the Action Recognition API
+
+Saturates /predict with concurrent clients while probing /health and /actions,
+to show whether lightweight endpoints stay responsive during inference.
+
+Usage (server must already be running):
+    python bench_concurrency.py --url http://localhost:8000 --clients 8 --duration 20
+
+Run it once against a server with blocking inference on the event loop and once
+against the current one to compare /health latency under load.
+"""
+
+import argparse
+import io
+import threading
+import time
+
+import numpy as np
+import requests
+from PIL import Image
+
+
+def make_images(count: int, size=(640, 480)) -> list:
+    """Create distinct random JPEG images (distinct so the prediction cache never hits)"""
+    rng = np.random.default_rng(42)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ms = np.array(values) * 1000.0
+    return {
+        "count": len(values),
+        "p50": round(float(np.percentile(ms, 50)), 1),
+        "p95": round(float(np.percentile(ms, 95)), 1),
+        "p99": round(float(np.percentile(ms, 99)), 1),
+        "max": round(float(ms.max()), 1),
+    }
+
+
+def predict_worker(url: str, images: list, stop: threading.Event, latencies: list, errors: list):
+    session = requests.Session()
+    i = 0
+    while not stop.is_set():
+        image = images[i % len(images)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                f"{url}/predict",
+                files={"file": ("bench.jpg", image, "image/jpeg")},
+                timeout=120
+            )
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(str(e))
+
+
+def probe_worker(url: str, path: str, interval: float, stop: threading.Event, latencies: list):
+    session = requests.Session()
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            session.get(f"{url}{path}", timeout=60).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            pass
+        time.sleep(interval)
+
+
+def run(url: str, clients: int, duration: float, probe_interval: float) -> dict:
+    images = make_images(256)
+
+    # Idle baseline for the probe endpoints
+    idle = {"/health": [], "/actions": []}
+    for _ in range(20):
+        for path in idle:
+            start = time.perf_counter()
+            requests.get(f"{url}{path}", timeout=60)
+            idle[path].append(time.perf_counter() - start)
+
+    stop = threading.Event()
+    predict_latencies, errors = [], []
+    loaded = {"/health": [], "/actions": []}
+
+    threads = [
+        threading.Thread(target=predict_worker, args=(url, images[i::clients], stop, predict_latencies, errors))
+        for i in range(clients)
+    ]
+    threads += [
+        threading.Thread(target=probe_worker, args=(url, path, probe_interval, stop, latencies))
+        for path, latencies in loaded.items()
+    ]
+
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "clients": clients,
+        "duration_s": round(elapsed, 2),
+        "predict_throughput_rps": round(len(predict_latencies) / elapsed, 2),
+        "predict_latency_ms": percentiles(predict_latencies),
+        "predict_errors": len(errors),
+        "health_idle_ms": percentiles(idle["/health"]),
+        "health_under_load_ms": percentiles(loaded["/health"]),
+        "actions_idle_ms": percentiles(idle["/actions"]),
+        "actions_under_load_ms": percentiles(loaded["/actions"]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark endpoint responsiveness under inference load")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent /predict clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of sustained load")
+    parser.add_argument("--probe-interval", type=float, default=0.05, help="Seconds between /health probes")
+    args = parser.parse_args()
+
+    print(f"Benchmarking {args.url} with {args.clients} clients for {args.duration}s...")
+    results = run(args.url, args.clients, args.duration, args.probe_interval)
+    for key, value in results.items():
+        print(f"{key}: {value}")
@@ -0,0 +1,198 @@
+"""
+Decode benchmark: full-size PIL decode versus the reduced-resolution path
+
+Times both decoders on synthetic photos at several resolutions and formats,
+reports how many pixels each one materialises and how far the decoded pixels
+differ, and checks that predictions made from the fast path stay within
+tolerance of the reference path. As a yardstick, the drift caused by adding
+half a grey level of noise to the reference pixels is reported alongside.
+JPEG runs include a photo tagged with EXIF orientation 6 (rotated 90 degrees),
+whose pixel difference is reported on its own so that a decoder honouring the
+tag while the reference ignores it shows up immediately.
+
+Usage:
+    python bench_decode.py
+    python bench_decode.py --resolutions 1080p 12mp --formats jpeg --images 32
+    python bench_decode.py --skip-drift
+
+Exits with status 1 if the prediction drift exceeds the tolerance.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+from PIL import Image
+
+from bench_serving import BACKEND_DIR, FORMATS, RESOLUTIONS, git_commit, make_image
+from imaging import DECODERS, decode_full, decode_reduced, jpeg_scale
+
+DEFAULT_MODEL = os.path.join(BACKEND_DIR, "..", "rebuilt_mobilenet.keras")
+EXIF_ORIENTATION = 0x0112
+
+
+def make_exif_rotated(width: int, height: int, seed: int) -> bytes:
+    """JPEG from make_image tagged with EXIF orientation 6, as phone cameras write portrait shots"""
+    image = Image.open(io.BytesIO(make_image(width, height, "JPEG", seed)))
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90, exif=exif)
+    return buffer.getvalue()
+
+
+def decoded_megapixels(image_bytes: bytes, img_size: int, reduced: bool) -> float:
+    """Size of the intermediate image each decoder produces before resizing"""
+    image = Image.open(io.BytesIO(image_bytes))
+    width, height = image.size
+    scale = jpeg_scale(width, height, img_size) if reduced and image.format == "JPEG" else 1
+    return round((width // scale) * (height // scale) / 1e6, 3)
+
+
+def time_decoder(decoder, images: list, img_size: int, repeats: int) -> float:
+    """Median milliseconds per image"""
+    for image in images[:2]:
+        decoder(image, img_size)
+    timings = []
+    for _ in range(repeats):
+        for image in images:
+            start = time.perf_counter()
+            decoder(image, img_size)
+            timings.append(time.perf_counter() - start)
+    return round(float(np.median(timings)) * 1000, 3)
+
+
+def pixel_difference(images: list, img_size: int) -> float:
+    """Mean absolute difference (grey levels) between the two decoders' outputs"""
+    diffs = [
+        np.abs(decode_full(image, img_size).astype(np.float32) - decode_reduced(image, img_size)).mean()
+        for image in images
+    ]
+    return round(float(np.mean(diffs)), 4)
+
+
+def compare_predictions(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    diff = np.abs(reference - candidate)
+    return {
+        "max_abs_diff": round(float(diff.max()), 6),
+        "mean_abs_diff": round(float(diff.mean()), 6),
+        "top1_agreement": round(float(np.mean(reference.argmax(axis=1) == candidate.argmax(axis=1))), 4),
+    }
+
+
+def measure_drift(serving_model, images: list) -> dict:
+    """Compare predictions from both decode paths (reference = full decode)"""
+    img_size = serving_model.img_size
+
+    def predict(frames):
+        return serving_model.predict_clips([pixels[np.newaxis] for pixels in frames])
+
+    reference_pixels = [decode_full(image, img_size) for image in images]
+    reference = predict(reference_pixels)
+    drift = compare_predictions(reference, predict([decode_reduced(image, img_size) for image in images]))
+
+    # How much the model moves for an imperceptible change of the same images
+    rng = np.random.default_rng(0)
+    noisy = [np.clip(np.rint(p + rng.normal(0, 0.5, p.shape)), 0, 255).astype(np.uint8) for p in reference_pixels]
+    drift["noise_floor"] = compare_predictions(reference, predict(noisy))
+    return drift
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark full versus reduced-resolution image decoding")
+    parser.add_argument("--resolutions", nargs="+", default=["480p", "1080p", "12mp"], choices=list(RESOLUTIONS))
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=list(FORMATS))
+    parser.add_argument("--images", type=int, default=16, help="Distinct images per resolution/format")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--img-size", type=int, default=128)
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Keras model used for the drift check")
+    parser.add_argument("--skip-drift", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="Maximum allowed mean absolute probability difference")
+    parser.add_argument("--output", default=None, help="JSON results file (default: bench_results/decode_<timestamp>.json)")
+    args = parser.parse_args()
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = args.output or os.path.join(BACKEND_DIR, "bench_results", f"decode_{timestamp}.json")
+
+    serving_model = None
+    if not args.skip_drift:
+        import keras
+        from serving_model import ServingModel
+
+        serving_model = ServingModel(keras.models.load_model(args.model, compile=False))
+        args.img_size = serving_model.img_size
+
+    results = []
+    within_tolerance = True
+    for resolution in args.resolutions:
+        width, height = RESOLUTIONS[resolution]
+        for fmt in args.formats:
+            image_format, _ = FORMATS[fmt]
+            images = [make_image(width, height, image_format, seed) for seed in range(args.images)]
+            rotated = make_exif_rotated(width, height, args.images) if image_format == "JPEG" else None
+            if rotated is not None:
+                images.append(rotated)
+
+            full_ms = time_decoder(decode_full, images, args.img_size, args.repeats)
+            reduced_ms = time_decoder(decode_reduced, images, args.img_size, args.repeats)
+            result = {
+                "resolution": resolution,
+                "format": fmt,
+                "decoder": DECODERS.get(image_format, "pil"),
+                "image_kb": round(float(np.mean([len(i) for i in images])) / 1024, 1),
+                "full_ms": full_ms,
+                "reduced_ms": reduced_ms,
+                "speedup": round(full_ms / reduced_ms, 2) if reduced_ms else None,
+                "full_decoded_megapixels": decoded_megapixels(images[0], args.img_size, reduced=False),
+                "reduced_decoded_megapixels": decoded_megapixels(images[0], args.img_size, reduced=True),
+                "pixel_mean_abs_diff": pixel_difference(images, args.img_size),
+            }
+            if rotated is not None:
+                result["exif_rotated_pixel_mean_abs_diff"] = pixel_difference([rotated], args.img_size)
+            if serving_model is not None:
+                drift = measure_drift(serving_model, images)
+                drift["within_tolerance"] = drift["mean_abs_diff"] <= args.tolerance
+                within_tolerance = within_tolerance and drift["within_tolerance"]
+                result["drift"] = drift
+
+            results.append(result)
+            line = (f"{resolution:>6} {fmt:>5} full {full_ms:>8.2f} ms  reduced {reduced_ms:>7.2f} ms  "
+                    f"x{result['speedup']:<5}  {result['full_decoded_megapixels']:>6.2f} -> "
+                    f"{result['reduced_decoded_megapixels']:.2f} MP  pixels +-{result['pixel_mean_abs_diff']:.2f}")
+            if rotated is not None:
+                line += f" (EXIF-rotated +-{result['exif_rotated_pixel_mean_abs_diff']:.2f})"
+            if "drift" in result:
+                line += (f"  drift {result['drift']['mean_abs_diff']:.4f} top1 {result['drift']['top1_agreement']:.2f}"
+                         f" (noise floor {result['drift']['noise_floor']['mean_abs_diff']:.4f})")
+            print(line)
+
+    report = {
+        "benchmark": "decode",
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "tolerance": None if args.skip_drift else args.tolerance,
+        "within_tolerance": None if args.skip_drift else within_tolerance,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+    if not within_tolerance:
+        print(f"❌ Prediction drift exceeds tolerance ({args.tolerance})")
+        sys.exit(1)
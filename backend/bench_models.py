@@ -0,0 +1,227 @@
+"""
+Model micro-benchmark for the LRCN architectures in this repo
+
+Builds each backbone/head family and times the per-frame CNN backbone separately
+from the LSTM/Dense head across batch sizes, sequence lengths and input resolutions.
+Reports ms/clip, clips/s, peak RSS and parameter / FLOP counts.
+
+Architectures (matching the rebuild scripts in the repository root):
+- efficientnetb0: EfficientNetB0 -> BN -> LSTM(64) -> Dense(128) -> Dense(50), 10 x 112 x 112
+  (rebuild_model.py, final_rebuild.py, robust_rebuild.py)
+- mobilenetv2: MobileNetV2 -> BN -> LSTM(128) -> LSTM(64) -> Dense(256) -> Dense(50), 12 x 128 x 128
+  (rebuild_mobilenet.py)
+
+Weights are randomly initialised (no download needed); timings do not depend on them.
+
+Usage:
+    python bench_models.py
+    python bench_models.py --archs mobilenetv2 --batch-sizes 1 8 32 --resolutions 96 128 160 --sequence-lengths 8 12 16
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+from datetime import datetime, timezone
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+from runinfo import BACKEND_DIR, git_commit, process_memory_mb
+
+NUM_CLASSES = 50
+
+ARCHITECTURES = {
+    "efficientnetb0": {"sequence_length": 10, "img_size": 112},
+    "mobilenetv2": {"sequence_length": 12, "img_size": 128},
+}
+
+
+def build_backbone(arch: str, img_size: int):
+    """Per-frame CNN feature extractor (global-average pooled)"""
+    from keras.applications import EfficientNetB0, MobileNetV2
+
+    application = EfficientNetB0 if arch == "efficientnetb0" else MobileNetV2
+    backbone = application(
+        include_top=False,
+        weights=None,
+        pooling='avg',
+        input_shape=(img_size, img_size, 3)
+    )
+    backbone.trainable = False
+    return backbone
+
+
+def build_head(arch: str, feature_dim: int):
+    """Temporal head; the time dimension is left open so one head serves every sequence length"""
+    import keras
+    from keras import layers
+
+    inputs = layers.Input(shape=(None, feature_dim))
+    x = layers.BatchNormalization()(inputs)
+    if arch == "efficientnetb0":
+        x = layers.LSTM(64, return_sequences=False)(x)
+        x = layers.Dropout(0.4)(x)
+        x = layers.Dense(128, activation='relu')(x)
+    else:
+        x = layers.LSTM(128, return_sequences=True)(x)
+        x = layers.Dropout(0.4)(x)
+        x = layers.LSTM(64, return_sequences=False)(x)
+        x = layers.Dropout(0.4)(x)
+        x = layers.Dense(256, activation='relu')(x)
+    x = layers.Dropout(0.4)(x)
+    outputs = layers.Dense(NUM_CLASSES, activation='softmax')(x)
+    return keras.Model(inputs, outputs)
+
+
+def count_flops(keras_model, input_shape: list) -> int:
+    """Floating point operations for one forward pass (None if the TF profiler is unavailable)"""
+    try:
+        import tensorflow as tf
+        from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+        from tensorflow.python.profiler.model_analyzer import profile
+        from tensorflow.python.profiler.option_builder import ProfileOptionBuilder
+
+        concrete = tf.function(lambda x: keras_model(x, training=False)).get_concrete_function(
+            tf.TensorSpec(input_shape, tf.float32)
+        )
+        frozen = convert_variables_to_constants_v2(concrete)
+        options = ProfileOptionBuilder(ProfileOptionBuilder.float_operation()).with_empty_output().build()
+        return int(profile(graph=frozen.graph, options=options).total_float_ops)
+    except Exception as e:
+        print(f"  FLOP count unavailable: {e}")
+        return None
+
+
+def estimate_head_flops(head, sequence_length: int) -> int:
+    """
+    Analytical FLOPs of the head for one clip (multiply-add = 2 FLOPs).
+
+    The TF profiler cannot see inside the LSTM while-loop, so LSTM and Dense
+    layers are counted from their configs; BatchNorm/activations are negligible.
+    """
+    import keras
+
+    flops = 0
+    for layer in head.layers:
+        if isinstance(layer, keras.layers.LSTM):
+            input_dim = layer.input.shape[-1]
+            units = layer.units
+            flops += sequence_length * 2 * 4 * units * (input_dim + units)
+        elif isinstance(layer, keras.layers.Dense):
+            flops += 2 * layer.input.shape[-1] * layer.units
+    return int(flops)
+
+
+def time_call(func, x, repeats: int, warmup: int) -> float:
+    """Median seconds per call after warm-up (first calls trace the graph)"""
+    for _ in range(warmup):
+        func(x)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(x)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def bench_arch(arch: str, resolutions: list, sequence_lengths: list, batch_sizes: list,
+               repeats: int, warmup: int) -> list:
+    results = []
+    rng = np.random.default_rng(0)
+
+    for img_size in resolutions:
+        backbone = build_backbone(arch, img_size)
+        feature_dim = backbone.output_shape[-1]
+        head = build_head(arch, feature_dim)
+
+        backbone_params = int(backbone.count_params())
+        head_params = int(head.count_params())
+        backbone_flops = count_flops(backbone, [1, img_size, img_size, 3])
+
+        for sequence_length in sequence_lengths:
+            head_flops = estimate_head_flops(head, sequence_length)
+
+            for batch_size in batch_sizes:
+                frames = rng.uniform(-1, 1, (batch_size * sequence_length, img_size, img_size, 3)).astype(np.float32)
+                features = rng.normal(0, 1, (batch_size, sequence_length, feature_dim)).astype(np.float32)
+
+                backbone_s = time_call(backbone.predict_on_batch, frames, repeats, warmup)
+                head_s = time_call(head.predict_on_batch, features, repeats, warmup)
+                total_s = backbone_s + head_s
+
+                result = {
+                    "arch": arch,
+                    "img_size": img_size,
+                    "sequence_length": sequence_length,
+                    "batch_size": batch_size,
+                    "backbone_ms_per_clip": round(backbone_s * 1000 / batch_size, 3),
+                    "head_ms_per_clip": round(head_s * 1000 / batch_size, 3),
+                    "ms_per_clip": round(total_s * 1000 / batch_size, 3),
+                    "clips_per_second": round(batch_size / total_s, 2),
+                    "backbone_share": round(backbone_s / total_s, 4),
+                    "backbone_params": backbone_params,
+                    "head_params": head_params,
+                    "backbone_flops_per_clip": backbone_flops * sequence_length if backbone_flops else None,
+                    "head_flops_per_clip": head_flops,
+                    "memory": process_memory_mb(),
+                }
+                results.append(result)
+                print(f"{arch:>14} {img_size:>4}px T={sequence_length:<3} B={batch_size:<3} "
+                      f"backbone {result['backbone_ms_per_clip']:>8.2f} ms  head {result['head_ms_per_clip']:>7.2f} ms  "
+                      f"total {result['ms_per_clip']:>8.2f} ms/clip  {result['clips_per_second']:>8.2f} clips/s")
+
+        # Free the graphs before building the next resolution
+        del backbone, head
+        import keras
+        keras.backend.clear_session()
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark LRCN backbones and heads")
+    parser.add_argument("--archs", nargs="+", default=list(ARCHITECTURES), choices=list(ARCHITECTURES))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--sequence-lengths", type=int, nargs="+", default=None,
+                        help="Default: each architecture's own sequence length")
+    parser.add_argument("--resolutions", type=int, nargs="+", default=None,
+                        help="Default: each architecture's own input resolution")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", default=None, help="JSON results file (default: bench_results/models_<timestamp>.json)")
+    args = parser.parse_args()
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = args.output or os.path.join(BACKEND_DIR, "bench_results", f"models_{timestamp}.json")
+
+    results = []
+    for arch in args.archs:
+        spec = ARCHITECTURES[arch]
+        results += bench_arch(
+            arch,
+            args.resolutions or [spec["img_size"]],
+            args.sequence_lengths or [spec["sequence_length"]],
+            args.batch_sizes,
+            args.repeats,
+            args.warmup,
+        )
+
+    report = {
+        "benchmark": "models",
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "peak_rss_mb": process_memory_mb().get("peak_rss_mb"),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
@@ -0,0 +1,258 @@
+"""
+Serving benchmark suite for the Action Recognition API
+
+Drives /predict with synthetic images at several resolutions and formats and sweeps
+client concurrency, either in-process (ASGI transport, no network) or against a
+local uvicorn worker started by the benchmark. Reports throughput, p50/p95/p99
+latency and server memory, and writes everything to a JSON file so runs can be
+compared across commits and configurations.
+
+Usage:
+    python bench_serving.py --mode inprocess --concurrency 1 4 16
+    python bench_serving.py --mode uvicorn --batch-max-size 32 --decode-workers 8 --output results/b32.json
+    python bench_serving.py --mode uvicorn --runtime tflite --precision int8
+
+Requires httpx (pip install httpx). The prediction caches and request coalescing
+are disabled during runs (--coalesce keeps coalescing on) and concurrent clients
+send different images, so every request reaches the model.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from PIL import Image
+
+from runinfo import BACKEND_DIR, git_commit, process_memory_mb
+
+RESOLUTIONS = {
+    "128": (128, 128),
+    "480p": (640, 480),
+    "1080p": (1920, 1080),
+    "12mp": (4000, 3000),
+}
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+
+def make_image(width: int, height: int, image_format: str, seed: int) -> bytes:
+    """Photo-like synthetic image: smooth gradients plus mild noise (pure noise compresses unrealistically)"""
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    phases = rng.uniform(0, 2 * np.pi, 3)
+    channels = [
+        127 + 100 * np.sin(2 * np.pi * (x * rng.uniform(1, 4) + y * rng.uniform(1, 4)) + phase)
+        for phase in phases
+    ]
+    pixels = np.stack(channels, axis=-1) + rng.normal(0, 8, (height, width, 3))
+    pixels = np.clip(pixels, 0, 255).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format=image_format, quality=90)
+    return buffer.getvalue()
+
+
+def make_image_pool(resolution: str, fmt: str, count: int) -> list:
+    width, height = RESOLUTIONS[resolution]
+    image_format, _ = FORMATS[fmt]
+    return [make_image(width, height, image_format, seed) for seed in range(count)]
+
+
+def latency_summary(latencies: list) -> dict:
+    if not latencies:
+        return {}
+    ms = np.array(latencies) * 1000.0
+    return {
+        "mean": round(float(ms.mean()), 2),
+        "p50": round(float(np.percentile(ms, 50)), 2),
+        "p95": round(float(np.percentile(ms, 95)), 2),
+        "p99": round(float(np.percentile(ms, 99)), 2),
+        "max": round(float(ms.max()), 2),
+    }
+
+
+async def run_load(client, images: list, content_type: str, concurrency: int, requests_per_client: int) -> dict:
+    """Closed-loop load: `concurrency` clients each send `requests_per_client` requests back to back"""
+    latencies, errors = [], []
+
+    async def client_loop(worker: int):
+        for i in range(requests_per_client):
+            # Clients are offset so concurrent requests carry different images
+            image = images[(i * concurrency + worker) % len(images)]
+            start = time.perf_counter()
+            try:
+                response = await client.post("/predict", files={"file": ("bench", image, content_type)})
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors.append(response.status_code)
+            except Exception as e:
+                errors.append(type(e).__name__)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies) + len(errors),
+        "errors": len(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+async def run_sweep(client, args, memory) -> list:
+    # Warm-up: trace the model for the common batch shapes
+    warmup = make_image_pool("480p", "jpeg", 4)
+    for image in warmup:
+        await client.post("/predict", files={"file": ("warmup", image, "image/jpeg")})
+
+    results = []
+    for resolution in args.resolutions:
+        for fmt in args.formats:
+            images = make_image_pool(resolution, fmt, args.unique_images)
+            _, content_type = FORMATS[fmt]
+            for concurrency in args.concurrency:
+                result = await run_load(client, images, content_type, concurrency, args.requests_per_client)
+                result.update({
+                    "resolution": resolution,
+                    "format": fmt,
+                    "image_kb": round(float(np.mean([len(i) for i in images])) / 1024, 1),
+                    "concurrency": concurrency,
+                    "memory": memory(),
+                })
+                results.append(result)
+                latency = result["latency_ms"]
+                print(f"{resolution:>6} {fmt:>5} c={concurrency:<3} "
+                      f"{result['throughput_rps']:>8.2f} req/s  p50 {latency.get('p50', 0):>8.1f} ms  "
+                      f"p95 {latency.get('p95', 0):>8.1f} ms  p99 {latency.get('p99', 0):>8.1f} ms  "
+                      f"errors {result['errors']}")
+    return results
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def bench_inprocess(args) -> list:
+    import httpx
+
+    sys.path.insert(0, BACKEND_DIR)
+    import main
+
+    await main.registry.ensure_loaded(None, main.load_pool)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        return await run_sweep(client, args, process_memory_mb)
+
+
+async def bench_uvicorn(args) -> list:
+    import httpx
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            deadline = time.time() + args.startup_timeout
+            while True:
+                try:
+                    if (await client.get("/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError("uvicorn server did not become ready")
+                await asyncio.sleep(0.5)
+
+            return await run_sweep(client, args, lambda: process_memory_mb(server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def apply_config(args) -> dict:
+    """Translate CLI flags into the server's environment variables"""
+    config = {
+        "BATCH_MAX_SIZE": args.batch_max_size,
+        "BATCH_MAX_WAIT_MS": args.batch_max_wait_ms,
+        "DECODE_WORKERS": args.decode_workers,
+        "INFERENCE_WORKERS": args.inference_workers,
+        "INFERENCE_RUNTIME": args.runtime,
+        "INFERENCE_PRECISION": args.precision,
+        "CACHE_MAX_ENTRIES": 0,
+        "PERSISTENT_CACHE_PATH": "",
+        "COALESCE_REQUESTS": int(args.coalesce),
+    }
+    config = {key: str(value) for key, value in config.items() if value is not None}
+    os.environ.update(config)
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /predict throughput and latency")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests-per-client", type=int, default=16)
+    parser.add_argument("--resolutions", nargs="+", default=["128", "480p", "1080p"], choices=list(RESOLUTIONS))
+    parser.add_argument("--formats", nargs="+", default=["jpeg", "png"], choices=list(FORMATS))
+    parser.add_argument("--unique-images", type=int, default=32, help="Distinct images per resolution/format")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--output", default=None, help="JSON results file (default: bench_results/<timestamp>.json)")
+    # Server configuration under test
+    parser.add_argument("--batch-max-size", type=int, default=None)
+    parser.add_argument("--batch-max-wait-ms", type=float, default=None)
+    parser.add_argument("--decode-workers", type=int, default=None)
+    parser.add_argument("--inference-workers", type=int, default=None)
+    parser.add_argument("--runtime", default=None, help="keras, tflite or onnx")
+    parser.add_argument("--precision", default=None, help="float32 or int8")
+    parser.add_argument("--coalesce", action="store_true",
+                        help="Keep request coalescing on (off by default so every request reaches the model)")
+    args = parser.parse_args()
+
+    config = apply_config(args)
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    output = args.output or os.path.join(BACKEND_DIR, "bench_results", f"serving_{timestamp}.json")
+
+    print(f"Benchmark mode: {args.mode}, config: {config}")
+    runner = bench_inprocess if args.mode == "inprocess" else bench_uvicorn
+    results = asyncio.run(runner(args))
+
+    report = {
+        "benchmark": "serving",
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "mode": args.mode,
+        "config": config,
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
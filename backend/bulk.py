@@ -0,0 +1,154 @@
+"""
+Bulk image prediction
+Decodes many images in parallel and runs inference on large stacked batches,
+yielding results in completion order
+"""
+
+import asyncio
+import os
+import zipfile
+
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp", ".bmp"]
+ZIP_CONTENT_TYPES = ["application/zip", "application/x-zip-compressed"]
+
+# Guard against zip bombs
+MAX_ZIP_MEMBER_BYTES = 50 * 1024 * 1024
+
+
+def is_zip_upload(filename: str, content_type: str) -> bool:
+    return content_type in ZIP_CONTENT_TYPES or (filename or "").lower().endswith(".zip")
+
+
+def iter_zip_images(archive: zipfile.ZipFile, max_items: int):
+    """
+    List the images inside a zip archive.
+
+    Args:
+        archive: Open zip archive
+        max_items: Maximum number of images to accept
+
+    Yields:
+        (name, load) pairs where load() reads the member's bytes
+    """
+    count = 0
+    for info in archive.infolist():
+        if info.is_dir() or os.path.splitext(info.filename)[1].lower() not in IMAGE_EXTENSIONS:
+            continue
+        if os.path.basename(info.filename).startswith("."):
+            continue  # macOS resource forks etc.
+        if info.file_size > MAX_ZIP_MEMBER_BYTES:
+            raise ValueError(f"{info.filename} is larger than {MAX_ZIP_MEMBER_BYTES} bytes")
+        count += 1
+        if count > max_items:
+            raise ValueError(f"Archive contains more than {max_items} images")
+        # ZipFile serialises reads on its shared file handle, so this is safe from worker threads
+        yield info.filename, (lambda info=info: archive.read(info))
+
+
+async def predict_bulk(items, decode, predict, decode_pool, inference_pool,
+                       batch_size: int = 64, max_pending: int = 256, lookup=None):
+    """
+    Run a decode -> batched inference pipeline over many images.
+
+    Decoding runs on `decode_pool` with at most `max_pending` images in flight.
+    Whenever the previous forward pass finishes, every clip decoded meanwhile
+    (up to `batch_size`) is stacked into the next one, so decoding and
+    inference overlap.
+
+    Args:
+        items: Iterable of (name, load) pairs, load() returning encoded image bytes
+        decode: Function turning image bytes into a model-ready clip
+        predict: Function turning a list of clips into stacked probabilities
+        decode_pool: Executor for decoding
+        inference_pool: Executor for model calls
+        batch_size: Maximum clips per forward pass
+        max_pending: Maximum images decoded (or waiting for a batch) at once
+        lookup: Optional function turning a decoded clip into cached
+            probabilities (or None); hits skip inference. Runs on decode_pool
+
+    Yields:
+        (index, name, probabilities, error) in completion order; exactly one of
+        probabilities / error is None
+    """
+    loop = asyncio.get_running_loop()
+    decoded = asyncio.Queue()
+    results = asyncio.Queue()
+    slots = asyncio.Semaphore(max_pending)
+    producer_done = object()
+
+    def load_and_decode(load):
+        clip = decode(load())
+        return clip, (lookup(clip) if lookup is not None else None)
+
+    async def decode_one(index, name, load):
+        try:
+            clip, cached = await loop.run_in_executor(decode_pool, load_and_decode, load)
+        except Exception as e:
+            slots.release()
+            await results.put((index, name, None, e))
+            return
+        if cached is not None:
+            slots.release()
+            await results.put((index, name, cached, None))
+        else:
+            await decoded.put((index, name, clip))
+
+    async def produce():
+        tasks = set()
+        try:
+            for index, (name, load) in enumerate(items):
+                await slots.acquire()
+                task = asyncio.ensure_future(decode_one(index, name, load))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except Exception as e:
+            await results.put((-1, None, None, e))
+        finally:
+            await decoded.put(producer_done)
+
+    async def infer():
+        # One batch in flight at a time: while it runs, decoded clips pile up
+        # and the next forward pass takes all of them (up to batch_size)
+        finished = False
+        while not finished:
+            batch = []
+            entry = await decoded.get()
+            while True:
+                if entry is producer_done:
+                    finished = True
+                    break
+                batch.append(entry)
+                if len(batch) >= batch_size or decoded.empty():
+                    break
+                entry = decoded.get_nowait()
+
+            if batch:
+                await infer_batch(batch)
+
+        await results.put(producer_done)
+
+    async def infer_batch(batch):
+        clips = [clip for _, _, clip in batch]
+        try:
+            probabilities = await loop.run_in_executor(inference_pool, predict, clips)
+            for (index, name, _), row in zip(batch, probabilities):
+                await results.put((index, name, row, None))
+        except Exception as e:
+            for index, name, _ in batch:
+                await results.put((index, name, None, e))
+        finally:
+            for _ in batch:
+                slots.release()
+
+    tasks = [asyncio.ensure_future(produce()), asyncio.ensure_future(infer())]
+    try:
+        while True:
+            entry = await results.get()
+            if entry is producer_done:
+                break
+            yield entry
+    finally:
+        for task in tasks:
+            task.cancel()
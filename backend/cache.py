@@ -0,0 +1,184 @@
+"""
+In-process prediction cache
+Content-addressed LRU cache with TTL, keyed by a hash of the decoded pixels,
+and single-flight deduplication of identical in-flight predictions
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def content_hash(pixels: np.ndarray) -> str:
+    """
+    Hash decoded image pixels.
+
+    Hashing the decoded, resized array (instead of the uploaded bytes) means
+    re-encoded copies of the same picture map to the same key.
+
+    Args:
+        pixels: Decoded uint8 image array
+
+    Returns:
+        Hex digest identifying the pixel content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(pixels.shape).encode())
+    digest.update(np.ascontiguousarray(pixels).tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with a size bound and per-entry TTL.
+
+    Args:
+        max_entries: Maximum number of cached predictions (0 disables the cache)
+        ttl_seconds: Time after which an entry is considered stale (0 = never)
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = max(0.0, float(ttl_seconds))
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at = entry
+            if self.ttl and time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value):
+        """Store `value` under `key`, evicting the least recently used entries if full"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry (e.g. after the model has been reloaded)"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls for the same key.
+
+    The first caller for a key (the leader) starts the work; callers that
+    arrive while it is running await the same result instead of starting their
+    own. The work runs as its own task, so a leader that disconnects does not
+    cancel it for the others.
+
+    A caller only joins a flight whose deadline is no earlier than its own:
+    if the shared work expires, every caller that joined it had expired too.
+
+    Args:
+        enabled: False runs every call on its own
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Keys currently being computed"""
+        return len(self._flights)
+
+    async def do(self, key: str, func, deadline: float = None):
+        """
+        Run `func()` for `key`, or join the call already running for it.
+
+        Args:
+            key: Identifies identical work (e.g. model version + content hash)
+            func: Coroutine function doing the work
+            deadline: time.perf_counter() deadline the work runs under (None = none)
+
+        Returns:
+            The result of the (possibly shared) call
+        """
+        if not self.enabled:
+            return await func()
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            task, flight_deadline = flight
+            if flight_deadline is None or (deadline is not None and flight_deadline >= deadline):
+                self.coalesced += 1
+                return await asyncio.shield(task)
+            # The running flight may expire before this caller's deadline
+            return await func()
+
+        task = asyncio.get_running_loop().create_task(func())
+        self._flights[key] = (task, deadline)
+        task.add_done_callback(lambda _: self._flights.get(key, (None,))[0] is task and self._flights.pop(key))
+        # Retrieve the exception even if every waiter went away
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self.leaders += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        calls = self.leaders + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "in_flight": self.in_flight,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / calls, 4) if calls else 0.0,
+        }
@@ -0,0 +1,139 @@
+"""
+Response encoding
+Top-k selection over probability vectors and compact response bodies
+(fast JSON or MessagePack) negotiated from the Accept header
+"""
+
+import json
+
+import numpy as np
+from fastapi.responses import Response
+
+# Optional: orjson serializes ~10x faster than the stdlib and handles numpy arrays natively
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: MessagePack responses (Accept: application/msgpack)
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Accepted media type -> encoding served for it
+MEDIA_TYPES = {
+    "application/json": JSON,
+    "application/*": JSON,
+    "*/*": JSON,
+    "application/msgpack": MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+
+class NotAcceptable(ValueError):
+    """None of the media types in the Accept header can be produced"""
+
+
+def available_encodings() -> list:
+    return [JSON] + ([MSGPACK] if msgpack is not None else [])
+
+
+def top_k_indices(probabilities: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k largest probabilities, largest first.
+
+    np.argpartition finds the top k in linear time; only those k are sorted.
+
+    Args:
+        probabilities: Softmax output with shape (num_classes,)
+        k: Number of indices to return
+
+    Returns:
+        Integer array with shape (k,)
+    """
+    k = max(1, min(int(k), probabilities.shape[-1]))
+    if k == probabilities.shape[-1]:
+        return np.argsort(-probabilities, kind="stable")
+    top = np.argpartition(-probabilities, k - 1)[:k]
+    return top[np.argsort(-probabilities[top], kind="stable")]
+
+
+def top_predictions(probabilities: np.ndarray, action_names: list, k: int) -> list:
+    """
+    Ranked action predictions for the k most likely classes.
+
+    Args:
+        probabilities: Softmax output with shape (num_classes,)
+        action_names: Class names, indexed like probabilities
+        k: Number of predictions to return
+
+    Returns:
+        List of {"rank", "action", "confidence"} dicts sorted by confidence
+    """
+    return [
+        {
+            "rank": rank,
+            "action": action_names[idx],
+            "confidence": round(float(probabilities[idx]) * 100, 2)  # Convert to percentage
+        }
+        for rank, idx in enumerate(top_k_indices(probabilities, k).tolist(), start=1)
+    ]
+
+
+def negotiate(accept: str) -> str:
+    """
+    Pick the response encoding for an Accept header.
+
+    Args:
+        accept: Accept header value (None or empty = JSON)
+
+    Returns:
+        JSON or MSGPACK
+
+    Raises:
+        NotAcceptable: If no listed media type can be produced
+    """
+    if not accept:
+        return JSON
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        encoding = MEDIA_TYPES.get(media_type.lower())
+        if encoding in available_encodings() and quality > 0:
+            candidates.append((-quality, position, encoding))
+    if not candidates:
+        raise NotAcceptable(f"Cannot produce any of: {accept}. Available: {available_encodings()}")
+    return min(candidates)[2]
+
+
+def _default(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def dumps(content, encoding: str = JSON) -> bytes:
+    """Serialize a response body (numpy arrays and scalars included)"""
+    if encoding == MSGPACK:
+        return msgpack.packb(content, default=_default)
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+def encoded_response(content, encoding: str = JSON, status_code: int = 200) -> Response:
+    """Response with the body serialized in the negotiated encoding"""
+    return Response(content=dumps(content, encoding), status_code=status_code, media_type=encoding)
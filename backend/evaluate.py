@@ -0,0 +1,317 @@
+"""
+Accuracy and throughput evaluation over a labelled clip set
+
+Runs one or more candidate models over a labelled clip directory in a single
+pass and reports top-1 / top-5 accuracy, mean per-class accuracy, per-class
+precision / recall, the confusion matrix and clips/s. Clips are expected in a
+<class>/<video> layout with class names from class_mapping.csv, whose order is
+the models' output order.
+
+Every clip is decoded once, in a process pool that overlaps inference
+(offline.run_pipeline), and each batch is run through every candidate, so
+models are compared on identical inputs. With --features, clips are read from
+a FeatureStore instead (see extract_features.py) and only the heads run, which
+evaluates a retrained head in seconds; candidates must share the store's
+backbone.
+
+Usage:
+    python evaluate.py ../data/UCF101_test --models ../rebuilt_mobilenet.keras
+    python evaluate.py ../data/UCF101_test --models ../rebuilt_mobilenet.keras ../rebuilt_mobilenet_finetuned.keras
+    python evaluate.py ../data/UCF101_test --models ../exports/rebuilt_mobilenet --runtime tflite --precision int8
+    python evaluate.py --features ../features/ucf101 --models ../rebuilt_mobilenet.keras ../rebuilt_mobilenet_finetuned.keras
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from functools import partial
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+from encoding import top_k_indices
+from offline import (CLASS_MAPPING_PATH, find_videos, load_class_names, load_serving_model, model_name,
+                     print_summary, run_pipeline, video_label)
+from runinfo import BACKEND_DIR, git_commit, process_memory_mb
+from score_videos import read_clip
+from video import SAMPLING_MODES
+
+
+class Evaluation:
+    """
+    Running accuracy statistics of one model.
+
+    Args:
+        class_names: Class names, indexed like the model output
+    """
+
+    def __init__(self, class_names: list):
+        self.class_names = class_names
+        num_classes = len(class_names)
+        self.confusion = np.zeros((num_classes, num_classes), dtype=np.int64)  # rows: true, columns: predicted
+        self.top5_hits = 0
+        self.clips = 0
+        self.seconds = 0.0
+
+    def update(self, probabilities: np.ndarray, labels: np.ndarray, seconds: float = 0.0):
+        """
+        Add a batch of predictions.
+
+        Args:
+            probabilities: Model output with shape (batch, num_classes)
+            labels: True class index of each clip
+            seconds: Inference time of the batch
+        """
+        labels = np.asarray(labels)
+        top5 = np.stack([top_k_indices(row, 5) for row in probabilities])
+        np.add.at(self.confusion, (labels, top5[:, 0]), 1)
+        self.top5_hits += int(np.sum(np.any(top5 == labels[:, np.newaxis], axis=1)))
+        self.clips += len(labels)
+        self.seconds += seconds
+
+    def most_confused(self, count: int = 10) -> list:
+        """The most frequent (true, predicted) mistakes"""
+        errors = self.confusion.copy()
+        np.fill_diagonal(errors, 0)
+        pairs = np.argsort(-errors, axis=None)[:count]
+        return [
+            {"true": self.class_names[true], "predicted": self.class_names[predicted], "clips": int(errors[true, predicted])}
+            for true, predicted in zip(*np.unravel_index(pairs, errors.shape))
+            if errors[true, predicted] > 0
+        ]
+
+    def summary(self) -> dict:
+        correct = np.diag(self.confusion)
+        support = self.confusion.sum(axis=1)
+        predicted = self.confusion.sum(axis=0)
+        present = support > 0
+
+        per_class = {}
+        for index in np.flatnonzero(present | (predicted > 0)):
+            recall = correct[index] / support[index] if support[index] else 0.0
+            precision = correct[index] / predicted[index] if predicted[index] else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            per_class[self.class_names[index]] = {
+                "support": int(support[index]),
+                "predicted": int(predicted[index]),
+                "recall": round(float(recall), 4),
+                "precision": round(float(precision), 4),
+                "f1": round(float(f1), 4),
+            }
+
+        return {
+            "clips": self.clips,
+            "top1": round(float(correct.sum() / self.clips), 4) if self.clips else None,
+            "top5": round(self.top5_hits / self.clips, 4) if self.clips else None,
+            # Mean of per-class recall over the classes present, so large classes do not dominate
+            "mean_class_accuracy": round(float(np.mean(correct[present] / support[present])), 4) if present.any() else None,
+            "inference_seconds": round(self.seconds, 3),
+            "clips_per_second": round(self.clips / self.seconds, 1) if self.seconds else None,
+            "ms_per_clip": round(self.seconds / self.clips * 1000, 3) if self.clips else None,
+            "per_class": per_class,
+            "most_confused": self.most_confused(),
+            "confusion": self.confusion.tolist(),
+        }
+
+
+def evaluate_videos(root: str, videos: list, labels: dict, models: dict, class_names: list,
+                    sampling: str = "uniform", workers: int = None, batch_size: int = 32,
+                    queue_size: int = 64, progress_every: float = 10.0) -> tuple:
+    """
+    Decode every clip once and run it through every model.
+
+    Args:
+        root: Directory the video paths are relative to
+        videos: Video paths to evaluate
+        labels: Class index of each video path
+        models: Model name -> ServingModel (same sequence length and input size)
+        class_names: Class names, indexed like the model output
+        sampling: Frame sampling mode, see video.sample_frame_indices
+        workers: Decode processes (default: CPU count)
+        batch_size: Clips per forward pass
+        queue_size: Decoded clips buffered ahead of inference
+        progress_every: Seconds between progress lines
+
+    Returns:
+        ({model name: Evaluation}, pipeline summary)
+    """
+    reference = next(iter(models.values()))
+    evaluations = {name: Evaluation(class_names) for name in models}
+
+    def predict(batch):
+        clips = [frames for _, (frames, _), _ in batch]
+        batch_labels = np.array([labels[path] for path, _, _ in batch])
+        outputs = []
+        for name, serving_model in models.items():
+            started = time.perf_counter()
+            probabilities = serving_model.predict_clips(clips)
+            outputs.append((name, probabilities, time.perf_counter() - started))
+        return batch_labels, outputs
+
+    def record(output):
+        batch_labels, outputs = output
+        for name, probabilities, seconds in outputs:
+            evaluations[name].update(probabilities, batch_labels, seconds)
+
+    summary = run_pipeline(
+        videos,
+        partial(read_clip, root, sequence_length=reference.sequence_length,
+                img_size=reference.img_size, sampling=sampling),
+        predict,
+        record,
+        workers=workers,
+        batch_size=batch_size,
+        queue_size=queue_size,
+        progress_every=progress_every,
+    )
+    return evaluations, summary
+
+
+def evaluate_features(store, video_ids: list, video_labels: list, models: dict, class_names: list,
+                      batch_size: int = 256) -> tuple:
+    """
+    Run the models' heads over clips read from a feature store.
+
+    Clips are gathered from the memory-mapped store by a parallel, prefetching
+    tf.data pipeline while the heads run.
+
+    Returns:
+        ({model name: Evaluation}, summary with elapsed time and clips/s)
+    """
+    from train_head import clip_dataset
+
+    reference = next(iter(models.values()))
+    evaluations = {name: Evaluation(class_names) for name in models}
+    dataset = clip_dataset(store, video_ids, video_labels, reference.sequence_length, batch_size, training=False)
+
+    started = time.perf_counter()
+    for features, batch_labels in dataset.as_numpy_iterator():
+        for name, serving_model in models.items():
+            step = time.perf_counter()
+            probabilities = serving_model.predict_features(features)
+            evaluations[name].update(probabilities, batch_labels, time.perf_counter() - step)
+    elapsed = time.perf_counter() - started
+    return evaluations, {
+        "videos": len(video_ids),
+        "elapsed_seconds": round(elapsed, 3),
+        "videos_per_second": round(len(video_ids) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate models on a labelled clip set")
+    parser.add_argument("input", nargs="?", default=None, help="Labelled clip directory (<class>/<video>)")
+    parser.add_argument("--features", default=None,
+                        help="Evaluate from a feature store instead of decoding the clips")
+    parser.add_argument("--models", nargs="+", required=True,
+                        help="Candidate .keras files or export directories (directories use --runtime/--precision)")
+    parser.add_argument("--runtime", default="tflite", choices=["tflite", "onnx"],
+                        help="Runtime for export directories")
+    parser.add_argument("--precision", default="float32", choices=["float32", "int8"])
+    parser.add_argument("--threads", type=int, default=None, help="Threads per exported graph")
+    parser.add_argument("--class-mapping", default=CLASS_MAPPING_PATH)
+    parser.add_argument("--sampling", default="uniform", choices=SAMPLING_MODES)
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--queue-size", type=int, default=64, help="Decoded clips buffered ahead of inference")
+    parser.add_argument("--limit", type=int, default=0, help="Evaluate a random sample of this many clips (0 = all)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the --limit sample")
+    parser.add_argument("--output", default=None,
+                        help="Results JSON (default: bench_results/evaluate_<timestamp>.json)")
+    args = parser.parse_args()
+    if (args.input is None) == (args.features is None):
+        parser.error("pass either a clip directory or --features")
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    class_names = load_class_names(args.class_mapping)
+    class_index = {name: index for index, name in enumerate(class_names)}
+
+    models = {}
+    for path in args.models:
+        runtime = args.runtime if os.path.isdir(path) else "keras"
+        name = model_name(path, runtime, args.precision)
+        print(f"🧠 Loading {name}")
+        serving_model = load_serving_model(path, runtime, args.precision, args.threads)
+        if serving_model.num_classes != len(class_names):
+            raise ValueError(f"{name} predicts {serving_model.num_classes} classes, "
+                             f"{args.class_mapping} lists {len(class_names)}")
+        models[name] = serving_model
+    shapes = {(m.sequence_length, m.img_size) for m in models.values()}
+    if len(shapes) > 1:
+        raise ValueError(f"Candidates take different inputs {sorted(shapes)}; evaluate them separately")
+
+    if args.features:
+        from feature_store import FeatureStore, backbone_fingerprint
+
+        store = FeatureStore(args.features)
+        for name, serving_model in models.items():
+            if backbone_fingerprint(serving_model) != store.metadata.get("backbone"):
+                raise ValueError(f"{name} has a different backbone than the features in {args.features}")
+        clips = sorted(video_id for video_id, entry in store.videos.items() if entry.get("label") in class_index)
+        skipped = len(store) - len(clips)
+    else:
+        videos = find_videos(args.input)
+        clips = [path for path in videos if video_label(path, class_index)]
+        skipped = len(videos) - len(clips)
+    if args.limit and len(clips) > args.limit:
+        clips = sorted(random.Random(args.seed).sample(clips, args.limit))
+    if args.features:
+        labels = [class_index[store.videos[video_id]["label"]] for video_id in clips]
+    else:
+        labels = [class_index[video_label(path, class_index)] for path in clips]
+    if skipped:
+        print(f"⚠️ {skipped} clips without a class from {args.class_mapping} are skipped")
+    print(f"📂 {len(clips)} labelled clips over {len(set(labels))} classes")
+
+    if args.features:
+        evaluations, summary = evaluate_features(store, clips, labels, models, class_names, args.batch_size)
+        print(f"✅ {summary['videos']} clips in {summary['elapsed_seconds']}s ({summary['videos_per_second']} clips/s)")
+    else:
+        evaluations, summary = evaluate_videos(
+            args.input, clips, dict(zip(clips, labels)), models, class_names,
+            sampling=args.sampling,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            queue_size=args.queue_size,
+        )
+        print_summary(summary)
+        for path, error in summary["failures"].items():
+            print(f"⚠️ {path}: {error}")
+
+    results = {name: evaluation.summary() for name, evaluation in evaluations.items()}
+    width = max(len(name) for name in results)
+    print(f"\n{'model':<{width}}  {'top-1':>7}  {'top-5':>7}  {'class avg':>9}  {'clips/s':>8}  {'ms/clip':>8}")
+    for name, result in results.items():
+        print(f"{name:<{width}}  {result['top1'] or 0:>7.2%}  {result['top5'] or 0:>7.2%}  "
+              f"{result['mean_class_accuracy'] or 0:>9.2%}  {result['clips_per_second'] or 0:>8}  "
+              f"{result['ms_per_clip'] or 0:>8}")
+        for mistake in result["most_confused"][:3]:
+            print(f"  {mistake['true']} -> {mistake['predicted']}: {mistake['clips']} clips")
+
+    output = args.output or os.path.join(BACKEND_DIR, "bench_results", f"evaluate_{timestamp}.json")
+    report = {
+        "benchmark": "evaluate",
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "input": os.path.abspath(args.features or args.input),
+        "source": "features" if args.features else "videos",
+        "class_names": class_names,
+        "config": {
+            "sampling": args.sampling,
+            "batch_size": args.batch_size,
+            "limit": args.limit,
+            "seed": args.seed,
+        },
+        "skipped": skipped,
+        "peak_rss_mb": process_memory_mb().get("peak_rss_mb"),
+        "pipeline": summary,
+        "models": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {output}")
@@ -0,0 +1,274 @@
+"""
+Export LRCN models for the alternative inference runtimes
+
+Splits each Keras model into its CNN backbone and temporal head and writes:
+- TFLite float32 and int8 graphs
+- ONNX float32 and int8 graphs
+- metadata.json with the input spec and the accuracy drift of every variant
+  against the Keras reference
+
+The int8 backbones are fully quantized (weights and activations) and calibrated on
+representative frames; the LSTM heads use int8 weights with float activations.
+
+Usage:
+    python export_models.py --model ../rebuilt_mobilenet.keras --calibration-dir ../samples
+    python export_models.py --model ../rebuilt_model_final.keras ../rebuilt_model_robust.keras
+
+Serve an export with:
+    INFERENCE_RUNTIME=tflite INFERENCE_PRECISION=int8 EXPORT_DIR=../exports/rebuilt_mobilenet uvicorn main:app
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+from PIL import Image
+
+from runtimes import METADATA_FILE, PRECISIONS, ExportedModel, export_paths
+from serving_model import normalize, preprocessing_for, split_lrcn
+from video import VIDEO_EXTENSIONS, read_video_clip
+
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp", ".bmp"]
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "..", "exports")
+
+
+def load_calibration_frames(directory: str, img_size: int, count: int, sequence_length: int) -> np.ndarray:
+    """
+    Collect representative uint8 frames from a directory of images and/or videos.
+
+    Videos contribute `sequence_length` uniformly sampled frames each, so
+    consecutive groups of frames form real clips for the drift check.
+    Falls back to random noise (with a warning) when no directory is given.
+    """
+    frames = []
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "**", "*"), recursive=True))
+        for path in paths:
+            extension = os.path.splitext(path)[1].lower()
+            try:
+                if extension in VIDEO_EXTENSIONS:
+                    clip, _ = read_video_clip(path, sequence_length, img_size)
+                    frames.extend(clip)
+                elif extension in IMAGE_EXTENSIONS:
+                    image = Image.open(path).convert("RGB").resize((img_size, img_size))
+                    frames.append(np.array(image))
+            except Exception as e:
+                print(f"  Skipping {path}: {e}")
+            if len(frames) >= count:
+                break
+
+    if not frames:
+        print("⚠️ No calibration data given, using random frames. "
+              "int8 accuracy will not be representative of real inputs.")
+        rng = np.random.default_rng(0)
+        return rng.integers(0, 256, (count, img_size, img_size, 3), dtype=np.uint8)
+
+    return np.stack(frames[:count])
+
+
+def write_saved_model(keras_model, input_shape: list, path: str):
+    """Export a Keras model as a SavedModel with one fixed-signature endpoint"""
+    import keras
+    import tensorflow as tf
+
+    archive = keras.export.ExportArchive()
+    archive.track(keras_model)
+    archive.add_endpoint(
+        "serve",
+        lambda x: keras_model(x, training=False),
+        input_signature=[tf.TensorSpec(input_shape, tf.float32)]
+    )
+    archive.write_out(path, verbose=False)
+
+
+def convert_tflite(saved_model_dir: str, representative_data=None, weights_only: bool = False) -> bytes:
+    """
+    Convert a SavedModel to TFLite.
+
+    Args:
+        saved_model_dir: SavedModel directory
+        representative_data: Calibration samples for full int8 quantization:
+            int8 weights, activations, input and output (conversion fails
+            rather than falling back to float for an unsupported op)
+        weights_only: Quantize weights to int8 but keep float activations
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+    if representative_data is not None:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([sample[np.newaxis]] for sample in representative_data)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif weights_only:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    return converter.convert()
+
+
+def export_tflite(backbone, head, out_dir: str, spec: dict, calibration: np.ndarray):
+    """Write float32 and int8 TFLite graphs for the backbone and head"""
+    work_dir = tempfile.mkdtemp()
+    try:
+        backbone_dir = os.path.join(work_dir, "backbone")
+        head_dir = os.path.join(work_dir, "head")
+        write_saved_model(backbone, [None, spec["img_size"], spec["img_size"], 3], backbone_dir)
+        # TFLite cannot lower LSTMs with a dynamic batch size; the head runs one clip at a time
+        write_saved_model(head, [1, spec["sequence_length"], spec["feature_dim"]], head_dir)
+
+        graphs = {
+            "float32": (convert_tflite(backbone_dir), convert_tflite(head_dir)),
+            "int8": (convert_tflite(backbone_dir, representative_data=calibration),
+                     convert_tflite(head_dir, weights_only=True)),
+        }
+        for precision, (backbone_graph, head_graph) in graphs.items():
+            backbone_path, head_path = export_paths(out_dir, "tflite", precision)
+            with open(backbone_path, "wb") as f:
+                f.write(backbone_graph)
+            with open(head_path, "wb") as f:
+                f.write(head_graph)
+            print(f"  tflite {precision}: backbone {len(backbone_graph) / 1e6:.1f} MB, "
+                  f"head {len(head_graph) / 1e6:.1f} MB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def export_onnx(backbone, head, out_dir: str, spec: dict, calibration: np.ndarray):
+    """Write float32 and int8 ONNX graphs for the backbone and head"""
+    import tensorflow as tf
+    import tf2onnx
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+
+    backbone_path, head_path = export_paths(out_dir, "onnx", "float32")
+    tf2onnx.convert.from_function(
+        tf.function(lambda x: backbone(x, training=False)),
+        input_signature=[tf.TensorSpec([None, spec["img_size"], spec["img_size"], 3], tf.float32, name="frames")],
+        opset=17,
+        output_path=backbone_path
+    )
+    tf2onnx.convert.from_function(
+        tf.function(lambda x: head(x, training=False)),
+        input_signature=[tf.TensorSpec([None, spec["sequence_length"], spec["feature_dim"]], tf.float32, name="features")],
+        opset=17,
+        output_path=head_path
+    )
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self, frames):
+            self._frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self._frames, None)
+            return None if frame is None else {"frames": frame[np.newaxis]}
+
+    backbone_int8, head_int8 = export_paths(out_dir, "onnx", "int8")
+    quantize_static(
+        backbone_path, backbone_int8, FrameReader(calibration),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    quantize_dynamic(head_path, head_int8, weight_type=QuantType.QInt8)
+
+    for precision in PRECISIONS:
+        paths = export_paths(out_dir, "onnx", precision)
+        sizes = [os.path.getsize(p) / 1e6 for p in paths]
+        print(f"  onnx {precision}: backbone {sizes[0]:.1f} MB, head {sizes[1]:.1f} MB")
+
+
+EXPORTERS = {"tflite": export_tflite, "onnx": export_onnx}
+
+
+def measure_drift(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Compare candidate probabilities against the Keras reference"""
+    diff = np.abs(reference - candidate)
+    top1_ref = reference.argmax(axis=1)
+    top5_ref = np.argsort(reference, axis=1)[:, -5:]
+    top5_new = np.argsort(candidate, axis=1)[:, -5:]
+    overlap = [len(set(a) & set(b)) / 5 for a, b in zip(top5_ref, top5_new)]
+    return {
+        "clips": int(len(reference)),
+        "max_abs_diff": round(float(diff.max()), 6),
+        "mean_abs_diff": round(float(diff.mean()), 6),
+        "top1_agreement": round(float(np.mean(top1_ref == candidate.argmax(axis=1))), 4),
+        "top5_overlap": round(float(np.mean(overlap)), 4),
+    }
+
+
+def export_model(model_path: str, output_dir: str, formats: list, calibration_dir: str, calibration_count: int):
+    import keras
+
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    out_dir = os.path.join(output_dir, name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    print(f"\n=== Exporting {model_path} -> {out_dir} ===")
+    model = keras.models.load_model(model_path, compile=False)
+    backbone, head = split_lrcn(model)
+
+    spec = {
+        "source_model": os.path.basename(model_path),
+        "sequence_length": int(model.input_shape[1]),
+        "img_size": int(model.input_shape[2]),
+        "feature_dim": int(backbone.output_shape[-1]),
+        "num_classes": int(model.output_shape[-1]),
+        "preprocessing": preprocessing_for(backbone),
+    }
+    print(f"Input spec: {spec}")
+
+    pixels = load_calibration_frames(calibration_dir, spec["img_size"], calibration_count, spec["sequence_length"])
+    calibration = normalize(pixels, spec["preprocessing"])
+    print(f"Calibration frames: {len(calibration)}")
+
+    # Drift is measured on clips of consecutive calibration frames (served as uint8 pixels)
+    num_clips = max(1, len(pixels) // spec["sequence_length"])
+    clips = [pixels[i * spec["sequence_length"]:(i + 1) * spec["sequence_length"]] for i in range(num_clips)]
+    clips = [c for c in clips if len(c) == spec["sequence_length"]] or [np.repeat(pixels[:1], spec["sequence_length"], axis=0)]
+    reference = np.asarray(model.predict(normalize(np.stack(clips), spec["preprocessing"]), verbose=0))
+
+    # Metadata must exist before ExportedModel can load the graphs for the drift check
+    metadata = dict(spec, drift={})
+    with open(os.path.join(out_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    for runtime in formats:
+        try:
+            EXPORTERS[runtime](backbone, head, out_dir, spec, calibration)
+        except Exception as e:
+            print(f"❌ {runtime} export failed: {e}")
+            continue
+
+        for precision in PRECISIONS:
+            exported = ExportedModel(out_dir, runtime, precision)
+            drift = measure_drift(reference, exported.predict_clips(clips))
+            metadata["drift"][f"{runtime}_{precision}"] = drift
+            print(f"  {runtime} {precision} drift: {drift}")
+
+    with open(os.path.join(out_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+    print(f"✅ Wrote {os.path.join(out_dir, METADATA_FILE)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export LRCN models to TFLite / ONNX (float32 and int8)")
+    parser.add_argument("--model", nargs="+",
+                        default=[os.path.join(os.path.dirname(__file__), "..", "rebuilt_mobilenet.keras")],
+                        help="Keras model file(s) to export")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--formats", nargs="+", default=list(EXPORTERS), choices=list(EXPORTERS))
+    parser.add_argument("--calibration-dir", default=None,
+                        help="Directory of images/videos with representative frames for int8 calibration")
+    parser.add_argument("--calibration-count", type=int, default=240,
+                        help="Number of calibration frames")
+    args = parser.parse_args()
+
+    for path in args.model:
+        export_model(path, args.output_dir, args.formats, args.calibration_dir, args.calibration_count)
@@ -0,0 +1,215 @@
+"""
+Backbone feature extraction for a video collection
+
+Runs the model's frozen CNN backbone over the sampled frames of every video
+under a directory and writes the per-frame features to a FeatureStore
+(see feature_store.py). Evaluation and head training then read the store
+instead of decoding videos and running the CNN again.
+
+Decoding runs in a process pool and overlaps the backbone passes and chunk
+writes (offline.run_pipeline). Re-running the same command adds only the
+videos missing from the store, so an interrupted extraction resumes.
+
+In a UCF101-style layout (<class>/<video>.avi) each video's label is taken
+from the directory name when it matches a class in class_mapping.csv.
+
+Usage:
+    python extract_features.py ../data/UCF101 --output ../features/ucf101
+    python extract_features.py ../data/UCF101 --output ../features/ucf101_8fps --sample-fps 8 --workers 8
+    python extract_features.py ../data/UCF101 --output ../features/ucf101_tflite --model ../exports/rebuilt_mobilenet --runtime tflite
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from functools import partial
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+from feature_store import DTYPES, FeatureStore, backbone_fingerprint
+from offline import (CLASS_MAPPING_PATH, DEFAULT_MODEL_PATH, find_videos, load_class_names, load_serving_model,
+                     model_name, print_summary, run_pipeline, video_label)
+from runinfo import BACKEND_DIR, git_commit, process_memory_mb
+
+
+def read_sampled_frames(root: str, relative_path: str, sample_fps: float, img_size: int, max_frames: int) -> tuple:
+    """
+    Decode the sampled frames of one video (runs in a decode worker process).
+
+    Videos that would yield more than `max_frames` frames at `sample_fps`
+    are sampled more sparsely, evenly over their whole length.
+
+    Returns:
+        (frame_indices, frames, info)
+    """
+    from video import SampledFrameReader
+
+    path = os.path.join(root, relative_path)
+    reader = SampledFrameReader(path, sample_fps, img_size)
+    if max_frames and reader.total_samples > max_frames:
+        step = -(-reader.total_frames // max_frames)
+        reader.close()
+        reader = SampledFrameReader(path, reader.fps / step, img_size)
+    indices, frames = [], []
+    try:
+        while not reader.finished and (not max_frames or len(indices) < max_frames):
+            chunk_indices, chunk_frames = reader.read(min(256, max_frames - len(indices)) if max_frames else 256)
+            indices += chunk_indices
+            frames.append(chunk_frames)
+    finally:
+        reader.close()
+    if not indices:
+        raise ValueError("Video has no frames")
+    info = {
+        "total_frames": reader.total_frames,
+        "fps": round(reader.fps, 3),
+        "sample_fps": round(reader.sample_fps, 3),
+    }
+    return indices, np.concatenate(frames), info
+
+
+def extract_features(root: str, videos: list, store: FeatureStore, serving_model, class_names: list,
+                     sample_fps: float = 0.0, max_frames: int = 300, batch_videos: int = 8, batch_frames: int = 256,
+                     workers: int = None, queue_size: int = 16, progress_every: float = 10.0) -> dict:
+    """
+    Extract and store per-frame backbone features.
+
+    Args:
+        root: Directory the video paths are relative to
+        videos: Video paths to process; each path is the video's id in the store
+        store: Open FeatureStore receiving the features
+        serving_model: Loaded ServingModel whose backbone is run
+        class_names: Known classes, for labels from directory names
+        sample_fps: Frames per second kept per video (0 = every frame)
+        max_frames: Most frames kept per video (0 = unlimited)
+        batch_videos: Most decoded videos taken per processing step
+        batch_frames: Frames per backbone call
+        workers: Decode processes (default: CPU count)
+        queue_size: Decoded videos buffered ahead of the backbone
+        progress_every: Seconds between progress lines
+
+    Returns:
+        Counts and per-stage timings
+    """
+    frames_done = 0
+
+    def extract(batch):
+        nonlocal frames_done
+        frames = np.concatenate([frames for _, (_, frames, _), _ in batch])
+        features = np.concatenate([
+            serving_model.extract_features(frames[start:start + batch_frames])
+            for start in range(0, len(frames), batch_frames)
+        ])
+        frames_done += len(frames)
+
+        outputs = []
+        offset = 0
+        for path, (indices, _, info), _ in batch:
+            outputs.append((path, features[offset:offset + len(indices)], indices, info))
+            offset += len(indices)
+        return outputs
+
+    def write(outputs):
+        for path, features, indices, info in outputs:
+            store.add(path, features, indices, label=video_label(path, class_names), **info)
+
+    try:
+        summary = run_pipeline(
+            videos,
+            partial(read_sampled_frames, root, sample_fps=sample_fps,
+                    img_size=serving_model.img_size, max_frames=max_frames),
+            extract,
+            write,
+            workers=workers,
+            batch_size=batch_videos,
+            queue_size=queue_size,
+            progress_every=progress_every,
+        )
+    finally:
+        store.flush()
+    summary["frames"] = frames_done
+    summary["frames_per_second"] = round(frames_done / summary["elapsed_seconds"], 1) if summary["elapsed_seconds"] else 0.0
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract per-frame backbone features into a feature store")
+    parser.add_argument("input", help="Directory searched recursively for .mp4 / .avi files")
+    parser.add_argument("--output", required=True, help="Feature store directory (created or extended)")
+    parser.add_argument("--model", default=None,
+                        help="Model .keras file or export directory (default: ../rebuilt_mobilenet.keras)")
+    parser.add_argument("--runtime", default="keras", choices=["keras", "tflite", "onnx"])
+    parser.add_argument("--precision", default="float32", choices=["float32", "int8"])
+    parser.add_argument("--threads", type=int, default=None, help="Threads per exported graph")
+    parser.add_argument("--class-mapping", default=CLASS_MAPPING_PATH)
+    parser.add_argument("--sample-fps", type=float, default=0.0, help="Frames per second kept (0 = every frame)")
+    parser.add_argument("--max-frames", type=int, default=300,
+                        help="Most frames kept per video; longer videos are sampled more sparsely (0 = unlimited)")
+    parser.add_argument("--dtype", default="float16", choices=DTYPES, help="Storage dtype of a new store")
+    parser.add_argument("--chunk-rows", type=int, default=16384, help="Frames per chunk file of a new store")
+    parser.add_argument("--batch-videos", type=int, default=8, help="Most decoded videos taken per processing step")
+    parser.add_argument("--batch-frames", type=int, default=256, help="Frames per backbone call")
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: CPU count)")
+    parser.add_argument("--queue-size", type=int, default=16, help="Decoded videos buffered ahead of the backbone")
+    parser.add_argument("--summary", default=None,
+                        help="Throughput summary JSON (default: bench_results/extract_features_<timestamp>.json)")
+    args = parser.parse_args()
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    model_path = args.model or DEFAULT_MODEL_PATH
+    class_names = load_class_names(args.class_mapping)
+
+    print(f"🧠 Loading {model_path} ({args.runtime}, {args.precision})")
+    serving_model = load_serving_model(model_path, args.runtime, args.precision, args.threads)
+    store = FeatureStore(args.output, metadata={
+        "feature_dim": serving_model.feature_dim,
+        "backbone": backbone_fingerprint(serving_model),
+        "img_size": serving_model.img_size,
+        "preprocessing": serving_model.preprocessing,
+        "sample_fps": args.sample_fps,
+        "max_frames": args.max_frames,
+    }, extra={
+        "model": model_name(model_path, args.runtime, args.precision),
+        "sequence_length": serving_model.sequence_length,
+        "created_at": timestamp,
+    }, dtype=args.dtype, chunk_rows=args.chunk_rows)
+
+    videos = find_videos(args.input)
+    todo = [path for path in videos if path not in store]
+    print(f"📂 {len(videos)} videos found, {len(videos) - len(todo)} already in the store, {len(todo)} to go")
+
+    summary = extract_features(
+        args.input, todo, store, serving_model, class_names,
+        sample_fps=args.sample_fps,
+        max_frames=args.max_frames,
+        batch_videos=args.batch_videos,
+        batch_frames=args.batch_frames,
+        workers=args.workers,
+        queue_size=args.queue_size,
+    )
+    print_summary(summary)
+    print(f"  {summary['frames']} frames, {summary['frames_per_second']} frames/s")
+    for path, error in summary["failures"].items():
+        print(f"⚠️ {path}: {error}")
+    stats = store.stats()
+    print(f"📦 {stats['videos']} videos, {stats['frames']} frames, {stats['size_bytes'] / 1e6:.1f} MB in {args.output}")
+
+    output = args.summary or os.path.join(BACKEND_DIR, "bench_results", f"extract_features_{timestamp}.json")
+    report = {
+        "benchmark": "extract_features",
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "input": os.path.abspath(args.input),
+        "store": stats,
+        "metadata": store.metadata,
+        "skipped": len(videos) - len(todo),
+        "peak_rss_mb": process_memory_mb().get("peak_rss_mb"),
+        **summary,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Summary written to {output}")
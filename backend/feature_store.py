@@ -0,0 +1,256 @@
+"""
+Backbone feature store
+Per-frame CNN features of a video collection in chunked, memory-mapped files,
+indexed by video id and frame, so evaluation and head training can skip
+decoding and the backbone
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from video import sample_frame_indices
+
+METADATA_FILE = "metadata.json"
+INDEX_FILE = "index.jsonl"
+DTYPES = ["float16", "float32"]
+
+
+def backbone_fingerprint(serving_model) -> str:
+    """
+    Content hash of a ServingModel's backbone.
+
+    Stored features stay valid for any model sharing the backbone, e.g. one
+    whose head was retrained on them, so the store is keyed by the backbone
+    weights (or the exported backbone graph) rather than the whole model.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    backbone_path = getattr(serving_model, "backbone_path", None)
+    if backbone_path is not None:
+        with open(backbone_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    elif serving_model.is_split:
+        for weights in serving_model.backbone.get_weights():
+            digest.update(np.ascontiguousarray(weights).tobytes())
+    else:
+        raise ValueError("Model could not be split into backbone and head; no per-frame features")
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    """
+    Per-frame backbone features on disk.
+
+    The backbone is frozen in every model built in this repo, so the features
+    of a video only depend on the backbone and the frames sampled from it.
+    Extracting them once turns every later evaluation or head-training run
+    into reads of small vectors instead of video decoding plus a CNN pass
+    per frame.
+
+    Layout of the store directory:
+
+    - chunk-NNNNN.npy: features of consecutive frames, shape (rows, feature_dim),
+      opened with np.load(mmap_mode="r") so only the rows read are paged in
+    - frames-NNNNN.npy: source video frame index of every row of the chunk
+    - index.jsonl: one line per video: id, chunk, offset and count of its
+      rows, plus whatever the extractor recorded (label, fps, ...)
+    - metadata.json: feature dimension, dtype and how the features were made
+
+    A video's rows never span two chunks. Chunks are written whole to a
+    temporary name and renamed, and their index lines are appended only
+    afterwards, so an interrupted extraction leaves a consistent store that
+    simply lacks the videos still buffered.
+
+    Args:
+        path: Store directory
+        metadata: Required when creating a store: at least "feature_dim";
+            an existing store's metadata must agree on every given key
+        extra: Descriptive metadata recorded when the store is created (not checked)
+        dtype: Storage dtype of new stores ("float16" halves the size; the
+            features are read back as float32)
+        chunk_rows: Rows per chunk file
+    """
+
+    def __init__(self, path: str, metadata: dict = None, extra: dict = None, dtype: str = "float16",
+                 chunk_rows: int = 16384):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown dtype: {dtype}. Allowed: {DTYPES}")
+        self.path = path
+        self.videos = {}
+        self._chunks = {}
+        self._pending = []
+        self._pending_rows = 0
+
+        metadata_path = os.path.join(path, METADATA_FILE)
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                self.metadata = json.load(f)
+            mismatched = {
+                key: (self.metadata.get(key), value)
+                for key, value in (metadata or {}).items()
+                if self.metadata.get(key) != value
+            }
+            if mismatched:
+                raise ValueError(f"Feature store {path} was built differently (stored, requested): {mismatched}")
+        elif metadata is not None:
+            self.metadata = {**(extra or {}), **metadata, "dtype": dtype, "chunk_rows": int(chunk_rows)}
+            os.makedirs(path, exist_ok=True)
+            self._write_json(METADATA_FILE, self.metadata)
+        else:
+            raise FileNotFoundError(f"No feature store at {path}")
+
+        self.feature_dim = int(self.metadata["feature_dim"])
+        self.dtype = np.dtype(self.metadata["dtype"])
+        self.chunk_rows = int(self.metadata["chunk_rows"])
+        self._next_chunk = 0
+        self._load_index()
+
+    def _write_json(self, name: str, content: dict):
+        temporary = os.path.join(self.path, f".{name}.tmp")
+        with open(temporary, "w") as f:
+            json.dump(content, f, indent=2)
+        os.replace(temporary, os.path.join(self.path, name))
+
+    def _load_index(self):
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "rb") as f:
+            data = f.read()
+        if data and not data.endswith(b"\n"):
+            # Cut a partial line left by an interrupted append
+            data = data[:data.rfind(b"\n") + 1]
+            with open(index_path, "rb+") as f:
+                f.truncate(len(data))
+        for line in data.decode().splitlines():
+            entry = json.loads(line)
+            self.videos[entry["id"]] = entry
+            self._next_chunk = max(self._next_chunk, entry["chunk"] + 1)
+
+    def __len__(self) -> int:
+        return len(self.videos)
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self.videos
+
+    def ids(self) -> list:
+        return list(self.videos)
+
+    def _chunk(self, chunk: int) -> tuple:
+        if chunk not in self._chunks:
+            self._chunks[chunk] = (
+                np.load(os.path.join(self.path, f"chunk-{chunk:05d}.npy"), mmap_mode="r"),
+                np.load(os.path.join(self.path, f"frames-{chunk:05d}.npy"), mmap_mode="r"),
+            )
+        return self._chunks[chunk]
+
+    def features(self, video_id: str) -> np.ndarray:
+        """
+        Every stored frame feature of a video.
+
+        Returns:
+            Read-only memory-mapped array with shape (frames, feature_dim)
+            in the storage dtype
+        """
+        entry = self.videos[video_id]
+        features, _ = self._chunk(entry["chunk"])
+        return features[entry["offset"]:entry["offset"] + entry["count"]]
+
+    def frame_indices(self, video_id: str) -> np.ndarray:
+        """Source video frame index of each stored feature row"""
+        entry = self.videos[video_id]
+        _, frames = self._chunk(entry["chunk"])
+        return frames[entry["offset"]:entry["offset"] + entry["count"]]
+
+    def frame(self, video_id: str, frame: int) -> np.ndarray:
+        """
+        Feature of one source video frame.
+
+        Raises:
+            KeyError: If that frame was not sampled during extraction
+        """
+        frames = self.frame_indices(video_id)
+        position = int(np.searchsorted(frames, frame))
+        if position == len(frames) or frames[position] != frame:
+            raise KeyError(f"Frame {frame} of {video_id} is not in the store")
+        return np.asarray(self.features(video_id)[position], dtype=np.float32)
+
+    def clip(self, video_id: str, sequence_length: int, mode: str = "uniform") -> np.ndarray:
+        """
+        Features of a model input clip, sampled from the stored frames like
+        video.read_video_clip samples a video.
+
+        Returns:
+            float32 array with shape (sequence_length, feature_dim)
+        """
+        positions = sample_frame_indices(self.videos[video_id]["count"], sequence_length, mode)
+        return np.asarray(self.features(video_id)[positions], dtype=np.float32)
+
+    def add(self, video_id: str, features: np.ndarray, frame_indices, **info):
+        """
+        Queue one video's features; they are written with the next full chunk.
+
+        Args:
+            video_id: Unique video id (e.g. its path relative to the dataset root)
+            features: Per-frame features with shape (frames, feature_dim)
+            frame_indices: Source video frame index of each row (ascending)
+            **info: Extra JSON-serializable fields kept in the index (label, fps, ...)
+        """
+        features = np.asarray(features)
+        if features.ndim != 2 or features.shape[1] != self.feature_dim or len(features) == 0:
+            raise ValueError(f"Expected features with shape (frames > 0, {self.feature_dim}), got {features.shape}")
+        if len(frame_indices) != len(features):
+            raise ValueError(f"{len(frame_indices)} frame indices for {len(features)} feature rows")
+        if self._pending_rows and self._pending_rows + len(features) > self.chunk_rows:
+            self.flush()
+        self._pending.append((video_id, features.astype(self.dtype), np.asarray(frame_indices, dtype=np.int64), info))
+        self._pending_rows += len(features)
+        if self._pending_rows >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        """Write the queued videos as a new chunk and index them"""
+        if not self._pending:
+            return
+        chunk = self._next_chunk
+        for prefix, position in (("chunk", 1), ("frames", 2)):
+            name = f"{prefix}-{chunk:05d}.npy"
+            temporary = os.path.join(self.path, f".{name}.tmp")
+            with open(temporary, "wb") as f:
+                np.save(f, np.concatenate([item[position] for item in self._pending]))
+            os.replace(temporary, os.path.join(self.path, name))
+
+        offset = 0
+        lines = []
+        for video_id, features, _, info in self._pending:
+            entry = {"id": video_id, "chunk": chunk, "offset": offset, "count": len(features), **info}
+            lines.append(json.dumps(entry) + "\n")
+            self.videos[video_id] = entry
+            offset += len(features)
+        with open(os.path.join(self.path, INDEX_FILE), "a") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self._next_chunk += 1
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self):
+        self.flush()
+        self._chunks.clear()
+
+    def stats(self) -> dict:
+        rows = sum(entry["count"] for entry in self.videos.values())
+        return {
+            "path": self.path,
+            "videos": len(self.videos),
+            "frames": rows,
+            "chunks": self._next_chunk,
+            "feature_dim": self.feature_dim,
+            "dtype": self.dtype.name,
+            "size_bytes": rows * self.feature_dim * self.dtype.itemsize,
+        }
@@ -0,0 +1,122 @@
+"""
+Image decoding for the serving path
+Decodes uploads directly near the model resolution instead of at full size
+"""
+
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Largest number of pixels a single upload may decode to (after any reduction)
+DEFAULT_MAX_PIXELS = 40_000_000
+
+# libjpeg can decode at 1/2, 1/4 and 1/8 scale by skipping DCT coefficients.
+# OpenCV rotates JPEGs by their EXIF orientation unless told not to; PIL (the
+# reference decode_full and the fallback decode_pil) never does, so every flag
+# ignores it to keep all decode paths producing the same pixels
+JPEG_SCALES = (8, 4, 2)
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION,
+    2: cv2.IMREAD_REDUCED_COLOR_2 | cv2.IMREAD_IGNORE_ORIENTATION,
+    4: cv2.IMREAD_REDUCED_COLOR_4 | cv2.IMREAD_IGNORE_ORIENTATION,
+    8: cv2.IMREAD_REDUCED_COLOR_8 | cv2.IMREAD_IGNORE_ORIENTATION,
+}
+
+# Fastest decoder per format, measured with bench_decode.py: OpenCV for the
+# common upload formats, PIL for everything else
+DECODERS = {
+    "JPEG": "cv2_reduced",
+    "PNG": "cv2",
+    "WEBP": "cv2",
+}
+
+
+class ImageTooLarge(ValueError):
+    """The upload would decode to more pixels than allowed"""
+
+
+def jpeg_scale(width: int, height: int, img_size: int) -> int:
+    """Largest DCT downscale factor that keeps both sides at or above img_size"""
+    for scale in JPEG_SCALES:
+        if min(width, height) // scale >= img_size:
+            return scale
+    return 1
+
+
+def check_pixels(width: int, height: int, scale: int, max_pixels: int):
+    decoded = (width // scale) * (height // scale)
+    if max_pixels and decoded > max_pixels:
+        raise ImageTooLarge(
+            f"Image too large: {width}x{height} decodes to {decoded} pixels (maximum {max_pixels})"
+        )
+
+
+def decode_full(image_bytes: bytes, img_size: int = 128) -> np.ndarray:
+    """
+    Reference decoder: full-size PIL decode, then resize.
+
+    Args:
+        image_bytes: Raw bytes of the uploaded image
+        img_size: Model input resolution
+
+    Returns:
+        uint8 RGB pixels with shape (img_size, img_size, 3)
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.array(image.resize((img_size, img_size)))
+
+
+def decode_cv2(image_bytes: bytes, img_size: int, scale: int = 1) -> np.ndarray:
+    """OpenCV decode (optionally DCT-reduced), area resize, BGR -> RGB; None if OpenCV cannot read it"""
+    buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+    image = cv2.imdecode(buffer, REDUCED_FLAGS[scale])
+    if image is None:
+        return None
+    if image.shape[:2] != (img_size, img_size):
+        image = cv2.resize(image, (img_size, img_size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def decode_pil(image: Image.Image, img_size: int) -> np.ndarray:
+    """PIL decode; JPEGs are drafted (DCT-reduced) close to img_size first"""
+    if image.format == "JPEG":
+        image.draft("RGB", (img_size, img_size))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.array(image.resize((img_size, img_size), reducing_gap=2.0))
+
+
+def decode_reduced(image_bytes: bytes, img_size: int = 128, max_pixels: int = DEFAULT_MAX_PIXELS) -> np.ndarray:
+    """
+    Decode an upload at reduced resolution and resize it to the model input.
+
+    Only the header is parsed to pick the decoder and check the pixel cap;
+    JPEGs are then decoded at 1/2, 1/4 or 1/8 scale in the DCT domain, so a
+    12-megapixel photo never exists in memory at full size.
+
+    Args:
+        image_bytes: Raw bytes of the uploaded image
+        img_size: Model input resolution
+        max_pixels: Maximum decoded pixel count (0 = no limit)
+
+    Returns:
+        uint8 RGB pixels with shape (img_size, img_size, 3)
+
+    Raises:
+        ImageTooLarge: If the image would decode to more than max_pixels
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    width, height = image.size
+    decoder = DECODERS.get(image.format, "pil")
+    scale = jpeg_scale(width, height, img_size) if image.format == "JPEG" else 1
+    check_pixels(width, height, scale, max_pixels)
+
+    if decoder != "pil":
+        pixels = decode_cv2(image_bytes, img_size, scale if decoder == "cv2_reduced" else 1)
+        if pixels is not None:
+            return pixels
+    return decode_pil(image, img_size)
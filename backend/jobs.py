@@ -0,0 +1,286 @@
+"""
+Background jobs
+In-process job queue and worker pool for work too long for one HTTP request,
+with progress reporting, cancellation, retention limits and fair scheduling
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from admission import Overloaded
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class Job:
+    """
+    One unit of background work and its observable state.
+
+    The runner reports progress with `update()`; every update wakes the
+    clients watching the job.
+
+    Args:
+        client: Who submitted the job (used for fair scheduling)
+        params: Job parameters, passed through to the runner
+        path: Input file owned by the job, removed once it finishes
+        filename: Original name of the uploaded input
+    """
+
+    def __init__(self, client: str, params: dict, path: str = None, filename: str = None):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.params = params
+        self.path = path
+        self.filename = filename
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self._task = None
+        self._updated = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def update(self, **progress):
+        """Merge progress fields and wake watchers"""
+        self.progress.update(progress)
+        self._notify()
+
+    def _notify(self):
+        event, self._updated = self._updated, asyncio.Event()
+        event.set()
+
+    def _set_status(self, status: str, error: str = None):
+        self.status = status
+        self.error = error
+        if status == RUNNING:
+            self.started_at = time.time()
+        elif status in FINISHED_STATES:
+            self.finished_at = time.time()
+            self.cleanup()
+        self._notify()
+
+    def cleanup(self):
+        """Remove the job's input file"""
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def snapshot(self, include_result: bool = True) -> dict:
+        snapshot = {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": dict(self.progress),
+            "error": self.error,
+        }
+        if include_result:
+            snapshot["result"] = self.result
+        return snapshot
+
+    async def watch(self, keepalive: float = 15.0):
+        """
+        Yield a snapshot now and after every change until the job finishes.
+
+        Yields None when nothing changed for `keepalive` seconds, so a
+        streaming response can send a heartbeat.
+        """
+        while True:
+            event = self._updated
+            yield self.snapshot(include_result=self.done)
+            if self.done:
+                return
+            try:
+                await asyncio.wait_for(event.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+
+class JobManager:
+    """
+    Runs jobs on a fixed number of workers without an external broker.
+
+    Waiting jobs are queued per client and the workers take them round-robin
+    across clients, so one client submitting many long jobs cannot starve the
+    others. Queued and running jobs can be cancelled; finished jobs are kept
+    for `retention_seconds` (and at most `max_retained` of them) so clients
+    can collect their results.
+
+    Args:
+        run: Coroutine function run(job) that does the work and returns the result
+        workers: Jobs processed concurrently
+        max_queued: Jobs allowed to wait; submissions beyond that raise Overloaded
+        retention_seconds: How long finished jobs stay available
+        max_retained: Maximum number of finished jobs kept
+        retry_after: Seconds suggested to clients rejected because the queue is full
+    """
+
+    def __init__(self, run, workers: int = 2, max_queued: int = 32, retention_seconds: float = 3600.0,
+                 max_retained: int = 100, retry_after: int = 5):
+        self.run = run
+        self.workers = max(1, int(workers))
+        self.max_queued = max(0, int(max_queued))
+        self.retention_seconds = retention_seconds
+        self.max_retained = max(0, int(max_retained))
+        self.retry_after = retry_after
+
+        self._jobs = {}
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._finished = deque()
+        self._available = None
+        self._tasks = []
+
+        self.submitted = 0
+        self.rejected = 0
+
+    def start(self):
+        """Start the worker tasks (must be called inside a running loop)"""
+        if self._tasks:
+            return
+        self._available = asyncio.Semaphore(self._queued)
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel every queued and running job and stop the workers"""
+        for job in list(self._jobs.values()):
+            if not job.done:
+                self.cancel(job.id)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job: Job) -> Job:
+        """
+        Queue a job.
+
+        Raises:
+            Overloaded: If max_queued jobs are already waiting
+        """
+        self.prune()
+        if self._queued >= self.max_queued:
+            self.rejected += 1
+            job.cleanup()
+            raise Overloaded(self.retry_after)
+        self._jobs[job.id] = job
+        self._queues.setdefault(job.client, deque()).append(job)
+        self._queued += 1
+        self.submitted += 1
+        if self._available is not None:
+            self._available.release()
+        return job
+
+    def get(self, job_id: str) -> Job:
+        """Job by id; KeyError if unknown or no longer retained"""
+        self.prune()
+        return self._jobs[job_id]
+
+    def list(self) -> list:
+        self.prune()
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Job:
+        """Cancel a queued or running job (no-op for finished jobs)"""
+        job = self._jobs[job_id]
+        if job.status == QUEUED:
+            queue = self._queues.get(job.client)
+            if queue is not None and job in queue:
+                queue.remove(job)
+                self._queued -= 1
+                if not queue:
+                    del self._queues[job.client]
+            self._finish(job, CANCELLED)
+        elif job.status == RUNNING and job._task is not None:
+            job._task.cancel()
+        return job
+
+    def delete(self, job_id: str):
+        """Forget a finished job"""
+        job = self._jobs[job_id]
+        if not job.done:
+            raise ValueError("Job is still active; cancel it first")
+        del self._jobs[job_id]
+
+    def prune(self):
+        """Drop finished jobs past the retention limits"""
+        now = time.time()
+        while self._finished and (
+            len(self._finished) > self.max_retained
+            or now - self._finished[0].finished_at > self.retention_seconds
+        ):
+            job = self._finished.popleft()
+            self._jobs.pop(job.id, None)
+
+    def _next_job(self) -> Job:
+        """Round-robin over clients: take the first client's oldest job, then move it to the back"""
+        if not self._queues:
+            return None
+        client, queue = next(iter(self._queues.items()))
+        job = queue.popleft()
+        self._queued -= 1
+        if queue:
+            self._queues.move_to_end(client)
+        else:
+            del self._queues[client]
+        return job
+
+    def _finish(self, job: Job, status: str, error: str = None):
+        job._set_status(status, error)
+        self._finished.append(job)
+        self.prune()
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            job = self._next_job()
+            if job is None:
+                continue  # Cancelled while queued
+
+            job._set_status(RUNNING)
+            job._task = asyncio.get_running_loop().create_task(self.run(job))
+            try:
+                job.result = await job._task
+            except asyncio.CancelledError:
+                if not job._task.cancelled():
+                    # The worker itself is being stopped
+                    job._task.cancel()
+                    self._finish(job, CANCELLED)
+                    raise
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                self._finish(job, FAILED, str(e))
+            else:
+                self._finish(job, SUCCEEDED)
+            finally:
+                job._task = None
+
+    def stats(self) -> dict:
+        counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            "clients_waiting": len(self._queues),
+            "jobs": counts,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+        }
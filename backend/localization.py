@@ -0,0 +1,187 @@
+"""
+Temporal action localization
+Overlapping windows over shared per-frame backbone features, and merging of
+window scores into time-stamped action segments
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class SlidingWindows:
+    """
+    Turns a stream of per-frame features into overlapping fixed-length windows.
+
+    Every frame's feature is computed once and shared by all windows that
+    cover it, so a window costs one head evaluation instead of a backbone
+    pass over each of its frames. Only the features that later windows still
+    need are kept.
+
+    Args:
+        length: Frames per window (the model's sequence length)
+        stride: Frames between the starts of consecutive windows (1..length)
+    """
+
+    def __init__(self, length: int, stride: int):
+        if not 1 <= stride <= length:
+            raise ValueError(f"stride must be between 1 and {length}, got {stride}")
+        self.length = length
+        self.stride = stride
+        self.total = 0
+        self._buffer = None
+        self._offset = 0
+        self._next_start = 0
+        self._last_start = None
+
+    def _windows(self, starts: list) -> np.ndarray:
+        # (frames - length + 1, feature_dim, length) view -> (windows, length, feature_dim)
+        view = sliding_window_view(self._buffer, self.length, axis=0)
+        return view[[start - self._offset for start in starts]].transpose(0, 2, 1)
+
+    def push(self, features: np.ndarray) -> tuple:
+        """
+        Add the next frames' features.
+
+        Args:
+            features: Features with shape (frames, feature_dim)
+
+        Returns:
+            (starts, windows): start frames of the windows completed by these
+            frames and their features with shape (len(starts), length, feature_dim)
+        """
+        if len(features) == 0:
+            return [], None
+        self._buffer = features if self._buffer is None else np.concatenate([self._buffer, features])
+        self.total += len(features)
+
+        starts = list(range(self._next_start, self.total - self.length + 1, self.stride))
+        windows = self._windows(starts) if starts else None
+        if starts:
+            self._last_start = starts[-1]
+            self._next_start = starts[-1] + self.stride
+
+        # Keep what the next window, or a final end-aligned window, can still use
+        keep_from = min(self._next_start, max(self.total - self.length, 0))
+        if keep_from > self._offset:
+            self._buffer = self._buffer[keep_from - self._offset:]
+            self._offset = keep_from
+        return starts, windows
+
+    def finish(self) -> tuple:
+        """
+        Windows covering the tail of the stream.
+
+        A stream shorter than one window is padded by repeating its last
+        frame; otherwise, if the stride skipped the final frames, one more
+        window aligned to the end is added.
+
+        Returns:
+            (starts, windows) like push
+        """
+        if self._buffer is None:
+            return [], None
+        if self.total < self.length:
+            padding = np.repeat(self._buffer[-1:], self.length - self.total, axis=0)
+            self._last_start = 0
+            return [0], np.concatenate([self._buffer, padding])[np.newaxis]
+        start = self.total - self.length
+        if self._last_start is not None and self._last_start >= start:
+            return [], None
+        self._last_start = start
+        return [start], self._windows([start])
+
+
+def count_windows(frames: int, length: int, stride: int) -> int:
+    """Windows SlidingWindows produces for a stream of `frames` frames, including the tail from finish()"""
+    if frames <= 0:
+        return 0
+    if frames < length:
+        return 1
+    windows = (frames - length) // stride + 1
+    # finish() adds an end-aligned window when the stride skipped the final frames
+    return windows + (1 if (frames - length) % stride else 0)
+
+
+def frame_scores(window_probabilities: np.ndarray, starts: list, length: int, num_frames: int) -> np.ndarray:
+    """
+    Per-frame class scores: the mean probabilities of every window covering the frame.
+
+    Args:
+        window_probabilities: Probabilities with shape (windows, num_classes)
+        starts: Start frame of each window
+        length: Frames per window
+        num_frames: Frames in the stream
+
+    Returns:
+        Scores with shape (num_frames, num_classes)
+    """
+    totals = np.zeros((num_frames, window_probabilities.shape[1]), dtype=np.float64)
+    counts = np.zeros(num_frames, dtype=np.int64)
+    for start, probabilities in zip(starts, window_probabilities):
+        end = min(start + length, num_frames)
+        totals[start:end] += probabilities
+        counts[start:end] += 1
+    return (totals / np.maximum(counts, 1)[:, np.newaxis]).astype(np.float32)
+
+
+def merge_segments(scores: np.ndarray, frame_times: np.ndarray, frame_duration: float, action_names: list,
+                   min_confidence: float = 0.3, min_duration: float = 1.0, max_gap: float = 1.0,
+                   frame_indices: list = None) -> list:
+    """
+    Merge per-frame scores into action segments.
+
+    Consecutive frames with the same top class form a run; runs whose mean
+    score is below `min_confidence` are treated as background. Runs of the
+    same action separated by at most `max_gap` seconds are joined, and
+    segments shorter than `min_duration` seconds are dropped.
+
+    Args:
+        scores: Per-frame scores with shape (frames, num_classes)
+        frame_times: Timestamp of each frame in seconds
+        frame_duration: Seconds covered by one sampled frame
+        action_names: Class names, indexed like the scores
+        min_confidence: Minimum mean probability of a segment (0-1)
+        min_duration: Minimum segment length in seconds
+        max_gap: Largest gap in seconds bridged between segments of the same action
+        frame_indices: Source video frame of each scored frame (default: positions)
+
+    Returns:
+        List of {"action", "start_seconds", "end_seconds", "confidence",
+        "start_frame", "end_frame"} dicts in time order
+    """
+    if len(scores) == 0:
+        return []
+    if frame_indices is None:
+        frame_indices = list(range(len(scores)))
+    labels = scores.argmax(axis=1)
+    boundaries = np.flatnonzero(np.diff(labels)) + 1
+    runs = zip(np.concatenate([[0], boundaries]), np.concatenate([boundaries, [len(labels)]]))
+
+    segments = []
+    for first, end in runs:
+        label = int(labels[first])
+        if scores[first:end, label].mean() < min_confidence:
+            continue
+        previous = segments[-1] if segments else None
+        if (previous is not None and previous["label"] == label
+                and frame_times[first] - (frame_times[previous["end"] - 1] + frame_duration) <= max_gap):
+            previous["end"] = end
+        else:
+            segments.append({"label": label, "first": first, "end": end})
+
+    results = []
+    for segment in segments:
+        first, end, label = segment["first"], segment["end"], segment["label"]
+        start_seconds = float(frame_times[first])
+        end_seconds = float(frame_times[end - 1] + frame_duration)
+        if end_seconds - start_seconds < min_duration:
+            continue
+        results.append({
+            "action": action_names[label],
+            "start_seconds": round(start_seconds, 3),
+            "end_seconds": round(end_seconds, 3),
+            "confidence": round(float(scores[first:end, label].mean()) * 100, 2),
+            "start_frame": int(frame_indices[first]),
+            "end_frame": int(frame_indices[end - 1]),
+        })
+    return results
@@ -4,14 +4,37 @@ FastAPI backend for the UCF101 action recognition model
 """
 
 import os
-import io
+import asyncio
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
 import numpy as np
-import cv2
-from PIL import Image
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from typing import List
+from fastapi import FastAPI, File, UploadFile, HTTPException, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import tensorflow as tf
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+
+# TensorFlow/Keras are imported lazily inside load_model, so the API (and /health)
+# comes up immediately while the model loads in the background
+
+from batching import MicroBatcher, DeadlineExceeded
+from admission import AdmissionController, Overloaded, parse_deadline, check_deadline
+from serving_model import ServingModel
+from registry import ModelRegistry, parse_model_versions, version_name
+from runtimes import RUNTIMES, ExportedModel
+from cache import PredictionCache, SingleFlight, content_hash
+from persistent_cache import PersistentCache, model_fingerprint
+from encoding import JSON, NotAcceptable, negotiate, dumps, encoded_response, top_predictions
+from imaging import DEFAULT_MAX_PIXELS, ImageTooLarge, decode_full, decode_reduced
+from metrics import Registry, StageTimer
+from bulk import is_zip_upload, iter_zip_images, predict_bulk
+from stream import LatestFrameSlot, FeatureWindow
+from video import VIDEO_CONTENT_TYPES, VIDEO_EXTENSIONS, SAMPLING_MODES, SampledFrameReader, read_video_clip
+from jobs import Job, JobManager
+from localization import SlidingWindows, count_windows, frame_scores, merge_segments
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -27,6 +50,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
 # Action class names (must match training order - 50 classes)
@@ -84,31 +108,275 @@ ACTION_NAMES = [
 ]
 
 # Model path - using the manually rebuilt MobileNetV2 model (safest option)
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "rebuilt_mobilenet.keras")
+MODEL_PATH = os.environ.get(
+    "MODEL_PATH",
+    os.path.join(os.path.dirname(__file__), "..", "rebuilt_mobilenet.keras")
+)
+
+# Micro-batching settings: concurrent requests are grouped into one forward pass
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+# Image decoding: FAST_DECODE decodes JPEGs at reduced resolution (DCT scaling)
+# and uses the fastest decoder per format; MAX_DECODE_PIXELS caps decoded size
+FAST_DECODE = os.environ.get("FAST_DECODE", "1") != "0"
+MAX_DECODE_PIXELS = int(os.environ.get("MAX_DECODE_PIXELS", str(DEFAULT_MAX_PIXELS)))
+
+# Predictions returned per image when a request does not pass ?top_k= (0 = all classes)
+DEFAULT_TOP_K = int(os.environ.get("DEFAULT_TOP_K", "0"))
+
+# Largest accepted video upload
+MAX_VIDEO_BYTES = int(os.environ.get("MAX_VIDEO_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Background video jobs (/jobs): long videos are processed by JOB_WORKERS
+# in-process workers, at most JOB_MAX_QUEUED wait, and finished jobs are kept
+# for JOB_RETENTION_SECONDS (at most JOB_MAX_RETAINED of them)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", "32"))
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", "3600"))
+JOB_MAX_RETAINED = int(os.environ.get("JOB_MAX_RETAINED", "100"))
+JOB_MAX_VIDEO_BYTES = int(os.environ.get("JOB_MAX_VIDEO_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Frames per second sampled from a job's video, and windows per forward pass
+JOB_SAMPLE_FPS = float(os.environ.get("JOB_SAMPLE_FPS", "4"))
+JOB_WINDOW_BATCH = int(os.environ.get("JOB_WINDOW_BATCH", "16"))
+# Localization jobs: sampled frames between overlapping window starts
+JOB_LOCALIZE_STRIDE = int(os.environ.get("JOB_LOCALIZE_STRIDE", "2"))
+
+# Bulk prediction settings
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", "64"))
+BULK_MAX_ITEMS = int(os.environ.get("BULK_MAX_ITEMS", "10000"))
+MAX_ZIP_BYTES = int(os.environ.get("MAX_ZIP_BYTES", str(1024 * 1024 * 1024)))
+
+# Admission control for /predict and /predict/video: at most MAX_IN_FLIGHT requests
+# are served at once and MAX_QUEUED wait; the rest get 503 + Retry-After.
+# MAX_IN_FLIGHT=0 disables it.
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", str(BATCH_MAX_SIZE * 4)))
+MAX_QUEUED = int(os.environ.get("MAX_QUEUED", str(BATCH_MAX_SIZE * 8)))
+RETRY_AFTER_SECONDS = int(os.environ.get("RETRY_AFTER_SECONDS", "1"))
+# Per-request time budget in milliseconds; requests past it are dropped
+# before inference. DEFAULT_DEADLINE_MS applies when the header is missing.
+DEADLINE_HEADER = "X-Deadline-Ms"
+DEFAULT_DEADLINE_MS = float(os.environ.get("DEFAULT_DEADLINE_MS", "0"))
+
+# Thread pools keeping blocking work off the asyncio event loop
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "1"))
+
+# Prediction cache settings (CACHE_MAX_ENTRIES=0 disables the cache)
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "3600"))
+# Identical images arriving while one of them is being predicted share its
+# forward pass instead of queueing their own (COALESCE_REQUESTS=0 disables it)
+COALESCE_REQUESTS = os.environ.get("COALESCE_REQUESTS", "1") != "0"
+# Persistent prediction and feature cache in a SQLite file, shared by every
+# worker and kept across restarts (empty PERSISTENT_CACHE_PATH disables it)
+PERSISTENT_CACHE_PATH = os.environ.get("PERSISTENT_CACHE_PATH", "")
+PERSISTENT_CACHE_MAX_MB = float(os.environ.get("PERSISTENT_CACHE_MAX_MB", "1024"))
+PERSISTENT_CACHE_FEATURES = os.environ.get("PERSISTENT_CACHE_FEATURES", "1") != "0"
 
-# Global model variable
-model = None
+# Inference runtime: "keras" serves MODEL_PATH directly, "tflite" / "onnx" serve
+# the graphs written by export_models.py into EXPORT_DIR
+INFERENCE_RUNTIME = os.environ.get("INFERENCE_RUNTIME", "keras")
+INFERENCE_PRECISION = os.environ.get("INFERENCE_PRECISION", "float32")
+EXPORT_DIR = os.environ.get(
+    "EXPORT_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "exports", "rebuilt_mobilenet")
+)
+RUNTIME_THREADS = int(os.environ.get("RUNTIME_THREADS", "0")) or None
 
+# Model versions served side by side: "name=path,name=path" where a path is a
+# .keras file or an export directory. Defaults to the single MODEL_PATH/EXPORT_DIR
+# model. Requests pick a version with ?model=<name> or the X-Model-Version header.
+MODEL_VERSIONS = parse_model_versions(os.environ.get("MODEL_VERSIONS", "")) or {
+    version_name(path): path
+    for path in [MODEL_PATH if INFERENCE_RUNTIME == "keras" else EXPORT_DIR]
+}
+DEFAULT_MODEL_VERSION = os.environ.get("DEFAULT_MODEL_VERSION", next(iter(MODEL_VERSIONS)))
+# Directories POST /models/{name}/load?path= may load from ("dir,dir"); defaults
+# to the directories holding the configured versions
+MODEL_DIRS = [
+    os.path.realpath(directory.strip())
+    for directory in os.environ.get("MODEL_DIRS", "").split(",") if directory.strip()
+] or sorted({os.path.dirname(os.path.realpath(path)) for path in MODEL_VERSIONS.values()})
 
-def load_model():
-    """Load the Keras model on startup"""
-    global model
-    if model is None:
-        print(f"Loading model from: {MODEL_PATH}")
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
+# Prometheus metrics exposed on /metrics
+metrics = Registry()
+REQUESTS = metrics.counter(
+    "action_requests_total", "HTTP requests handled", ("method", "path", "status")
+)
+REQUEST_LATENCY = metrics.histogram(
+    "action_request_duration_seconds", "End-to-end HTTP request latency", ("path",)
+)
+IN_FLIGHT = metrics.gauge(
+    "action_requests_in_flight", "HTTP requests currently being handled"
+)
+STAGE_LATENCY = metrics.histogram(
+    "action_stage_duration_seconds", "Latency of each /predict stage (decode, preprocess, infer, serialize)", ("stage",)
+)
+QUEUE_DEPTH = metrics.gauge(
+    "action_queue_depth", "Items waiting in a batching queue", ("model", "queue")
+)
+BATCHES = metrics.counter(
+    "action_batches_total", "Forward passes run by a batching queue", ("model", "queue")
+)
+BATCHED_ITEMS = metrics.counter(
+    "action_batched_items_total", "Items processed by a batching queue", ("model", "queue")
+)
+CACHE_LOOKUPS = metrics.counter(
+    "action_cache_lookups_total", "Prediction cache lookups", ("result",)
+)
+COALESCED_REQUESTS = metrics.counter(
+    "action_coalesced_requests_total", "Requests served by joining an identical in-flight prediction"
+)
+COALESCE_IN_FLIGHT = metrics.gauge(
+    "action_coalesce_in_flight", "Distinct images currently being predicted"
+)
+PERSISTENT_CACHE_LOOKUPS = metrics.counter(
+    "action_persistent_cache_lookups_total", "Persistent prediction cache lookups", ("result",)
+)
+PERSISTENT_CACHE_BYTES = metrics.gauge(
+    "action_persistent_cache_bytes", "Payload stored in the persistent prediction cache"
+)
+SHED_REQUESTS = metrics.counter(
+    "action_shed_requests_total", "Requests rejected or dropped by admission control", ("reason",)
+)
+ADMISSION_IN_FLIGHT = metrics.gauge(
+    "action_admission_in_flight", "Requests holding an admission slot"
+)
+ADMISSION_WAITING = metrics.gauge(
+    "action_admission_waiting", "Requests waiting for an admission slot"
+)
+BATCH_EXPIRED = metrics.counter(
+    "action_batch_expired_total", "Items dropped by a batching queue because their deadline passed", ("model", "queue")
+)
+JOBS = metrics.gauge(
+    "action_jobs", "Background jobs by state", ("status",)
+)
+MODEL_LOAD_SECONDS = metrics.gauge(
+    "action_model_load_seconds", "Time taken by the last load of a model version", ("model",)
+)
+MODEL_LOADED = metrics.gauge(
+    "action_model_loaded", "1 if a model version is loaded", ("model",)
+)
+MODEL_IN_FLIGHT = metrics.gauge(
+    "action_model_in_flight", "Requests currently using a model version (including retired ones)", ("model",)
+)
+
+
+def load_model(name: str, source: str):
+    """
+    Load and warm up one model version.
+    
+    Runs on the load pool; the registry only swaps the version in after its
+    graphs are traced, so requests never hit a cold model.
+    
+    Args:
+        name: Version name (for logging)
+        source: .keras file, or an export directory for the tflite/onnx runtimes
         
-        # Load the rebuilt model directly with keras
+    Returns:
+        (serving_model, load_timings)
+    """
+    started = time.perf_counter()
+    timings = {}
+    
+    if INFERENCE_RUNTIME not in RUNTIMES:
+        raise ValueError(f"Unknown INFERENCE_RUNTIME: {INFERENCE_RUNTIME}. Allowed: {RUNTIMES}")
+    
+    if os.path.isdir(source):
+        if INFERENCE_RUNTIME == "keras":
+            raise ValueError(f"{source} is an export directory; set INFERENCE_RUNTIME to tflite or onnx")
+        print(f"Loading {name}: {INFERENCE_RUNTIME} ({INFERENCE_PRECISION}) graphs from: {source}")
+        step = time.perf_counter()
+        serving_model = ExportedModel(source, INFERENCE_RUNTIME, INFERENCE_PRECISION, RUNTIME_THREADS)
+        timings["load"] = time.perf_counter() - step
+        print("Model loaded successfully!")
+        if serving_model.drift:
+            print(f"Accuracy drift vs Keras reference: {serving_model.drift}")
+    else:
+        print(f"Loading {name} from: {source}")
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Model file not found at {source}")
+        
+        # Load the rebuilt model directly with keras (first import pulls in TensorFlow)
+        step = time.perf_counter()
         import keras
-        model = keras.models.load_model(MODEL_PATH, compile=False)
+        timings["import"] = time.perf_counter() - step
+        
+        step = time.perf_counter()
+        model = keras.models.load_model(source, compile=False)
+        timings["load"] = time.perf_counter() - step
         print("Model loaded successfully!")
         print(f"Model input shape: {model.input_shape}")
         print(f"Model output shape: {model.output_shape}")
+        
+        # Split into backbone + temporal head so a still image runs the CNN once
+        step = time.perf_counter()
+        serving_model = ServingModel(model)
+        timings["split"] = time.perf_counter() - step
     
-    return model
+    # Trace the inference graphs before the model takes traffic
+    step = time.perf_counter()
+    serving_model.warmup()
+    timings["warmup"] = time.perf_counter() - step
+    
+    load_seconds = time.perf_counter() - started
+    timings["total"] = load_seconds
+    MODEL_LOAD_SECONDS.set(load_seconds, model=name)
+    print(f"Model {name} ready in {load_seconds:.2f}s "
+          f"({', '.join(f'{k} {v:.2f}s' for k, v in timings.items() if k != 'total')})")
+    
+    return serving_model, {step: round(seconds, 3) for step, seconds in timings.items()}
+
+
+def decode_image(image_bytes: bytes, img_size: int = 128) -> np.ndarray:
+    """
+    Decode an uploaded image and resize it to the model resolution.
+    
+    Args:
+        image_bytes: Raw bytes of the uploaded image
+        img_size: Model input resolution
+        
+    Returns:
+        uint8 RGB pixels with shape (img_size, img_size, 3)
+        
+    Raises:
+        ImageTooLarge: If the image decodes to more than MAX_DECODE_PIXELS
+    """
+    if FAST_DECODE:
+        # Decode directly near the model resolution (see imaging.py)
+        return decode_reduced(image_bytes, img_size, MAX_DECODE_PIXELS)
+    
+    # Full-size decode, then resize (the reference path)
+    return decode_full(image_bytes, img_size)
+
+
+def preprocess_pixels(pixels: np.ndarray) -> np.ndarray:
+    """
+    Shape decoded pixels into a model-ready clip.
+    
+    The serving model takes uint8 pixels and scales them to the backbone's
+    input range inside its graph, so no float32 copy is made here.
+    
+    Args:
+        pixels: uint8 RGB pixels with shape (128, 128, 3), or a stack of
+            video frames with shape (T, 128, 128, 3)
+        
+    Returns:
+        uint8 clip with shape (1, 128, 128, 3) for a still image or
+        (T, 128, 128, 3) for video frames. The serving model runs the
+        backbone on a still image once and tiles its features over the
+        12-step sequence.
+    """
+    # Add frame dimension for still images (a view, not a copy)
+    if pixels.ndim == 3:
+        return pixels[np.newaxis]  # Shape: (1, 128, 128, 3)
+    
+    return pixels
 
 
-def preprocess_image(image_bytes: bytes) -> np.ndarray:
+def preprocess_image(image_bytes: bytes, img_size: int = 128) -> np.ndarray:
     """
     Preprocess an uploaded image for model prediction.
     
@@ -120,45 +388,562 @@ def preprocess_image(image_bytes: bytes) -> np.ndarray:
     
     Args:
         image_bytes: Raw bytes of the uploaded image
+        img_size: Model input resolution
         
     Returns:
-        Preprocessed numpy array with shape (1, 12, 128, 128, 3)
+        uint8 single-frame clip with shape (1, img_size, img_size, 3)
     """
-    # Step 1: Load image from bytes
-    image = Image.open(io.BytesIO(image_bytes))
+    return preprocess_pixels(decode_image(image_bytes, img_size))
+
+
+def extract_features_batch(serving_model, frames: list) -> np.ndarray:
+    """
+    Run the CNN backbone over single frames from several streams.
     
-    # Convert to RGB if necessary (handles PNG with alpha, grayscale, etc.)
-    if image.mode != 'RGB':
-        image = image.convert('RGB')
+    Args:
+        serving_model: Model version to run
+        frames: List of preprocessed frames with shape (128, 128, 3)
+        
+    Returns:
+        Features with shape (len(frames), feature_dim)
+    """
+    return serving_model.extract_features(np.stack(frames))
+
+
+def predict_clips_batch(serving_model, clips: list) -> list:
+    """
+    Predict stacked clips, keeping each clip's backbone features.
     
-    # Step 2: Resize to 128x128 (matching model input spec)
-    image = image.resize((128, 128))
+    Args:
+        serving_model: Model version to run
+        clips: List of uint8 clips with shape (1 or 12, H, W, 3)
+        
+    Returns:
+        One (probabilities, features) pair per clip; features are None for
+        models without a backbone/head split
+    """
+    probabilities, features = serving_model.predict_clips_with_features(clips)
+    return list(zip(probabilities, features))
+
+
+def predict_windows_batch(serving_model, windows: list) -> np.ndarray:
+    """
+    Run the temporal head over feature windows from several streams.
     
-    # Step 3: Convert to array
-    img_array = np.array(image)
+    Args:
+        serving_model: Model version to run
+        windows: List of feature sequences with shape (12, feature_dim)
+        
+    Returns:
+        Probabilities with shape (len(windows), num_classes)
+    """
+    return serving_model.predict_features(np.stack(windows))
+
+
+# Decode/preprocess run on one pool, model calls on another, so PIL work
+# can overlap with a forward pass and /health never waits behind either
+decode_pool = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+inference_pool = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+# Model versions load on their own thread, so serving continues during a reload
+load_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="load")
+# Persistent cache writes happen off the request path, one at a time per worker
+cache_write_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-write")
+
+
+async def run_in_pool(pool, func, *args):
+    """Run a blocking function on a thread pool and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, func, *args)
+
+
+def clamp_top_k(top_k: int = None) -> int:
+    """
+    Number of predictions to return, capped at the number of classes.
+    
+    Args:
+        top_k: Requested count (None = DEFAULT_TOP_K, then all classes)
+    
+    Raises:
+        HTTPException: 400 if top_k is below 1
+    """
+    if top_k is None:
+        top_k = DEFAULT_TOP_K or len(ACTION_NAMES)
+    elif top_k < 1:
+        raise HTTPException(status_code=400, detail=f"top_k must be at least 1, got {top_k}")
+    return max(1, min(top_k, len(ACTION_NAMES)))
+
+
+def prediction_fields(probabilities: np.ndarray, top_k: int, include_probabilities: bool = False) -> dict:
+    """
+    Response fields describing one prediction.
+    
+    Args:
+        probabilities: Softmax output with shape (num_classes,)
+        top_k: Number of ranked predictions to include
+        include_probabilities: Also include the raw probability vector,
+            indexed like /actions
+        
+    Returns:
+        Dict with "predictions", "top_prediction" and optionally "probabilities"
+    """
+    results = top_predictions(probabilities, ACTION_NAMES, top_k)
+    fields = {
+        "predictions": results,
+        "top_prediction": {
+            "action": results[0]["action"],
+            "confidence": results[0]["confidence"]
+        }
+    }
+    if include_probabilities:
+        fields["probabilities"] = probabilities
+    return fields
+
+
+def response_encoding(request: Request) -> str:
+    """Response encoding negotiated from the Accept header (406 if none fits)"""
+    try:
+        return negotiate(request.headers.get("accept"))
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+# Predictions keyed by decoded pixel content
+prediction_cache = PredictionCache(
+    max_entries=CACHE_MAX_ENTRIES,
+    ttl_seconds=CACHE_TTL_SECONDS
+)
+# Predictions currently running, keyed like the cache
+inflight_predictions = SingleFlight(enabled=COALESCE_REQUESTS)
+# Predictions and features on disk, keyed by model fingerprint and pixel hash
+persistent_cache = PersistentCache(
+    PERSISTENT_CACHE_PATH,
+    max_bytes=int(PERSISTENT_CACHE_MAX_MB * 1024 * 1024),
+    store_features=PERSISTENT_CACHE_FEATURES
+) if PERSISTENT_CACHE_PATH else None
+
+
+def stored_prediction(version, pixel_hash: str) -> np.ndarray:
+    """Probabilities from the persistent cache (None on a miss or when it is disabled)"""
+    if persistent_cache is None or version.model_id is None:
+        return None
+    stored = persistent_cache.get(version.model_id, pixel_hash)
+    return stored[0] if stored is not None else None
+
+
+def store_prediction(version, pixel_hash: str, probabilities: np.ndarray, features: np.ndarray):
+    """Queue a persistent cache write without waiting for it"""
+    if persistent_cache is not None and version.model_id is not None:
+        cache_write_pool.submit(persistent_cache.put, version.model_id, pixel_hash, probabilities, features)
+
+
+def predict_and_store(version, clips: list) -> np.ndarray:
+    """predict_clips for single-image clips that also fills the persistent cache"""
+    results = predict_clips_batch(version.serving_model, clips)
+    for clip, (probabilities, features) in zip(clips, results):
+        store_prediction(version, content_hash(clip[0]), probabilities, features)
+    return np.stack([probabilities for probabilities, _ in results])
+
+
+def make_batchers(serving_model) -> dict:
+    """Batching queues in front of one model version"""
+    return {
+        # Shared batching queue in front of model.predict
+        "predict": MicroBatcher(
+            partial(predict_clips_batch, serving_model),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            executor=inference_pool
+        ),
+        # Live streams batch their backbone and head calls separately, so a new
+        # frame costs one CNN pass instead of a full TimeDistributed window
+        "stream_features": MicroBatcher(
+            partial(extract_features_batch, serving_model),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            executor=inference_pool
+        ),
+        "stream_head": MicroBatcher(
+            partial(predict_windows_batch, serving_model),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            executor=inference_pool
+        ),
+    }
+
+
+registry = ModelRegistry(
+    MODEL_VERSIONS, DEFAULT_MODEL_VERSION, load_model, make_batchers,
+    fingerprint=model_fingerprint if persistent_cache is not None else None
+)
+
+admission = AdmissionController(MAX_IN_FLIGHT, MAX_QUEUED, RETRY_AFTER_SECONDS)
+
+
+def window_clips(frames: np.ndarray, length: int) -> list:
+    """Split consecutive frames into clips of `length`, padding the last one with its final frame"""
+    clips = []
+    for start in range(0, len(frames), length):
+        clip = frames[start:start + length]
+        if len(clip) < length:
+            clip = np.concatenate([clip, np.repeat(clip[-1:], length - len(clip), axis=0)])
+        clips.append(clip)
+    return clips
+
+
+async def classify_windows(job: Job, serving_model, reader: SampledFrameReader) -> dict:
+    """
+    Classify consecutive, non-overlapping windows of a long video.
+    
+    Frames are decoded JOB_WINDOW_BATCH windows at a time, so memory stays
+    flat however long the video is; each chunk of windows is one forward pass.
+    """
+    length = serving_model.sequence_length
+    top_k = job.params["top_k"]
+    job.update(windows_total=-(-reader.total_samples // length) if reader.total_samples else None)
     
-    # Step 4: Use MobileNetV2 preprocessing (scales to -1 to 1 range)
-    from keras.applications.mobilenet_v2 import preprocess_input
-    img_array = img_array.astype(np.float32)
-    img_array = preprocess_input(img_array)
+    windows = []
+    probability_sum = 0.0
+    while not reader.finished:
+        indices, frames = await run_in_pool(decode_pool, reader.read, length * JOB_WINDOW_BATCH)
+        if not indices:
+            break
+        probabilities = await run_in_pool(
+            inference_pool, serving_model.predict_clips, window_clips(frames, length)
+        )
+        for start, row in zip(range(0, len(indices), length), probabilities):
+            first, last = indices[start], indices[min(start + length, len(indices)) - 1]
+            windows.append({
+                "window": len(windows),
+                "start_frame": first,
+                "end_frame": last,
+                "start_seconds": round(first / reader.fps, 3),
+                "end_seconds": round((last + 1) / reader.fps, 3),
+                **prediction_fields(row, top_k)
+            })
+        probability_sum = probability_sum + probabilities.sum(axis=0)
+        job.update(windows_done=len(windows), frames_decoded=reader.position)
+    
+    if not windows:
+        raise ValueError("Could not decode any frames from video")
+    return {
+        "windows": windows,
+        # Whole-video prediction: the mean of the window probabilities
+        **prediction_fields(probability_sum / len(windows), top_k)
+    }
+
+
+async def localize_actions(job: Job, serving_model, reader: SampledFrameReader) -> dict:
+    """
+    Find when each action happens in a long video.
+    
+    The backbone runs once per sampled frame; overlapping windows starting
+    every `stride` frames reuse those features, and all windows completed by
+    a decoded chunk go through the temporal head in one batched call. Window
+    scores are averaged per frame and merged into action segments.
+    """
+    if not serving_model.is_split:
+        raise ValueError("Localization requires a backbone/head split model")
+    params = job.params
+    length = serving_model.sequence_length
+    sliding = SlidingWindows(length, params["stride"])
+    if reader.total_samples:
+        job.update(windows_total=count_windows(reader.total_samples, length, params["stride"]))
+    
+    frame_indices = []
+    starts = []
+    window_probabilities = []
+    seconds = {"decode": 0.0, "backbone": 0.0, "head": 0.0}
+    
+    async def run_head(window_starts, windows):
+        if not window_starts:
+            return
+        started = time.perf_counter()
+        window_probabilities.append(await run_in_pool(
+            inference_pool, serving_model.predict_features, np.ascontiguousarray(windows)
+        ))
+        seconds["head"] += time.perf_counter() - started
+        starts.extend(window_starts)
+    
+    while not reader.finished:
+        started = time.perf_counter()
+        indices, frames = await run_in_pool(decode_pool, reader.read, length * JOB_WINDOW_BATCH)
+        seconds["decode"] += time.perf_counter() - started
+        if not indices:
+            break
+        frame_indices.extend(indices)
+        
+        started = time.perf_counter()
+        features = await run_in_pool(inference_pool, serving_model.extract_features, frames)
+        seconds["backbone"] += time.perf_counter() - started
+        
+        await run_head(*sliding.push(features))
+        job.update(windows_done=len(starts), frames_decoded=reader.position)
+    await run_head(*sliding.finish())
+    job.update(windows_done=len(starts), frames_decoded=reader.position)
+    
+    if not starts:
+        raise ValueError("Could not decode any frames from video")
+    window_probabilities = np.concatenate(window_probabilities)
+    scores = frame_scores(window_probabilities, starts, length, len(frame_indices))
+    segments = merge_segments(
+        scores,
+        np.asarray(frame_indices) / reader.fps,
+        reader.step / reader.fps,
+        ACTION_NAMES,
+        min_confidence=params["min_confidence"] / 100.0,
+        min_duration=params["min_segment_seconds"],
+        max_gap=params["max_gap_seconds"],
+        frame_indices=frame_indices
+    )
+    return {
+        "segments": segments,
+        "cost": {
+            "backbone_frames": len(frame_indices),
+            "windows": len(starts),
+            "backbone_frames_per_window": round(len(frame_indices) / len(starts), 3),
+            "seconds": {stage: round(value, 3) for stage, value in seconds.items()},
+            "head_ms_per_window": round(seconds["head"] * 1000 / len(starts), 3)
+        },
+        # Whole-video prediction: the mean of the window probabilities
+        **prediction_fields(window_probabilities.mean(axis=0), params["top_k"])
+    }
+
+
+# Job modes: one label per consecutive window, or a timeline of action segments
+JOB_MODES = {
+    "classify": classify_windows,
+    "localize": localize_actions,
+}
+
+
+async def run_video_job(job: Job) -> dict:
+    """
+    Process a long video on a job worker.
     
-    # Step 5: Create sequence (repeat the image 12 times)
-    sequence = np.array([img_array] * 12)
+    Frames are sampled at the job's sample_fps and read sequentially in
+    chunks; progress is reported after every chunk.
     
-    # Step 6: Add batch dimension
-    input_data = np.expand_dims(sequence, axis=0)  # Shape: (1, 12, 128, 128, 3)
+    Args:
+        job: Job whose params hold the mode, model version, sample_fps and top_k
+        
+    Returns:
+        The video description plus the mode's result
+    """
+    params = job.params
+    async with lease_version(params["model"]) as version:
+        serving_model = version.serving_model
+        reader = await run_in_pool(
+            decode_pool, SampledFrameReader, job.path, params["sample_fps"], serving_model.img_size
+        )
+        try:
+            job.update(
+                model_version=version.name,
+                total_frames=reader.total_frames,
+                windows_done=0,
+                frames_decoded=0
+            )
+            result = await JOB_MODES[params["mode"]](job, serving_model, reader)
+        finally:
+            await run_in_pool(decode_pool, reader.close)
     
-    return input_data
+    return {
+        "model_version": version.name,
+        "mode": params["mode"],
+        "video": {
+            "total_frames": reader.position,
+            "fps": round(reader.fps, 3),
+            "duration_seconds": round(reader.position / reader.fps, 3),
+            "sample_fps": round(reader.sample_fps, 3)
+        },
+        **result
+    }
+
+
+job_manager = JobManager(
+    run_video_job,
+    workers=JOB_WORKERS,
+    max_queued=JOB_MAX_QUEUED,
+    retention_seconds=JOB_RETENTION_SECONDS,
+    max_retained=JOB_MAX_RETAINED,
+    retry_after=RETRY_AFTER_SECONDS
+)
+
+
+def requested_version(connection) -> str:
+    """Model version a request asks for (?model=<name> or X-Model-Version header)"""
+    return connection.query_params.get("model") or connection.headers.get("x-model-version")
+
+
+async def ensure_version(connection) -> str:
+    """Validate the requested model version and load it if needed; returns its name"""
+    name = requested_version(connection)
+    try:
+        name = registry.resolve(name)
+    except KeyError:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown model version: {name}. Available: {list(registry.sources)}"
+        )
+    await registry.ensure_loaded(name, load_pool)
+    return name
+
+
+async def ensure_still_loaded(name: str):
+    """
+    Make sure a version is loaded right before it is leased.
+    
+    It may have been unloaded (DELETE /models/{name}) since ensure_version, while
+    the request was reading its upload; it is then loaded again once. Call
+    registry.acquire right after, with no await in between.
+    
+    Raises:
+        HTTPException: 503 + Retry-After if the version is still not loaded
+    """
+    if registry.get(name) is None:
+        await registry.ensure_loaded(name, load_pool)
+    if registry.get(name) is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model version {name} was unloaded, retry later",
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+        )
+
+
+@asynccontextmanager
+async def lease_version(name: str):
+    """registry.acquire for a version checked by ensure_version; 503 instead of LookupError if it was unloaded since"""
+    await ensure_still_loaded(name)
+    async with registry.acquire(name) as version:
+        yield version
+
+
+@asynccontextmanager
+async def serving_version(connection):
+    """
+    Lease the model version a request asks for, loading it if needed.
+    
+    The request finishes on this version even if it is hot-swapped meanwhile.
+    """
+    name = await ensure_version(connection)
+    async with lease_version(name) as version:
+        yield version
+
+
+def collect_serving_metrics():
+    """Sample batching queues, model versions and cache counters at scrape time"""
+    versions = list(registry.versions().values()) + registry.retired()
+    in_flight = {}
+    for version in versions:
+        in_flight[version.name] = in_flight.get(version.name, 0) + version.in_flight
+        for name, queue in version.batchers.items():
+            stats = queue.stats()
+            QUEUE_DEPTH.set(stats["queue_depth"], model=version.name, queue=name)
+            BATCHES.set_total(stats["total_batches"], model=version.name, queue=name)
+            BATCHED_ITEMS.set_total(stats["total_items"], model=version.name, queue=name)
+            BATCH_EXPIRED.set_total(stats["total_expired"], model=version.name, queue=name)
+    for name in registry.sources:
+        MODEL_LOADED.set(1 if registry.get(name) is not None else 0, model=name)
+        MODEL_IN_FLIGHT.set(in_flight.get(name, 0), model=name)
+    ADMISSION_IN_FLIGHT.set(admission.in_flight)
+    ADMISSION_WAITING.set(admission.waiting)
+    CACHE_LOOKUPS.set_total(prediction_cache.hits, result="hit")
+    CACHE_LOOKUPS.set_total(prediction_cache.misses, result="miss")
+    COALESCED_REQUESTS.set_total(inflight_predictions.coalesced)
+    for status, count in job_manager.stats()["jobs"].items():
+        JOBS.set(count, status=status)
+    if persistent_cache is not None:
+        PERSISTENT_CACHE_LOOKUPS.set_total(persistent_cache.hits, result="hit")
+        PERSISTENT_CACHE_LOOKUPS.set_total(persistent_cache.misses, result="miss")
+        PERSISTENT_CACHE_BYTES.set(persistent_cache.size_bytes or 0)
+    COALESCE_IN_FLIGHT.set(inflight_predictions.in_flight)
+
+
+metrics.add_collector(collect_serving_metrics)
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Count requests and measure their latency per route"""
+    IN_FLIGHT.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        IN_FLIGHT.dec()
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUESTS.inc(method=request.method, path=path, status=status)
+        REQUEST_LATENCY.observe(time.perf_counter() - started, path=path)
+
+
+def request_deadline(request: Request) -> float:
+    """Absolute deadline from the X-Deadline-Ms header (None if the request has none)"""
+    try:
+        return parse_deadline(request.headers.get(DEADLINE_HEADER), time.perf_counter(), DEFAULT_DEADLINE_MS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Fast 503 when the server is at capacity"""
+    SHED_REQUESTS.inc(reason="queue_full")
+    return JSONResponse(
+        status_code=503,
+        content={"success": False, "detail": "Server is at capacity, retry later"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_handler(request: Request, exc: DeadlineExceeded):
+    """The client's deadline passed; the request was dropped before inference"""
+    SHED_REQUESTS.inc(reason="deadline")
+    return JSONResponse(
+        status_code=504,
+        content={"success": False, "detail": str(exc)}
+    )
+
+
+async def load_models_in_background():
+    """Load and warm up the model versions without holding up server startup"""
+    # The default version first, so the server becomes ready as soon as possible
+    names = [registry.default] + [name for name in registry.sources if name != registry.default]
+    for name in names:
+        try:
+            await registry.ensure_loaded(name, load_pool)
+        except Exception as e:
+            print(f"Warning: Could not load model version {name} on startup: {e}")
+            print("It will be loaded on its first prediction request.")
+
+
+model_load_task = None
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Load model when the server starts"""
-    try:
-        load_model()
-    except Exception as e:
-        print(f"Warning: Could not load model on startup: {e}")
-        print("Model will be loaded on first prediction request.")
+    """Start serving immediately; the models load in the background (see /ready)"""
+    global model_load_task
+    model_load_task = asyncio.create_task(load_models_in_background())
+    job_manager.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the batching tasks and worker pools"""
+    model_load_task.cancel()
+    await job_manager.stop()
+    await registry.close()
+    decode_pool.shutdown(wait=False)
+    inference_pool.shutdown(wait=False)
+    load_pool.shutdown(wait=False)
+    # Let queued persistent cache writes land before closing the database
+    cache_write_pool.shutdown(wait=True)
+    if persistent_cache is not None:
+        persistent_cache.close()
 
 
 @app.get("/")
@@ -169,24 +954,50 @@ async def root():
         "message": "Action Recognition API is running",
         "endpoints": {
             "predict": "/predict",
+            "predict_video": "/predict/video",
+            "predict_batch": "/predict/batch",
+            "stream": "/ws/stream",
+            "jobs": "/jobs",
             "health": "/health",
-            "actions": "/actions"
+            "ready": "/ready",
+            "actions": "/actions",
+            "stats": "/stats",
+            "metrics": "/metrics",
+            "models": "/models",
+            "reload": "/reload"
         }
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Check if the model is loaded and ready"""
-    global model
+    """Check if the default model is loaded and ready"""
+    version = registry.get()
+    serving_model = version.serving_model if version is not None else None
     return {
         "status": "healthy",
-        "model_loaded": model is not None,
-        "model_path": MODEL_PATH,
+        "model_loaded": version is not None,
+        "ready": registry.ready,
+        "default_model": registry.default,
+        "loaded_models": list(registry.versions()),
+        "load_timings": version.load_timings if version is not None else {},
+        "split_backbone": serving_model is not None and serving_model.is_split,
+        "runtime": serving_model.runtime if serving_model is not None else INFERENCE_RUNTIME,
+        "precision": serving_model.precision if serving_model is not None else INFERENCE_PRECISION,
+        "accuracy_drift": serving_model.drift if serving_model is not None else None,
+        "model_path": registry.sources[registry.default],
         "num_classes": len(ACTION_NAMES)
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the default model is loaded and warmed up"""
+    if not registry.ready:
+        return JSONResponse(status_code=503, content={"ready": False, "detail": "Model is loading"})
+    return {"ready": True, "default_model": registry.default, "load_timings": registry.get().load_timings}
+
+
 @app.get("/actions")
 async def get_actions():
     """Get list of supported action classes"""
@@ -196,19 +1007,161 @@ async def get_actions():
     }
 
 
+@app.get("/stats")
+async def get_stats():
+    """Serving statistics for tuning throughput versus tail latency"""
+    return {
+        "models": {
+            name: {
+                "batching": version.batchers["predict"].stats(),
+                "stream_feature_batching": version.batchers["stream_features"].stats(),
+                "stream_head_batching": version.batchers["stream_head"].stats()
+            }
+            for name, version in registry.versions().items()
+        },
+        "admission": admission.stats(),
+        "cache": prediction_cache.stats(),
+        "coalescing": inflight_predictions.stats(),
+        "persistent_cache": persistent_cache.stats() if persistent_cache is not None else {"enabled": False},
+        "jobs": job_manager.stats()
+    }
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics in text exposition format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/models")
+async def list_models():
+    """Configured model versions, which are loaded and which one is the default"""
+    loaded = registry.versions()
+    return {
+        "default": registry.default,
+        "models": {
+            name: dict(loaded[name].describe(), loaded=True) if name in loaded
+            else {"source": source, "loaded": False}
+            for name, source in registry.sources.items()
+        },
+        "draining": [
+            {"model": version.name, "in_flight": version.in_flight}
+            for version in registry.retired()
+        ]
+    }
+
+
+@app.post("/models/{name}/load")
+async def load_model_version(name: str, path: str = None):
+    """
+    Load (or hot-reload) a model version.
+    
+    In-flight requests finish on the previous weights, which are freed once
+    they have drained.
+    
+    Args:
+        name: Version name
+        path: .keras file or export directory inside one of MODEL_DIRS;
+            registers a new version (or repoints an existing one) once it
+            has loaded
+    """
+    source = None
+    if path is not None:
+        source = os.path.realpath(path)
+        if not any(os.path.commonpath([source, directory]) == directory for directory in MODEL_DIRS):
+            raise HTTPException(status_code=403, detail=f"Model sources must be inside one of MODEL_DIRS: {path}")
+        if not os.path.exists(source):
+            raise HTTPException(status_code=400, detail=f"Model source not found: {path}")
+    elif name not in registry.sources:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {name}. Pass ?path= to register it")
+    
+    try:
+        version = await registry.load(name, load_pool, source=source)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Loading {name} failed: {str(e)}"
+        )
+    return {
+        "success": True,
+        "model": name,
+        **version.describe()
+    }
+
+
+@app.post("/models/{name}/default")
+async def set_default_model(name: str):
+    """Route default traffic to another version (loaded first if needed)"""
+    if name not in registry.sources:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {name}")
+    try:
+        await registry.ensure_loaded(name, load_pool)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Loading {name} failed: {str(e)}"
+        )
+    previous = registry.default
+    registry.set_default(name)
+    return {
+        "success": True,
+        "default": name,
+        "previous_default": previous
+    }
+
+
+@app.delete("/models/{name}")
+async def unload_model(name: str):
+    """Unload a version; its weights are freed once in-flight requests drain"""
+    if name not in registry.sources:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {name}")
+    try:
+        await registry.unload(name)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "success": True,
+        "model": name
+    }
+
+
+@app.post("/reload")
+async def reload_model(model: str = None):
+    """Reload a model version (default: the default version) from disk"""
+    name = model or registry.default
+    if name not in registry.sources:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {name}")
+    try:
+        await registry.load(name, load_pool)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Reload failed: {str(e)}"
+        )
+    return {
+        "success": True,
+        "model": name,
+        "model_path": registry.sources[name]
+    }
+
+
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(request: Request, file: UploadFile = File(...), top_k: int = None,
+                  probabilities: bool = False):
     """
     Predict the action in an uploaded image.
     
+    Select a model version with ?model=<name> or the X-Model-Version header.
+    Send Accept: application/msgpack for a MessagePack body instead of JSON.
+    
     Args:
         file: Uploaded image file (JPEG, PNG, etc.)
+        top_k: Number of predictions to return (default: DEFAULT_TOP_K)
+        probabilities: Also return the raw probability vector
         
     Returns:
-        JSON with predictions sorted by confidence
+        Predictions sorted by confidence
     """
-    global model
-    
     # Validate file type
     allowed_types = ["image/jpeg", "image/png", "image/jpg", "image/webp"]
     if file.content_type not in allowed_types:
@@ -217,55 +1170,497 @@ async def predict(file: UploadFile = File(...)):
             detail=f"Invalid file type: {file.content_type}. Allowed: {allowed_types}"
         )
     
+    encoding = response_encoding(request)
+    top_k = clamp_top_k(top_k)
+    deadline = request_deadline(request)
+    
     try:
-        # Load model if not already loaded
-        if model is None:
-            load_model()
-        
-        # Read image bytes
-        image_bytes = await file.read()
+        # Wait for an admission slot, then load the model if not already loaded
+        # and hold it until the response is built
+        async with admission.admit(deadline), serving_version(request) as version:
+            serving_model = version.serving_model
+            
+            # Read image bytes
+            image_bytes = await file.read()
+            
+            timer = StageTimer(STAGE_LATENCY)
+            
+            # Decode and resize, then look up the pixels in the prediction cache
+            check_deadline(deadline)
+            with timer.stage("decode"):
+                pixels = await run_in_pool(decode_pool, decode_image, image_bytes, serving_model.img_size)
+            pixel_hash = content_hash(pixels)
+            cache_key = f"{version.key}:{pixel_hash}"
+            output = prediction_cache.get(cache_key)
+            if output is None and persistent_cache is not None:
+                output = await run_in_pool(decode_pool, stored_prediction, version, pixel_hash)
+                if output is not None:
+                    prediction_cache.put(cache_key, output)
+            
+            if output is None:
+                # Preprocess image (a uint8 view; normalization runs in the model graph)
+                with timer.stage("preprocess"):
+                    input_data = preprocess_pixels(pixels)
+                
+                async def infer():
+                    output, features = await version.batchers["predict"].submit(input_data, deadline)
+                    prediction_cache.put(cache_key, output)
+                    store_prediction(version, pixel_hash, output, features)
+                    return output
+                
+                # Make prediction (grouped with concurrent requests into one batch);
+                # dropped instead of run if the deadline passes while queued.
+                # Copies of an image already being predicted wait for that result.
+                with timer.stage("infer"):
+                    output = await inflight_predictions.do(cache_key, infer, deadline)
         
-        # Preprocess image
-        input_data = preprocess_image(image_bytes)
+        with timer.stage("serialize"):
+            response = encoded_response({
+                "success": True,
+                "filename": file.filename,
+                "model_version": version.name,
+                **prediction_fields(output, top_k, probabilities)
+            }, encoding)
         
-        # Make prediction
-        predictions = model.predict(input_data, verbose=0)
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
         
-        # Get probabilities (assuming softmax output)
-        probabilities = predictions[0]
+    except (HTTPException, Overloaded, DeadlineExceeded):
+        raise
+    except ImageTooLarge as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Prediction failed: {str(e)}"
+        )
+
+
+async def save_upload(file: UploadFile, suffix: str, max_bytes: int) -> str:
+    """
+    Stream an upload to a temporary file in chunks.
+    
+    Args:
+        file: Uploaded file
+        suffix: File extension for the temporary file (OpenCV uses it to pick a demuxer)
+        max_bytes: Maximum accepted upload size
         
-        # Create results with action names and confidences
-        results = []
-        for idx, prob in enumerate(probabilities):
-            results.append({
-                "rank": 0,  # Will be set after sorting
-                "action": ACTION_NAMES[idx],
-                "confidence": round(float(prob) * 100, 2)  # Convert to percentage
-            })
+    Returns:
+        Path to the temporary file (the caller removes it)
+    """
+    size = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        try:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Video too large. Maximum size: {max_bytes} bytes"
+                    )
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    return tmp.name
+
+
+@app.post("/predict/video")
+async def predict_video(request: Request, file: UploadFile = File(...), sampling: str = "uniform",
+                        top_k: int = None, probabilities: bool = False):
+    """
+    Predict the action in an uploaded video clip.
+    
+    Only the sampled frames are decoded, so long videos cost the same
+    memory as short ones. The response encoding follows the Accept header
+    like /predict.
+    
+    Args:
+        file: Uploaded video file (MP4 or AVI)
+        sampling: Frame sampling mode ("uniform" or "segment")
+        top_k: Number of predictions to return (default: DEFAULT_TOP_K)
+        probabilities: Also return the raw probability vector
         
-        # Sort by confidence (descending)
-        results.sort(key=lambda x: x["confidence"], reverse=True)
+    Returns:
+        Predictions sorted by confidence
+    """
+    # Validate file type and sampling mode
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if file.content_type not in VIDEO_CONTENT_TYPES and extension not in VIDEO_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type: {file.content_type}. Allowed: {VIDEO_CONTENT_TYPES}"
+        )
+    if sampling not in SAMPLING_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sampling mode: {sampling}. Allowed: {SAMPLING_MODES}"
+        )
+    
+    encoding = response_encoding(request)
+    top_k = clamp_top_k(top_k)
+    deadline = request_deadline(request)
+    
+    path = await save_upload(file, extension or ".mp4", MAX_VIDEO_BYTES)
+    try:
+        # Wait for an admission slot, then load the model if not already loaded
+        # and hold it until the prediction is done
+        async with admission.admit(deadline), serving_version(request) as version:
+            serving_model = version.serving_model
+            timer = StageTimer(STAGE_LATENCY)
+            
+            # Decode only the sampled frames
+            check_deadline(deadline)
+            with timer.stage("decode"):
+                frames, video_info = await run_in_pool(
+                    decode_pool, read_video_clip, path,
+                    serving_model.sequence_length, serving_model.img_size, sampling
+                )
+            with timer.stage("preprocess"):
+                input_data = preprocess_pixels(frames)
+            
+            # Make prediction (shares batches with image requests)
+            with timer.stage("infer"):
+                output, _ = await version.batchers["predict"].submit(input_data, deadline)
         
-        # Add ranks after sorting
-        for i, result in enumerate(results):
-            result["rank"] = i + 1
+        with timer.stage("serialize"):
+            response = encoded_response({
+                "success": True,
+                "filename": file.filename,
+                "model_version": version.name,
+                "video": video_info,
+                **prediction_fields(output, top_k, probabilities)
+            }, encoding)
         
-        return JSONResponse(content={
-            "success": True,
-            "filename": file.filename,
-            "predictions": results,
-            "top_prediction": {
-                "action": results[0]["action"],
-                "confidence": results[0]["confidence"]
-            }
-        })
+        response.headers["Server-Timing"] = timer.server_timing()
+        return response
         
+    except (HTTPException, Overloaded, DeadlineExceeded):
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Could not read video: {str(e)}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Prediction failed: {str(e)}"
         )
+    finally:
+        os.remove(path)
+
+
+def job_client(request: Request) -> str:
+    """Who a job is scheduled for: the X-Client-Id header, else the client address"""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "anonymous")
+
+
+def find_job(job_id: str) -> Job:
+    try:
+        return job_manager.get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown or expired job: {job_id}")
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Request, file: UploadFile = File(...), mode: str = "classify",
+                     sample_fps: float = None, top_k: int = None, stride: int = None,
+                     min_confidence: float = 30.0, min_segment_seconds: float = 1.0,
+                     max_gap_seconds: float = 1.0):
+    """
+    Submit a long video for background processing.
+    
+    In "classify" mode the video is split into consecutive windows of 12
+    sampled frames and each window is classified. In "localize" mode
+    overlapping windows start every `stride` sampled frames and their scores
+    are merged into time-stamped action segments. Poll /jobs/{job_id} or
+    subscribe to /jobs/{job_id}/events for progress and the result. Jobs are
+    scheduled fairly between clients (X-Client-Id header, else the client
+    address).
+    
+    Args:
+        file: Uploaded video file (MP4 or AVI)
+        mode: "classify" or "localize"
+        sample_fps: Frames per second to sample (default: JOB_SAMPLE_FPS)
+        top_k: Number of predictions per window and for the whole video
+            (default: DEFAULT_TOP_K)
+        stride: Localization only: sampled frames between window starts
+            (default: JOB_LOCALIZE_STRIDE)
+        min_confidence: Localization only: minimum segment confidence (percent)
+        min_segment_seconds: Localization only: shortest segment reported
+        max_gap_seconds: Localization only: gap bridged between segments of the same action
+        
+    Returns:
+        The job id and where to follow it
+    """
+    extension = os.path.splitext(file.filename or "")[1].lower()
+    if file.content_type not in VIDEO_CONTENT_TYPES and extension not in VIDEO_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type: {file.content_type}. Allowed: {VIDEO_CONTENT_TYPES}"
+        )
+    if mode not in JOB_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid mode: {mode}. Allowed: {list(JOB_MODES)}"
+        )
+    if sample_fps is None:
+        sample_fps = JOB_SAMPLE_FPS
+    if sample_fps <= 0:
+        raise HTTPException(status_code=400, detail="sample_fps must be positive")
+    
+    model_name = await ensure_version(request)
+    params = {"mode": mode, "model": model_name, "sample_fps": sample_fps, "top_k": clamp_top_k(top_k)}
+    if mode == "localize":
+        if stride is None:
+            stride = JOB_LOCALIZE_STRIDE
+        sequence_length = registry.get(model_name).serving_model.sequence_length
+        if not 1 <= stride <= sequence_length:
+            raise HTTPException(
+                status_code=400,
+                detail=f"stride must be between 1 and {sequence_length}"
+            )
+        params.update(
+            stride=stride,
+            min_confidence=min_confidence,
+            min_segment_seconds=min_segment_seconds,
+            max_gap_seconds=max_gap_seconds
+        )
+    
+    path = await save_upload(file, extension or ".mp4", JOB_MAX_VIDEO_BYTES)
+    job = Job(job_client(request), params, path=path, filename=file.filename)
+    # Raises Overloaded (503 + Retry-After) when the job queue is full
+    job_manager.submit(job)
+    
+    return JSONResponse(status_code=202, content={
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events"
+    })
+
+
+@app.get("/jobs")
+async def list_jobs():
+    """Retained jobs (without results) and worker pool statistics"""
+    return {
+        "jobs": [job.snapshot(include_result=False) for job in job_manager.list()],
+        "stats": job_manager.stats()
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress and (once finished) the result of a job"""
+    return encoded_response(find_job(job_id).snapshot())
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-sent events for a job: one event per progress update, named after
+    the job's status, ending with the finished job and its result.
+    """
+    job = find_job(job_id)
+    
+    async def generate():
+        async for snapshot in job.watch():
+            if snapshot is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {snapshot['status']}\ndata: {dumps(snapshot).decode()}\n\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job, or forget a finished one"""
+    job = find_job(job_id)
+    if job.done:
+        job_manager.delete(job_id)
+        return {"success": True, "job_id": job_id, "deleted": True}
+    job_manager.cancel(job_id)
+    # A running job stops at its next chunk boundary
+    return {"success": True, "job_id": job_id, "status": job.status, "cancel_requested": True}
+
 
+@app.post("/predict/batch")
+async def predict_images_batch(request: Request, files: List[UploadFile] = File(...), top_k: int = None):
+    """
+    Predict actions for many images in one request.
+    
+    Accepts either several image files or a single zip archive of images.
+    Images are decoded in parallel and predicted in large stacked batches.
+    Results are streamed back as NDJSON (one JSON object per line) in
+    completion order, followed by a summary line.
+    
+    Args:
+        files: Image files, or one zip archive
+        top_k: Number of predictions to return per image (default: DEFAULT_TOP_K)
+        
+    Returns:
+        application/x-ndjson stream
+    """
+    model_name = await ensure_version(request)
+    top_k = clamp_top_k(top_k)
+    
+    zip_path = None
+    if len(files) == 1 and is_zip_upload(files[0].filename, files[0].content_type):
+        zip_path = await save_upload(files[0], ".zip", MAX_ZIP_BYTES)
+        try:
+            archive = zipfile.ZipFile(zip_path)
+        except zipfile.BadZipFile:
+            os.remove(zip_path)
+            raise HTTPException(status_code=400, detail="Invalid zip archive")
+        items = iter_zip_images(archive, BULK_MAX_ITEMS)
+    else:
+        if len(files) > BULK_MAX_ITEMS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many files: {len(files)}. Maximum: {BULK_MAX_ITEMS}"
+            )
+        # Read now: uploads may be closed before the streamed response finishes
+        uploads = [(f.filename, await f.read()) for f in files]
+        items = [(name, (lambda data=data: data)) for name, data in uploads]
+    
+    async def generate():
+        started = time.perf_counter()
+        succeeded, failed = 0, 0
+        try:
+            # The lease is taken inside the generator: the stream outlives this handler
+            async with lease_version(model_name) as version:
+                serving_model = version.serving_model
+                decode = partial(preprocess_image, img_size=serving_model.img_size)
+                predict, lookup = serving_model.predict_clips, None
+                if persistent_cache is not None:
+                    # Images scored before (by any worker, before any restart) skip the model
+                    predict = partial(predict_and_store, version)
+                    lookup = lambda clip: stored_prediction(version, content_hash(clip[0]))
+                async for index, name, probabilities, error in predict_bulk(
+                    items, decode, predict, decode_pool, inference_pool,
+                    batch_size=BULK_BATCH_SIZE, lookup=lookup
+                ):
+                    if error is not None:
+                        failed += 1
+                        line = {"index": index, "filename": name, "success": False, "error": str(error)}
+                    else:
+                        succeeded += 1
+                        line = {
+                            "index": index,
+                            "filename": name,
+                            "success": True,
+                            **prediction_fields(probabilities, top_k)
+                        }
+                    yield dumps(line) + b"\n"
+            
+            elapsed = time.perf_counter() - started
+            yield dumps({"summary": {
+                "model_version": model_name,
+                "succeeded": succeeded,
+                "failed": failed,
+                "elapsed_seconds": round(elapsed, 3),
+                "images_per_second": round(succeeded / elapsed, 2) if elapsed else 0.0
+            }}) + b"\n"
+        finally:
+            if zip_path is not None:
+                archive.close()
+                os.remove(zip_path)
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+@app.websocket("/ws/stream")
+async def stream(websocket: WebSocket, top_k: int = None):
+    """
+    Live-stream inference over a WebSocket.
+    
+    The client sends encoded frames (JPEG/PNG) as binary messages and receives
+    one JSON message with the top-k actions per processed frame. Each frame runs
+    the backbone once; its feature joins a rolling 12-frame window that the
+    temporal head re-evaluates. If frames arrive faster than they can be
+    processed, older unprocessed frames are dropped.
+    
+    Args:
+        top_k: Number of predictions to return per frame (default: DEFAULT_TOP_K)
+    """
+    await websocket.accept()
+    
+    try:
+        top_k = clamp_top_k(top_k)
+        model_name = await ensure_version(websocket)
+        await ensure_still_loaded(model_name)
+    except HTTPException as e:
+        # 1013: try again later
+        await websocket.close(code=1013 if e.status_code == 503 else 1008, reason=e.detail)
+        return
+    
+    # The stream holds its model version until the client disconnects
+    async with registry.acquire(model_name) as version:
+        serving_model = version.serving_model
+        if not serving_model.is_split:
+            await websocket.close(code=1011, reason="Streaming requires a backbone/head split model")
+            return
+        
+        slot = LatestFrameSlot()
+        window = FeatureWindow(serving_model.sequence_length)
+        decode = partial(preprocess_image, img_size=serving_model.img_size)
+        
+        async def receive_frames():
+            try:
+                while True:
+                    slot.put(await websocket.receive_bytes())
+            except (WebSocketDisconnect, RuntimeError, KeyError):
+                # KeyError: text message received instead of bytes
+                pass
+            finally:
+                slot.close()
+        
+        receiver = asyncio.create_task(receive_frames())
+        processed = 0
+        try:
+            while True:
+                image_bytes = await slot.get()
+                if image_bytes is None:
+                    break
+                
+                try:
+                    input_data = await run_in_pool(decode_pool, decode, image_bytes)
+                except Exception as e:
+                    await websocket.send_json({"success": False, "error": f"Could not decode frame: {str(e)}"})
+                    continue
+                
+                window.push(await version.batchers["stream_features"].submit(input_data[0]))
+                probabilities = await version.batchers["stream_head"].submit(window.window())
+                processed += 1
+                
+                await websocket.send_text(dumps({
+                    "success": True,
+                    "frame": processed,
+                    "model_version": version.name,
+                    "received": slot.received,
+                    "dropped": slot.dropped,
+                    "buffered_frames": len(window),
+                    **prediction_fields(probabilities, top_k)
+                }).decode())
+        except (WebSocketDisconnect, RuntimeError):
+            # Client went away while we were sending
+            pass
+        finally:
+            receiver.cancel()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,303 @@
+"""
+Offline processing of video collections
+Model and class-mapping loading, video discovery, and the pipelined
+decode -> inference -> write loop shared by the corpus scripts
+"""
+
+import csv
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from video import VIDEO_EXTENSIONS
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_PATH = os.path.join(BACKEND_DIR, "..", "rebuilt_mobilenet.keras")
+CLASS_MAPPING_PATH = os.path.join(BACKEND_DIR, "..", "class_mapping.csv")
+
+
+def load_class_names(path: str = CLASS_MAPPING_PATH) -> list:
+    """
+    Class names ordered by class index.
+
+    Args:
+        path: CSV file with class_name and class_index columns
+
+    Returns:
+        List of class names, position = model output index
+    """
+    with open(path, newline="") as f:
+        rows = sorted(csv.DictReader(f), key=lambda row: int(row["class_index"]))
+    return [row["class_name"] for row in rows]
+
+
+def load_serving_model(source: str, runtime: str = "keras", precision: str = "float32", threads: int = None):
+    """
+    Load a ServingModel from a .keras file or an export directory.
+
+    Args:
+        source: .keras file, or an export directory for the tflite/onnx runtimes
+        runtime: "keras", "tflite" or "onnx"
+        precision: "float32" or "int8" (exported runtimes only)
+        threads: Threads per exported graph (None = runtime default)
+
+    Returns:
+        Warmed-up ServingModel
+    """
+    if runtime == "keras":
+        if os.path.isdir(source):
+            raise ValueError(f"{source} is an export directory; pass --runtime tflite or onnx")
+        import keras
+        from serving_model import ServingModel
+
+        serving_model = ServingModel(keras.models.load_model(source, compile=False))
+    else:
+        from runtimes import ExportedModel
+
+        serving_model = ExportedModel(source, runtime, precision, threads)
+    serving_model.warmup()
+    return serving_model
+
+
+def model_name(source: str, runtime: str = "keras", precision: str = "float32") -> str:
+    """Short model label for outputs: file or directory name, plus runtime and precision if exported"""
+    name = os.path.basename(os.path.normpath(source))
+    if runtime != "keras":
+        name += f":{runtime}:{precision}"
+    return name
+
+
+def find_videos(root: str) -> list:
+    """Video files under root, as sorted paths relative to it"""
+    videos = []
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories.sort()
+        for name in names:
+            if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                videos.append(os.path.relpath(os.path.join(directory, name), root))
+    return sorted(videos)
+
+
+def video_label(relative_path: str, class_names: list) -> str:
+    """Class of a video in a <class>/<video> layout, or None"""
+    parent = os.path.basename(os.path.dirname(relative_path))
+    return parent if parent in class_names else None
+
+
+def init_decoder():
+    """Decode worker setup: one OpenCV thread per process, the pool provides the parallelism"""
+    import cv2
+
+    cv2.setNumThreads(1)
+
+
+def run_decode(decode, relative_path: str) -> tuple:
+    """
+    Run `decode(relative_path)` in a decode worker, catching and timing it.
+
+    Returns:
+        (relative_path, result, error, decode_seconds); result is None on failure
+    """
+    started = time.perf_counter()
+    try:
+        result, error = decode(relative_path), None
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    return relative_path, result, error, time.perf_counter() - started
+
+
+class StageClock:
+    """Busy time of a pipeline stage, and how long it waited on its input and output queues"""
+
+    def __init__(self):
+        self.busy = 0.0
+        self.waiting_input = 0.0
+        self.waiting_output = 0.0
+
+    def summary(self, elapsed: float) -> dict:
+        return {
+            "busy_seconds": round(self.busy, 3),
+            "utilization": round(self.busy / elapsed, 3) if elapsed else 0.0,
+            "waiting_input_seconds": round(self.waiting_input, 3),
+            "waiting_output_seconds": round(self.waiting_output, 3),
+        }
+
+
+def timed_put(q: queue.Queue, item, clock: StageClock):
+    started = time.perf_counter()
+    q.put(item)
+    clock.waiting_output += time.perf_counter() - started
+
+
+def timed_get(q: queue.Queue, clock: StageClock):
+    started = time.perf_counter()
+    item = q.get()
+    clock.waiting_input += time.perf_counter() - started
+    return item
+
+
+def run_pipeline(videos: list, decode, process, write, on_error=None, workers: int = None,
+                 batch_size: int = 32, queue_size: int = 64, progress_every: float = 10.0) -> dict:
+    """
+    Decode, process and write videos with the three stages running concurrently.
+
+    Videos are decoded in a process pool; decoded items wait in a bounded
+    queue for the processing thread, which takes whatever is ready (up to
+    `batch_size`) as one batch; its output goes to a writer thread. Memory
+    stays bounded: at most `queue_size` decoded items wait, at most
+    2 x workers videos are being decoded and the writer queue holds a few
+    batches. A full queue blocks the stage feeding it (backpressure)
+    instead of growing.
+
+    Args:
+        videos: Video paths, passed to `decode`
+        decode: Picklable function decode(path) -> item, run in the pool
+            (use functools.partial of a module-level function for arguments)
+        process: Function process(batch) -> output, where batch is a list of
+            (path, item, decode_seconds); runs on the processing thread
+        write: Function write(output), runs on the writer thread
+        on_error: Function on_error(path, error, decode_seconds) -> output
+            for a video that failed to decode (None = only count it), written
+            like processed output
+        workers: Decode processes (default: CPU count)
+        batch_size: Maximum items per batch
+        queue_size: Decoded items buffered between decode and processing
+        progress_every: Seconds between progress lines (0 = quiet)
+
+    Returns:
+        Counts, failures and per-stage timings
+    """
+    workers = workers or os.cpu_count() or 1
+    decoded = queue.Queue(maxsize=max(batch_size, queue_size))
+    outputs = queue.Queue(maxsize=8)
+    decode_clock, process_clock, write_clock = StageClock(), StageClock(), StageClock()
+    counts = {"processed": 0, "failed": 0, "batches": 0}
+    failures = {}
+    errors = []
+    done = object()
+
+    def process_batches():
+        finished = False
+        try:
+            while not finished:
+                batch = [timed_get(decoded, process_clock)]
+                # Fill the batch with whatever else is already decoded, without waiting for more
+                while len(batch) < batch_size:
+                    try:
+                        batch.append(decoded.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch[-1] is done:
+                    batch.pop()
+                    finished = True
+                if not batch:
+                    continue
+
+                started = time.perf_counter()
+                output = process(batch)
+                process_clock.busy += time.perf_counter() - started
+                counts["processed"] += len(batch)
+                counts["batches"] += 1
+                timed_put(outputs, output, process_clock)
+        except BaseException as e:
+            errors.append(e)
+            # Keep draining so the decode loop never blocks on a dead consumer
+            while not finished and decoded.get() is not done:
+                pass
+        finally:
+            outputs.put(done)
+
+    def write_outputs():
+        try:
+            while True:
+                output = timed_get(outputs, write_clock)
+                if output is done:
+                    break
+                started = time.perf_counter()
+                write(output)
+                write_clock.busy += time.perf_counter() - started
+        except BaseException as e:
+            errors.append(e)
+            # Keep draining so the other stages never block on a dead writer
+            while outputs.get() is not done:
+                pass
+
+    process_thread = threading.Thread(target=process_batches, name="process", daemon=True)
+    writer_thread = threading.Thread(target=write_outputs, name="writer", daemon=True)
+    process_thread.start()
+    writer_thread.start()
+
+    started = time.perf_counter()
+    last_progress = started
+    pending = set()
+    remaining = iter(videos)
+    max_pending = workers * 2
+    try:
+        # Spawned, not forked: callers have usually loaded the model by now, and forking
+        # a process already running TensorFlow's thread pools can deadlock the workers
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_decoder,
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            while not errors:
+                for relative_path in remaining:
+                    pending.add(pool.submit(run_decode, decode, relative_path))
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    break
+
+                finished, pending = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    relative_path, item, error, seconds = future.result()
+                    decode_clock.busy += seconds
+                    if error is None:
+                        timed_put(decoded, (relative_path, item, seconds), decode_clock)
+                        continue
+                    counts["failed"] += 1
+                    failures[relative_path] = error
+                    if on_error is not None:
+                        timed_put(outputs, on_error(relative_path, error, seconds), decode_clock)
+
+                now = time.perf_counter()
+                if progress_every and now - last_progress >= progress_every:
+                    last_progress = now
+                    completed = counts["processed"] + counts["failed"]
+                    print(f"  {completed}/{len(videos)} videos, {completed / (now - started):.1f} videos/s, "
+                          f"{decoded.qsize()} queued for the model")
+            for future in pending:
+                future.cancel()
+    finally:
+        decoded.put(done)
+        process_thread.join()
+        writer_thread.join()
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - started
+    completed = counts["processed"] + counts["failed"]
+    decode_summary = decode_clock.summary(elapsed * workers)  # Worker-seconds available across the pool
+    decode_summary["workers"] = workers
+    return {
+        "videos": completed,
+        **counts,
+        "failures": failures,
+        "elapsed_seconds": round(elapsed, 3),
+        "videos_per_second": round(completed / elapsed, 2) if elapsed else 0.0,
+        "mean_batch_size": round(counts["processed"] / counts["batches"], 2) if counts["batches"] else 0.0,
+        "stages": {
+            "decode": decode_summary,
+            "process": process_clock.summary(elapsed),
+            "write": write_clock.summary(elapsed),
+        },
+    }
+
+
+def print_summary(summary: dict):
+    """Print a run_pipeline summary"""
+    print(f"✅ {summary['processed']} processed, {summary['failed']} failed in {summary['elapsed_seconds']}s "
+          f"({summary['videos_per_second']} videos/s, mean batch {summary['mean_batch_size']})")
+    for stage, timing in summary["stages"].items():
+        print(f"  {stage:<8} utilization {timing['utilization']:.0%}, "
+              f"waited {timing['waiting_input_seconds']}s for input, {timing['waiting_output_seconds']}s on output")
@@ -0,0 +1,270 @@
+"""
+Persistent prediction cache
+SQLite-backed store of predictions and backbone features that survives restarts
+and is shared by every uvicorn worker on the host
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    model TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    probabilities BLOB NOT NULL,
+    features BLOB,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (model, content_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS predictions_accessed_at ON predictions (accessed_at);
+"""
+
+
+def model_fingerprint(source: str) -> str:
+    """
+    Content hash of a model file or export directory.
+
+    Cached predictions are keyed by what the model is rather than by its name
+    or load time, so they stay valid across restarts and become unreachable
+    as soon as the weights change.
+
+    Args:
+        source: .keras file or export directory
+
+    Returns:
+        Hex digest of the model's bytes
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if os.path.isdir(source):
+        paths = sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+        )
+    else:
+        paths = [source]
+    for path in paths:
+        if path != source:
+            digest.update(os.path.relpath(path, source).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PersistentCache:
+    """
+    Predictions and backbone feature vectors on disk, keyed by model and content hash.
+
+    The database runs in WAL mode, so any number of processes can read while
+    one writes; each thread uses its own connection and writers wait on a
+    busy timeout instead of failing. When the stored payload grows past
+    `max_bytes`, the least recently used entries are deleted down to 90%.
+    Lookups only refresh an entry's access time once per `touch_interval`,
+    so a read-heavy workload does not turn into a write-heavy one.
+
+    A cache must never fail a request: database errors are counted and
+    treated as misses (reads) or dropped (writes).
+
+    Args:
+        path: SQLite database file (created if missing)
+        max_bytes: Payload size above which old entries are evicted (0 = unbounded)
+        store_features: Also keep the backbone feature vectors
+        check_every: Writes between two size checks
+        touch_interval: Seconds between access-time refreshes of an entry
+        timeout: Seconds a connection waits for a lock held by another process
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024 * 1024, store_features: bool = True,
+                 check_every: int = 256, touch_interval: float = 60.0, timeout: float = 5.0):
+        self.path = path
+        self.max_bytes = max(0, int(max_bytes))
+        self.store_features = store_features
+        self.check_every = max(1, int(check_every))
+        self.touch_interval = touch_interval
+        self.timeout = timeout
+
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._writes_since_check = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+        self.size_bytes = None
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(SCHEMA)
+        self._update_size(connection)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get(self, model: str, content_hash: str):
+        """
+        Look up a stored prediction.
+
+        Args:
+            model: Model identifier (fingerprint, runtime and precision)
+            content_hash: Hash of the decoded pixels
+
+        Returns:
+            (probabilities, features) float32 arrays (features may be None),
+            or None on a miss
+        """
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT probabilities, features, accessed_at FROM predictions "
+                "WHERE model = ? AND content_hash = ?",
+                (model, content_hash)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            probabilities, features, accessed_at = row
+            now = time.time()
+            if now - accessed_at > self.touch_interval:
+                connection.execute(
+                    "UPDATE predictions SET accessed_at = ? WHERE model = ? AND content_hash = ?",
+                    (now, model, content_hash)
+                )
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️ Persistent cache read failed: {e}")
+            return None
+
+        self.hits += 1
+        return (
+            np.frombuffer(probabilities, dtype=np.float32),
+            np.frombuffer(features, dtype=np.float32) if features is not None else None
+        )
+
+    def put(self, model: str, content_hash: str, probabilities: np.ndarray, features: np.ndarray = None):
+        """
+        Store a prediction (and its backbone features), replacing any previous one.
+
+        Args:
+            model: Model identifier (fingerprint, runtime and precision)
+            content_hash: Hash of the decoded pixels
+            probabilities: Probability vector with shape (num_classes,)
+            features: Backbone features of the input (None if unavailable)
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float32).tobytes()
+        if features is not None and self.store_features:
+            features = np.asarray(features, dtype=np.float32).tobytes()
+        else:
+            features = None
+        size = len(probabilities) + (len(features) if features is not None else 0)
+        now = time.time()
+
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO predictions "
+                "(model, content_hash, probabilities, features, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (model, content_hash, probabilities, features, size, now, now)
+            )
+            self.writes += 1
+            with self._lock:
+                self.size_bytes += size  # Approximate until the next size check
+                self._writes_since_check += 1
+                check = self._writes_since_check >= self.check_every
+                if check:
+                    self._writes_since_check = 0
+            if check:
+                self.evict(connection)
+        except sqlite3.Error as e:
+            self.errors += 1
+            print(f"⚠️ Persistent cache write failed: {e}")
+
+    def _update_size(self, connection: sqlite3.Connection) -> int:
+        self.size_bytes = connection.execute("SELECT COALESCE(SUM(size), 0) FROM predictions").fetchone()[0]
+        return self.size_bytes
+
+    def evict(self, connection: sqlite3.Connection = None):
+        """Delete least recently used entries until the payload is under 90% of max_bytes"""
+        if not self.max_bytes:
+            return
+        connection = connection or self._connection()
+        size = self._update_size(connection)
+        if size <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Oldest first, stopping once enough bytes have been freed
+            rows = connection.execute(
+                "SELECT model, content_hash, size FROM predictions ORDER BY accessed_at"
+            )
+            doomed = []
+            for model, content_hash, entry_size in rows:
+                if size <= target:
+                    break
+                doomed.append((model, content_hash))
+                size -= entry_size
+            rows.close()
+            connection.executemany("DELETE FROM predictions WHERE model = ? AND content_hash = ?", doomed)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        self.evictions += len(doomed)
+        self.size_bytes = size
+
+    def clear(self, model: str = None):
+        """Delete every entry (or every entry of one model)"""
+        connection = self._connection()
+        if model is None:
+            connection.execute("DELETE FROM predictions")
+        else:
+            connection.execute("DELETE FROM predictions WHERE model = ?", (model,))
+        self._update_size(connection)
+
+    def close(self):
+        """Close every thread's connection (server shutdown)"""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "size_bytes": self.size_bytes,
+            "store_features": self.store_features,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
@@ -0,0 +1,263 @@
+"""
+Model registry
+Serves several model versions side by side, routes requests to a version and
+hot-swaps versions without dropping in-flight requests
+"""
+
+import asyncio
+import gc
+import os
+import time
+from contextlib import asynccontextmanager
+
+
+def parse_model_versions(spec: str) -> dict:
+    """
+    Parse a MODEL_VERSIONS setting.
+
+    Args:
+        spec: Comma separated "name=path" pairs, e.g.
+            "mobilenet=../rebuilt_mobilenet.keras,final=../rebuilt_model_final.keras"
+
+    Returns:
+        Ordered dict of version name -> model source
+    """
+    versions = {}
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, source = entry.partition("=")
+        if not sep or not name.strip() or not source.strip():
+            raise ValueError(f"Invalid MODEL_VERSIONS entry: {entry!r} (expected name=path)")
+        versions[name.strip()] = source.strip()
+    return versions
+
+
+def version_name(source: str) -> str:
+    """Default version name for a model file or export directory"""
+    return os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+
+
+class ModelVersion:
+    """
+    One loaded model version and the batching queues in front of it.
+
+    Requests hold a lease on the version while they use it. A version that has
+    been replaced or unloaded is retired: it takes no new requests, and once its
+    last lease is released its queues are stopped and its weights are dropped.
+
+    Args:
+        name: Version name used for routing
+        source: Model file or export directory it was loaded from
+        serving_model: Loaded ServingModel
+        batchers: Batching queues bound to serving_model, by queue name
+        load_timings: Seconds spent in each load step
+        fingerprint: Content hash of the model source (None if not computed)
+    """
+
+    def __init__(self, name: str, source: str, serving_model, batchers: dict, load_timings: dict,
+                 fingerprint: str = None):
+        self.name = name
+        self.source = source
+        self.serving_model = serving_model
+        self.batchers = batchers
+        self.load_timings = load_timings
+        self.loaded_at = time.time()
+        # Distinguishes reloads of the same name, e.g. in cache keys
+        self.key = f"{name}@{self.loaded_at:.6f}"
+        # Identifies the weights and runtime across restarts, e.g. in persistent caches
+        self.fingerprint = fingerprint
+        self.model_id = (
+            f"{fingerprint}:{serving_model.runtime}:{serving_model.precision}" if fingerprint else None
+        )
+        self.in_flight = 0
+        self.retired = False
+        self.closed = False
+
+    def describe(self) -> dict:
+        serving_model = self.serving_model
+        return {
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "runtime": serving_model.runtime,
+            "precision": serving_model.precision,
+            "sequence_length": int(serving_model.sequence_length),
+            "img_size": int(serving_model.img_size),
+            "num_classes": int(serving_model.num_classes),
+            "preprocessing": serving_model.preprocessing,
+            "fingerprint": self.fingerprint,
+            "split_backbone": serving_model.is_split,
+            "accuracy_drift": serving_model.drift,
+            "in_flight": self.in_flight,
+            "load_timings": self.load_timings,
+        }
+
+
+class ModelRegistry:
+    """
+    Named model versions with one default.
+
+    Loading runs on an executor so serving continues meanwhile; the new version
+    replaces the old one in a single assignment on the event loop, so every
+    request sees either the old or the new version, never a half-loaded one.
+
+    Args:
+        sources: Version name -> model file or export directory
+        default: Name of the version served when a request does not pick one
+        loader: Blocking callable (name, source) -> (serving_model, load_timings)
+        make_batchers: Callable serving_model -> dict of MicroBatchers
+        fingerprint: Optional blocking callable source -> content hash, run
+            after each load
+    """
+
+    def __init__(self, sources: dict, default: str, loader, make_batchers, fingerprint=None):
+        if default not in sources:
+            raise ValueError(f"Default model version {default!r} is not one of {list(sources)}")
+        self.sources = dict(sources)
+        self.default = default
+        self._loader = loader
+        self._make_batchers = make_batchers
+        self._fingerprint = fingerprint
+        self._versions = {}
+        self._retired = []
+        self._load_locks = {}
+
+    @property
+    def ready(self) -> bool:
+        """True once the default version is loaded"""
+        return self.default in self._versions
+
+    def resolve(self, name: str = None) -> str:
+        """Version name for a request (None = default); KeyError if unknown"""
+        name = name or self.default
+        if name not in self.sources:
+            raise KeyError(name)
+        return name
+
+    def get(self, name: str = None):
+        """Currently loaded version (None if it is not loaded)"""
+        return self._versions.get(self.resolve(name))
+
+    def versions(self) -> dict:
+        return dict(self._versions)
+
+    def retired(self) -> list:
+        """Replaced versions still draining in-flight requests"""
+        return [v for v in self._retired if not v.closed]
+
+    def register(self, name: str, source: str):
+        """Add (or repoint) a version without loading it"""
+        self.sources[name] = source
+
+    async def load(self, name: str, executor=None, force: bool = True, source: str = None):
+        """
+        Load (or reload) a version and swap it in.
+
+        Args:
+            name: Version name
+            executor: Executor for the blocking load (None = default executor)
+            force: Reload even if the version is already loaded
+            source: Load from this model file or export directory instead of
+                the registered one; the version is registered with (or
+                repointed to) it only once the load succeeds
+
+        Returns:
+            The loaded ModelVersion
+        """
+        if source is None:
+            name = self.resolve(name)
+        lock = self._load_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if not force and name in self._versions:
+                return self._versions[name]
+            loop = asyncio.get_running_loop()
+            source = source or self.sources[name]
+            serving_model, load_timings = await loop.run_in_executor(executor, self._loader, name, source)
+            fingerprint = None
+            if self._fingerprint is not None:
+                fingerprint = await loop.run_in_executor(executor, self._fingerprint, source)
+
+            version = ModelVersion(
+                name, source, serving_model, self._make_batchers(serving_model), load_timings, fingerprint
+            )
+            for batcher in version.batchers.values():
+                batcher.start()
+
+            self.sources[name] = source
+            previous = self._versions.get(name)
+            self._versions[name] = version
+            if previous is not None:
+                await self._retire(previous)
+            return version
+
+    async def ensure_loaded(self, name: str = None, executor=None):
+        """Return the loaded version, loading it first if needed"""
+        name = self.resolve(name)
+        version = self._versions.get(name)
+        if version is None:
+            version = await self.load(name, executor, force=False)
+        return version
+
+    def set_default(self, name: str):
+        """Atomically route default traffic to another loaded version"""
+        name = self.resolve(name)
+        if name not in self._versions:
+            raise LookupError(f"Model version {name!r} is not loaded")
+        self.default = name
+
+    async def unload(self, name: str):
+        """Retire a loaded version; its weights are freed once it drains"""
+        name = self.resolve(name)
+        if name == self.default:
+            raise ValueError("Cannot unload the default model version")
+        version = self._versions.pop(name, None)
+        if version is not None:
+            await self._retire(version)
+
+    @asynccontextmanager
+    async def acquire(self, name: str = None):
+        """
+        Lease a loaded version for the duration of a request.
+
+        The lease pins the version: if it is replaced meanwhile, the request
+        still finishes on it and the old weights are only dropped afterwards.
+        """
+        version = self.get(name)
+        if version is None:
+            raise LookupError(f"Model version {self.resolve(name)!r} is not loaded")
+        version.in_flight += 1
+        try:
+            yield version
+        finally:
+            version.in_flight -= 1
+            if version.retired and version.in_flight == 0:
+                await self._close(version)
+
+    async def close(self):
+        """Stop every version (server shutdown)"""
+        for version in list(self._versions.values()) + self._retired:
+            await self._close(version)
+        self._versions.clear()
+        self._retired.clear()
+
+    async def _retire(self, version: ModelVersion):
+        version.retired = True
+        if version.in_flight == 0:
+            await self._close(version)
+        else:
+            self._retired.append(version)
+            print(f"Model version {version.name} retired, draining {version.in_flight} in-flight request(s)")
+
+    async def _close(self, version: ModelVersion):
+        if version.closed:
+            return
+        version.closed = True
+        for batcher in version.batchers.values():
+            await batcher.stop()
+        version.batchers = {}
+        version.serving_model = None
+        if version in self._retired:
+            self._retired.remove(version)
+        gc.collect()
+        print(f"Model version {version.key} unloaded")
@@ -0,0 +1,55 @@
+"""
+Run metadata for benchmark and offline reports
+Git commit of the checkout and process memory, without Unix-only imports at
+module level so every script importing it also runs on Windows
+"""
+
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def git_commit() -> str:
+    """Short hash of the checked-out commit ("unknown" outside a git checkout)"""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def process_memory_mb(pid: int = None) -> dict:
+    """
+    Current and peak resident memory of a process.
+
+    Reads /proc on Linux and falls back to getrusage for this process
+    elsewhere on Unix; returns {} where neither is available (Windows).
+
+    Args:
+        pid: Process to inspect (None = this process)
+
+    Returns:
+        rss_mb and peak_rss_mb, or only peak_rss_mb from getrusage
+    """
+    path = f"/proc/{pid or 'self'}/status"
+    try:
+        values = {}
+        with open(path) as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key, amount, _ = line.split()
+                    values[key.rstrip(":")] = int(amount) / 1024.0
+        return {"rss_mb": round(values.get("VmRSS", 0.0), 1), "peak_rss_mb": round(values.get("VmHWM", 0.0), 1)}
+    except OSError:
+        if pid is not None:
+            return {}
+    try:
+        import resource
+    except ImportError:
+        return {}
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    return {"peak_rss_mb": round(peak / scale, 1)}
@@ -0,0 +1,175 @@
+"""
+Alternative inference runtimes
+Serve the exported backbone/head graphs with TFLite or ONNX Runtime instead of Keras
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from serving_model import ServingModel, normalize
+
+RUNTIMES = ["keras", "tflite", "onnx"]
+PRECISIONS = ["float32", "int8"]
+
+METADATA_FILE = "metadata.json"
+RUNTIME_EXTENSIONS = {"tflite": ".tflite", "onnx": ".onnx"}
+
+
+def export_paths(export_dir: str, runtime: str, precision: str) -> tuple:
+    """
+    File names used by export_models.py for one runtime/precision variant.
+
+    Returns:
+        (backbone_path, head_path)
+    """
+    extension = RUNTIME_EXTENSIONS[runtime]
+    return (
+        os.path.join(export_dir, f"backbone_{precision}{extension}"),
+        os.path.join(export_dir, f"head_{precision}{extension}"),
+    )
+
+
+def read_metadata(export_dir: str) -> dict:
+    """Load the input spec and drift report written next to the exported graphs"""
+    path = os.path.join(export_dir, METADATA_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Export metadata not found at {path}. Run export_models.py first.")
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_tflite_interpreter(path: str, num_threads: int = None):
+    """Create a TFLite interpreter, preferring the standalone runtime packages over full TensorFlow"""
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path, num_threads=num_threads)
+
+
+class TFLiteRunner:
+    """
+    Runs one .tflite graph.
+
+    Graphs exported with a dynamic batch dimension are resized to each incoming
+    batch; graphs with a fixed batch of 1 (the LSTM head) are invoked row by row.
+    Fully quantized graphs (int8 input and output) take and return float32:
+    inputs are quantized and outputs dequantized with the graph's own scale
+    and zero point. Interpreters are not thread-safe, so calls are serialised.
+    """
+
+    def __init__(self, path: str, num_threads: int = None):
+        self.interpreter = load_tflite_interpreter(path, num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.fixed_batch = int(self._input["shape_signature"][0]) != -1
+        self._batch_size = int(self._input["shape"][0])
+        self._lock = threading.Lock()
+
+    def _invoke(self, x: np.ndarray) -> np.ndarray:
+        if not self.fixed_batch and len(x) != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input["index"], list(x.shape))
+            self.interpreter.allocate_tensors()
+            self._batch_size = len(x)
+        self.interpreter.set_tensor(self._input["index"], x)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output["index"]).copy()
+
+    def _quantize(self, x: np.ndarray) -> np.ndarray:
+        dtype = self._input["dtype"]
+        if not np.issubdtype(dtype, np.integer):
+            return np.ascontiguousarray(x, dtype=dtype)
+        scale, zero_point = self._input["quantization"]
+        limits = np.iinfo(dtype)
+        return np.clip(np.rint(x / scale) + zero_point, limits.min, limits.max).astype(dtype)
+
+    def _dequantize(self, y: np.ndarray) -> np.ndarray:
+        if not np.issubdtype(y.dtype, np.integer):
+            return y
+        scale, zero_point = self._output["quantization"]
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        x = self._quantize(x)
+        with self._lock:
+            if self.fixed_batch:
+                return self._dequantize(np.concatenate([self._invoke(x[i:i + 1]) for i in range(len(x))]))
+            return self._dequantize(self._invoke(x))
+
+
+class OnnxRunner:
+    """Runs one .onnx graph with ONNX Runtime on the CPU"""
+
+    def __init__(self, path: str, num_threads: int = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+        self._output_name = self.session.get_outputs()[0].name
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        return self.session.run([self._output_name], {self._input_name: x})[0]
+
+
+class ExportedModel(ServingModel):
+    """
+    ServingModel backed by graphs written by export_models.py.
+
+    Args:
+        export_dir: Directory holding metadata.json and the exported graphs
+        runtime: "tflite" or "onnx"
+        precision: "float32" or "int8"
+        num_threads: Threads per graph (None = runtime default)
+    """
+
+    def __init__(self, export_dir: str, runtime: str = "tflite", precision: str = "float32",
+                 num_threads: int = None):
+        if runtime not in RUNTIME_EXTENSIONS:
+            raise ValueError(f"Unknown runtime: {runtime}. Allowed: {list(RUNTIME_EXTENSIONS)}")
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}. Allowed: {PRECISIONS}")
+
+        metadata = read_metadata(export_dir)
+        self.model = None
+        self.sequence_length = metadata["sequence_length"]
+        self.img_size = metadata["img_size"]
+        self.num_classes = metadata["num_classes"]
+        self.preprocessing = metadata.get("preprocessing", "mobilenet_v2")
+        self._feature_dim = metadata["feature_dim"]
+
+        self.runtime = runtime
+        self.precision = precision
+        self.drift = metadata.get("drift", {}).get(f"{runtime}_{precision}")
+
+        backbone_path, head_path = export_paths(export_dir, runtime, precision)
+        for path in (backbone_path, head_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Exported graph not found at {path}")
+
+        self.backbone_path = backbone_path
+        runner = TFLiteRunner if runtime == "tflite" else OnnxRunner
+        self.backbone = runner(backbone_path, num_threads)
+        self.head = runner(head_path, num_threads)
+
+    @property
+    def feature_dim(self) -> int:
+        return self._feature_dim
+
+    def extract_features(self, frames: np.ndarray) -> np.ndarray:
+        # Exported graphs take normalized float32 frames
+        return self.backbone(normalize(frames, self.preprocessing))
+
+    def predict_features(self, features: np.ndarray) -> np.ndarray:
+        return self.head(features)
@@ -0,0 +1,333 @@
+"""
+Offline bulk video scoring for the Action Recognition model
+
+Walks a directory of videos and predicts the actions in each one. Three stages
+run at the same time so none of them waits on the others:
+
+- decode: a process pool samples one clip per video (OpenCV releases the GIL
+  only partly, so processes scale where threads do not)
+- inference: decoded clips go through a bounded queue into batched forward passes
+- write: results are appended to the output as each batch finishes
+
+The output doubles as the checkpoint: re-running the same command skips every
+video already in it, so an interrupted run resumes where it stopped. CSV output
+is a single file flushed after every batch; Parquet output is a directory of
+part files, each written atomically (requires pyarrow).
+
+Usage:
+    python score_videos.py ../data/UCF101 --output scores.csv
+    python score_videos.py ../data/UCF101 --output scores.parquet --workers 8 --batch-size 64
+    python score_videos.py ../data/UCF101 --output scores.csv --model ../exports/rebuilt_mobilenet --runtime tflite --precision int8
+"""
+
+import argparse
+import csv
+import json
+import os
+from datetime import datetime, timezone
+from functools import partial
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+from encoding import top_k_indices
+from offline import (CLASS_MAPPING_PATH, DEFAULT_MODEL_PATH, find_videos, load_class_names, load_serving_model,
+                     model_name, print_summary, run_pipeline)
+from runinfo import BACKEND_DIR, git_commit, process_memory_mb
+from video import SAMPLING_MODES
+
+COLUMNS = [
+    "path", "status", "action", "confidence", "top_actions", "top_confidences",
+    "total_frames", "fps", "duration_seconds", "decode_ms", "model", "error",
+]
+
+
+def read_clip(root: str, relative_path: str, sequence_length: int, img_size: int, sampling: str) -> tuple:
+    """Sample one clip (runs in a decode worker process)"""
+    from video import read_video_clip
+
+    return read_video_clip(os.path.join(root, relative_path), sequence_length, img_size, sampling)
+
+
+class CsvSink:
+    """
+    Appends result rows to a CSV file, flushing after every write.
+
+    A run killed mid-write can leave a partial last line; it is cut off when
+    the file is reopened, so the video is simply scored again.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows_written = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._truncate_partial_line()
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=COLUMNS)
+        if new_file:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def _truncate_partial_line(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def done(self) -> dict:
+        """Rows already in the output, by video path"""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, newline="") as f:
+            return {row["path"]: row for row in csv.DictReader(f)}
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+        self._file.flush()
+        self.rows_written += len(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    """
+    Writes result rows as numbered Parquet part files in a directory.
+
+    Rows are buffered and written every `rows_per_part` rows; each part is
+    written to a temporary name and renamed, so a part either exists
+    completely or not at all. Rows still buffered when a run is killed are
+    scored again on resume.
+    """
+
+    def __init__(self, path: str, rows_per_part: int = 1000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self.rows_per_part = max(1, int(rows_per_part))
+        self.rows_written = 0
+        self._buffer = []
+        os.makedirs(path, exist_ok=True)
+        self._next_part = len(self._parts())
+
+    def _parts(self) -> list:
+        return sorted(name for name in os.listdir(self.path) if name.endswith(".parquet"))
+
+    def done(self) -> dict:
+        done = {}
+        for name in self._parts():
+            for row in self._pq.read_table(os.path.join(self.path, name)).to_pylist():
+                done[row["path"]] = row
+        return done
+
+    def write(self, rows: list):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        table = self._pa.Table.from_pylist(self._buffer, schema=self._schema())
+        name = f"part-{self._next_part:05d}.parquet"
+        temporary = os.path.join(self.path, f".{name}.tmp")
+        self._pq.write_table(table, temporary)
+        os.replace(temporary, os.path.join(self.path, name))
+        self._next_part += 1
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def _schema(self):
+        pa = self._pa
+        types = {
+            "confidence": pa.float64(),
+            "total_frames": pa.int64(),
+            "fps": pa.float64(),
+            "duration_seconds": pa.float64(),
+            "decode_ms": pa.float64(),
+        }
+        return pa.schema([(column, types.get(column, pa.string())) for column in COLUMNS])
+
+    def close(self):
+        self._flush()
+
+
+def open_sink(path: str, rows_per_part: int = 1000):
+    if path.endswith(".parquet") or os.path.isdir(path):
+        return ParquetSink(path, rows_per_part)
+    return CsvSink(path)
+
+
+def result_row(relative_path: str, info: dict, decode_seconds: float, model: str,
+               probabilities: np.ndarray = None, error: str = None,
+               class_names: list = None, top_k: int = 5) -> dict:
+    row = {
+        "path": relative_path,
+        "status": "error" if error else "ok",
+        "action": None,
+        "confidence": None,
+        "top_actions": None,
+        "top_confidences": None,
+        "total_frames": info.get("total_frames"),
+        "fps": info.get("fps"),
+        "duration_seconds": info.get("duration_seconds"),
+        "decode_ms": round(decode_seconds * 1000, 2),
+        "model": model,
+        "error": error,
+    }
+    if probabilities is not None:
+        top = top_k_indices(probabilities, top_k).tolist()
+        confidences = [round(float(probabilities[idx]) * 100, 2) for idx in top]
+        row["action"] = class_names[top[0]]
+        row["confidence"] = confidences[0]
+        row["top_actions"] = ";".join(class_names[idx] for idx in top)
+        row["top_confidences"] = ";".join(str(confidence) for confidence in confidences)
+    return row
+
+
+def score_videos(root: str, videos: list, sink, serving_model, class_names: list, model: str,
+                 workers: int = None, batch_size: int = 32, queue_size: int = 64, sampling: str = "uniform",
+                 top_k: int = 5, progress_every: float = 10.0) -> dict:
+    """
+    Score videos through the decode -> inference -> write pipeline (see offline.run_pipeline).
+
+    Args:
+        root: Directory the video paths are relative to
+        videos: Video paths to score
+        sink: CsvSink or ParquetSink receiving the result rows
+        serving_model: Loaded ServingModel
+        class_names: Class names, indexed like the model output
+        model: Written to the model column
+        workers: Decode processes (default: CPU count)
+        batch_size: Clips per forward pass
+        queue_size: Decoded clips buffered between decode and inference
+        sampling: Frame sampling mode, see video.sample_frame_indices
+        top_k: Actions listed per video
+        progress_every: Seconds between progress lines
+
+    Returns:
+        Counts and per-stage timings
+    """
+    def predict(batch):
+        probabilities = serving_model.predict_clips([frames for _, (frames, _), _ in batch])
+        return [
+            result_row(path, info, seconds, model, probs, class_names=class_names, top_k=top_k)
+            for (path, (_, info), seconds), probs in zip(batch, probabilities)
+        ]
+
+    def failed(path, error, seconds):
+        return [result_row(path, {}, seconds, model, error=error)]
+
+    try:
+        return run_pipeline(
+            videos,
+            partial(read_clip, root, sequence_length=serving_model.sequence_length,
+                    img_size=serving_model.img_size, sampling=sampling),
+            predict,
+            sink.write,
+            on_error=failed,
+            workers=workers,
+            batch_size=batch_size,
+            queue_size=queue_size,
+            progress_every=progress_every,
+        )
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score every video in a directory")
+    parser.add_argument("input", help="Directory searched recursively for .mp4 / .avi files")
+    parser.add_argument("--output", required=True,
+                        help="CSV file, or .parquet directory of part files; also the resume checkpoint")
+    parser.add_argument("--model", default=None,
+                        help="Model .keras file or export directory (default: ../rebuilt_mobilenet.keras)")
+    parser.add_argument("--runtime", default="keras", choices=["keras", "tflite", "onnx"])
+    parser.add_argument("--precision", default="float32", choices=["float32", "int8"])
+    parser.add_argument("--threads", type=int, default=None, help="Threads per exported graph")
+    parser.add_argument("--class-mapping", default=CLASS_MAPPING_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--queue-size", type=int, default=64, help="Decoded clips buffered ahead of inference")
+    parser.add_argument("--sampling", default="uniform", choices=SAMPLING_MODES)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rows-per-part", type=int, default=1000, help="Rows per Parquet part file")
+    parser.add_argument("--retry-failed", action="store_true", help="Score videos that failed last time again")
+    parser.add_argument("--overwrite", action="store_true", help="Ignore existing output instead of resuming")
+    parser.add_argument("--summary", default=None,
+                        help="Throughput summary JSON (default: bench_results/score_videos_<timestamp>.json)")
+    args = parser.parse_args()
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    model_path = args.model or DEFAULT_MODEL_PATH
+    model = model_name(model_path, args.runtime, args.precision)
+
+    if args.overwrite and os.path.exists(args.output):
+        if os.path.isdir(args.output):
+            for name in os.listdir(args.output):
+                if name.endswith(".parquet"):
+                    os.remove(os.path.join(args.output, name))
+        else:
+            os.remove(args.output)
+
+    class_names = load_class_names(args.class_mapping)
+    videos = find_videos(args.input)
+    sink = open_sink(args.output, args.rows_per_part)
+    previous = sink.done()
+    skip = {
+        path for path, row in previous.items()
+        if not (args.retry_failed and row["status"] == "error")
+    }
+    if any(row["model"] != model for row in previous.values()):
+        print(f"⚠️ {args.output} contains rows scored by another model; they are kept as they are")
+    todo = [path for path in videos if path not in skip]
+    print(f"📂 {len(videos)} videos found, {len(videos) - len(todo)} already scored, {len(todo)} to go")
+
+    print(f"🧠 Loading {model_path} ({args.runtime}, {args.precision})")
+    serving_model = load_serving_model(model_path, args.runtime, args.precision, args.threads)
+    if serving_model.num_classes != len(class_names):
+        raise ValueError(f"Model predicts {serving_model.num_classes} classes, "
+                         f"{args.class_mapping} lists {len(class_names)}")
+
+    summary = score_videos(
+        args.input, todo, sink, serving_model, class_names, model,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        queue_size=args.queue_size,
+        sampling=args.sampling,
+        top_k=args.top_k,
+    )
+    print_summary(summary)
+
+    output = args.summary or os.path.join(BACKEND_DIR, "bench_results", f"score_videos_{timestamp}.json")
+    report = {
+        "benchmark": "score_videos",
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "input": os.path.abspath(args.input),
+        "output": os.path.abspath(args.output),
+        "model": model,
+        "config": {
+            "workers": summary["stages"]["decode"]["workers"],
+            "batch_size": args.batch_size,
+            "queue_size": args.queue_size,
+            "sampling": args.sampling,
+        },
+        "skipped": len(videos) - len(todo),
+        "peak_rss_mb": process_memory_mb().get("peak_rss_mb"),
+        **summary,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Summary written to {output}")
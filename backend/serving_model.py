@@ -0,0 +1,240 @@
+"""
+Serving wrapper for the LRCN model
+Splits the TimeDistributed CNN backbone from the temporal head so that
+per-frame features are computed once and reused, and takes uint8 frames
+so pixel normalization runs inside the graph
+"""
+
+import numpy as np
+
+
+def preprocessing_for(backbone) -> str:
+    """
+    Name of the pixel preprocessing a backbone expects.
+
+    Keras' EfficientNet models rescale internally and take raw [0, 255] pixels;
+    MobileNetV2 expects inputs scaled to [-1, 1].
+    """
+    return "none" if "efficientnet" in backbone.name.lower() else "mobilenet_v2"
+
+
+def normalize(frames: np.ndarray, preprocessing: str) -> np.ndarray:
+    frames = frames.astype(np.float32)
+    if preprocessing == "mobilenet_v2":
+        frames = frames / 127.5 - 1.0
+    return frames
+
+
+def split_lrcn(model):
+    """
+    Split an LRCN model into a per-frame backbone and a temporal head.
+
+    The model is expected to look like the ones produced by the rebuild scripts:
+    Input -> TimeDistributed(CNN) -> BatchNormalization -> LSTM(s) -> Dense(s)
+
+    Args:
+        model: Loaded Keras LRCN model
+
+    Returns:
+        (backbone, head) where backbone maps (N, H, W, 3) frames to (N, F) features
+        and head maps (B, T, F) feature sequences to (B, num_classes) probabilities
+    """
+    import keras
+
+    td_index = None
+    for i, layer in enumerate(model.layers):
+        if isinstance(layer, keras.layers.TimeDistributed):
+            td_index = i
+            break
+    if td_index is None:
+        raise ValueError("Model has no TimeDistributed backbone layer")
+
+    backbone = model.layers[td_index].layer
+    sequence_length = model.input_shape[1]
+    feature_dim = backbone.output_shape[-1]
+
+    # Re-apply the (shared) head layers on a feature-sequence input
+    head_inputs = keras.Input(shape=(sequence_length, feature_dim), name="features")
+    x = head_inputs
+    for layer in model.layers[td_index + 1:]:
+        x = layer(x)
+    head = keras.Model(inputs=head_inputs, outputs=x, name=f"{model.name}_head")
+
+    return backbone, head
+
+
+class ServingModel:
+    """
+    Wraps a loaded LRCN model for inference.
+
+    Clips are passed as uint8 RGB frame arrays of shape (T, H, W, 3); scaling
+    to the backbone's input range happens inside the graph, so the host never
+    materialises a float32 copy of the pixels. A clip with a single frame (a
+    still image) only runs the backbone once and its feature vector is tiled
+    over the sequence, instead of running the CNN on 12 identical frames.
+
+    Args:
+        model: Loaded Keras LRCN model
+        verify: Check the split model against the full model on a random clip
+        atol: Maximum allowed absolute difference in output probabilities
+    """
+
+    # Reported by /health; overridden by exported-graph runtimes
+    runtime = "keras"
+    precision = "float32"
+    preprocessing = "mobilenet_v2"
+    drift = None
+
+    def __init__(self, model, verify: bool = True, atol: float = 1e-4):
+        self.model = model
+        self.sequence_length = model.input_shape[1]
+        self.img_size = model.input_shape[2]
+        self.num_classes = model.output_shape[-1]
+
+        self.backbone = None
+        self.head = None
+        try:
+            self.backbone, self.head = split_lrcn(model)
+            self.preprocessing = preprocessing_for(self.backbone)
+            self._build_serving_functions()
+            if verify:
+                self.verify_split(atol)
+        except Exception as e:
+            print(f"Warning: Could not split model, using full TimeDistributed pass: {e}")
+            self.backbone, self.head = None, None
+
+    @property
+    def is_split(self) -> bool:
+        return self.head is not None
+
+    @property
+    def feature_dim(self) -> int:
+        return self.backbone.output_shape[-1] if self.backbone is not None else 0
+
+    def _build_serving_functions(self):
+        """
+        Wrap backbone and head in tf.functions with a fixed input signature.
+
+        The batch dimension is left open, so every batch size the batching
+        queue produces reuses one traced graph instead of retracing per shape.
+        The backbone takes uint8 pixels and normalizes them in the graph.
+        """
+        import tensorflow as tf
+
+        backbone, head = self.backbone, self.head
+        preprocessing = self.preprocessing
+
+        def backbone_fn(frames):
+            pixels = tf.cast(frames, tf.float32)
+            if preprocessing == "mobilenet_v2":
+                pixels = pixels / 127.5 - 1.0
+            return backbone(pixels, training=False)
+
+        self._backbone_fn = tf.function(
+            backbone_fn,
+            input_signature=[tf.TensorSpec([None, self.img_size, self.img_size, 3], tf.uint8)]
+        )
+        self._head_fn = tf.function(
+            lambda features: head(features, training=False),
+            input_signature=[tf.TensorSpec([None, self.sequence_length, self.feature_dim], tf.float32)]
+        )
+
+    def warmup(self):
+        """Trace and run the inference graphs once so the first request is not slow"""
+        frame = np.zeros((1, self.img_size, self.img_size, 3), dtype=np.uint8)
+        clip = np.zeros((self.sequence_length, self.img_size, self.img_size, 3), dtype=np.uint8)
+        self.predict_clips([frame])
+        self.predict_clips([frame, clip])
+
+    def verify_split(self, atol: float = 1e-4):
+        """Raise if the backbone + head outputs differ from the full model"""
+        rng = np.random.default_rng(0)
+        clip = rng.integers(0, 256, (self.sequence_length, self.img_size, self.img_size, 3), dtype=np.uint8)
+
+        # An eager call avoids tracing the full TimeDistributed graph, which is
+        # only needed here and dominates startup time
+        expected = self.model(normalize(clip, self.preprocessing)[np.newaxis], training=False)
+        features = self.extract_features(clip)
+        actual = self.predict_features(features[np.newaxis])
+
+        max_diff = float(np.max(np.abs(np.asarray(expected) - actual)))
+        if max_diff > atol:
+            raise ValueError(f"Split model output differs by {max_diff:.2e} (tolerance {atol:.0e})")
+        print(f"Split model verified (max abs diff {max_diff:.2e})")
+
+    def extract_features(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Run the CNN backbone on a stack of frames.
+
+        Args:
+            frames: uint8 RGB frames with shape (N, H, W, 3)
+
+        Returns:
+            Features with shape (N, feature_dim)
+        """
+        return self._backbone_fn(frames).numpy()
+
+    def predict_features(self, features: np.ndarray) -> np.ndarray:
+        """
+        Run the temporal head on feature sequences.
+
+        Args:
+            features: Features with shape (B, sequence_length, feature_dim)
+
+        Returns:
+            Probabilities with shape (B, num_classes)
+        """
+        return self._head_fn(np.asarray(features, dtype=np.float32)).numpy()
+
+    def tile_features(self, features: np.ndarray) -> np.ndarray:
+        """Repeat per-frame features of a short clip to fill the sequence length"""
+        if len(features) == self.sequence_length:
+            return features
+        if len(features) == 1:
+            return np.repeat(features, self.sequence_length, axis=0)
+        raise ValueError(f"Expected 1 or {self.sequence_length} frames, got {len(features)}")
+
+    def predict_clips(self, clips: list) -> np.ndarray:
+        """
+        Predict a batch of clips with a single backbone and a single head call.
+
+        Args:
+            clips: List of uint8 frame arrays with shape (1 or 12, H, W, 3)
+
+        Returns:
+            Probabilities with shape (len(clips), num_classes)
+        """
+        return self.predict_clips_with_features(clips)[0]
+
+    def predict_clips_with_features(self, clips: list) -> tuple:
+        """
+        Like predict_clips, but also return the backbone features of each clip.
+
+        Args:
+            clips: List of uint8 frame arrays with shape (1 or 12, H, W, 3)
+
+        Returns:
+            (probabilities with shape (len(clips), num_classes), list of
+            per-clip features with shape (frames, feature_dim)); the features
+            are None for a model that could not be split
+        """
+        if not self.is_split:
+            sequences = [
+                np.repeat(clip, self.sequence_length, axis=0) if len(clip) == 1 else clip
+                for clip in clips
+            ]
+            probabilities = np.asarray(self.model.predict_on_batch(normalize(np.stack(sequences), self.preprocessing)))
+            return probabilities, [None] * len(clips)
+
+        # One backbone pass over every frame of every clip
+        frames = np.concatenate(clips, axis=0)
+        features = self.extract_features(frames)
+
+        clip_features = []
+        offset = 0
+        for clip in clips:
+            clip_features.append(features[offset:offset + len(clip)])
+            offset += len(clip)
+
+        sequences = [self.tile_features(f) for f in clip_features]
+        return self.predict_features(np.stack(sequences)), clip_features
@@ -0,0 +1,80 @@
+"""
+Live-stream inference state
+Per-connection ring buffer of backbone features and a drop-oldest frame slot
+"""
+
+import asyncio
+from collections import deque
+
+import numpy as np
+
+
+class LatestFrameSlot:
+    """
+    Single-slot mailbox between the WebSocket reader and the inference loop.
+
+    Putting a frame while the previous one has not been taken replaces it, so a
+    client that sends faster than we can infer has its stale frames dropped
+    instead of queueing unbounded work.
+    """
+
+    def __init__(self):
+        self._frame = None
+        self._event = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._event.set()
+
+    def close(self):
+        self._closed = True
+        self._event.set()
+
+    async def get(self):
+        """Wait for the newest frame (None once the slot is closed and empty)"""
+        while self._frame is None:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        frame, self._frame = self._frame, None
+        return frame
+
+
+class FeatureWindow:
+    """
+    Rolling window of per-frame backbone features for one stream.
+
+    Each new frame only costs one backbone pass; the temporal head is
+    re-evaluated over the last `sequence_length` features.
+
+    Args:
+        sequence_length: Number of frames the temporal head expects
+    """
+
+    def __init__(self, sequence_length: int = 12):
+        self.sequence_length = sequence_length
+        self._features = deque(maxlen=sequence_length)
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def push(self, feature: np.ndarray):
+        self._features.append(feature)
+
+    def window(self) -> np.ndarray:
+        """
+        Current feature sequence with shape (sequence_length, feature_dim).
+
+        Until the buffer is full the oldest feature is repeated at the front,
+        which matches how a still image is tiled over the sequence.
+        """
+        features = list(self._features)
+        padding = [features[0]] * (self.sequence_length - len(features))
+        return np.stack(padding + features)
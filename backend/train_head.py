@@ -0,0 +1,330 @@
+"""
+Head-only training on cached backbone features
+
+Fits or fine-tunes the temporal head of an LRCN model (BatchNormalization ->
+LSTM(s) -> Dense(s), everything after the frozen TimeDistributed backbone) on
+per-frame features from a FeatureStore (see extract_features.py). No video is
+decoded and the CNN never runs, so an epoch over UCF101 takes seconds to
+minutes on a CPU instead of hours.
+
+Training clips are drawn with a tf.data pipeline: videos are shuffled every
+epoch, each one contributes a clip with one randomly placed frame per temporal
+segment (TSN-style jitter), and clips are gathered from the memory-mapped store
+in parallel, batched and prefetched. Validation clips use the uniform sampling
+of /predict/video. Videos whose UCF101 group (the gNN in v_Class_gNN_cMM) is
+shared stay on the same side of the split, so near-duplicate clips never leak
+into validation.
+
+The trained head is written back into the full model, which is saved as a
+.keras file that main.py serves like any other (MODEL_PATH=...).
+
+Usage:
+    python train_head.py ../features/ucf101 --output ../rebuilt_mobilenet_finetuned.keras
+    python train_head.py ../features/ucf101 --output ../head_scratch.keras --from-scratch --epochs 40 --learning-rate 1e-3
+    python train_head.py ../features/ucf101 --output ../finetuned_split1.keras --val-groups 1 2 3 4 5 6 7
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+
+os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+
+import numpy as np
+
+from feature_store import FeatureStore, backbone_fingerprint
+from offline import CLASS_MAPPING_PATH, DEFAULT_MODEL_PATH, load_class_names, load_serving_model
+from runinfo import BACKEND_DIR, git_commit, process_memory_mb
+
+# UCF101 file names: v_<Class>_g<group>_c<clip>; clips of one group come from the same long video
+GROUP_PATTERN = re.compile(r"_g(\d+)_c\d+", re.IGNORECASE)
+
+
+def video_group(video_id: str) -> tuple:
+    """
+    Split key and UCF101 group number of a video.
+
+    Returns:
+        ("<dir>/v_<Class>_g<group>", group) for UCF101 names, else (video_id, None)
+    """
+    name = os.path.basename(video_id)
+    match = GROUP_PATTERN.search(name)
+    if match is None:
+        return video_id, None
+    group = int(match.group(1))
+    return f"{os.path.dirname(video_id)}/{name[:match.start()]}_g{group:02d}", group
+
+
+def split_videos(video_ids: list, val_fraction: float = 0.2, val_groups: list = None) -> tuple:
+    """
+    Split videos into training and validation sets without sharing groups.
+
+    Args:
+        video_ids: Video ids from the store
+        val_fraction: Share of groups used for validation (hash-based, stable across runs)
+        val_groups: UCF101 group numbers used for validation instead (e.g. 1-7 for split 1)
+
+    Returns:
+        (train_ids, val_ids)
+    """
+    train, val = [], []
+    for video_id in video_ids:
+        key, group = video_group(video_id)
+        if val_groups:
+            is_val = group in val_groups
+        else:
+            is_val = zlib.crc32(key.encode()) % 10000 < val_fraction * 10000
+        (val if is_val else train).append(video_id)
+    return train, val
+
+
+def clip_positions(count: int, sequence_length: int, jitter: np.ndarray = None) -> np.ndarray:
+    """
+    Rows of a video's stored frames that make up one clip.
+
+    Args:
+        count: Frames stored for the video
+        sequence_length: Frames per clip
+        jitter: Position inside each of the `sequence_length` equal segments
+            (0-1 per segment); None samples uniformly like video.sample_frame_indices
+
+    Returns:
+        Integer array with shape (sequence_length,)
+    """
+    if jitter is None:
+        positions = np.linspace(0, count - 1, sequence_length)
+    else:
+        positions = (np.arange(sequence_length) + jitter) * (count / sequence_length)
+    return np.clip(np.floor(positions).astype(np.int64), 0, count - 1)
+
+
+def clip_dataset(store: FeatureStore, video_ids: list, labels: list, sequence_length: int, batch_size: int,
+                 training: bool, seed: int = None):
+    """
+    tf.data pipeline of (features, label) batches read from the store.
+
+    Args:
+        store: Feature store holding the videos
+        video_ids: Videos to read
+        labels: Class index of each video
+        sequence_length: Frames per clip
+        batch_size: Clips per batch
+        training: Shuffle every epoch and jitter the sampled frames
+        seed: Shuffle and jitter seed
+
+    Returns:
+        tf.data.Dataset of ((batch, sequence_length, feature_dim) float32, (batch,) int32)
+    """
+    import tensorflow as tf
+
+    feature_dim = store.feature_dim
+
+    def load(index, jitter):
+        features = store.features(video_ids[int(index)])
+        positions = clip_positions(len(features), sequence_length, jitter if training else None)
+        return np.asarray(features[positions], dtype=np.float32)
+
+    def read_clip(index, label):
+        jitter = tf.random.uniform([sequence_length], seed=seed)
+        features = tf.numpy_function(load, [index, jitter], tf.float32)
+        return tf.ensure_shape(features, (sequence_length, feature_dim)), label
+
+    dataset = tf.data.Dataset.from_tensor_slices((np.arange(len(video_ids)), np.asarray(labels, dtype=np.int32)))
+    if training:
+        dataset = dataset.shuffle(len(video_ids), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.map(read_clip, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    dataset = dataset.batch(batch_size, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def train_head(serving_model, store: FeatureStore, train: tuple, val: tuple = None, from_scratch: bool = False,
+               epochs: int = 20, batch_size: int = 64, learning_rate: float = None, patience: int = 5,
+               seed: int = 0) -> dict:
+    """
+    Train a copy of the model's head and write its weights back into the model.
+
+    Args:
+        serving_model: ServingModel of the model to retrain (must be split)
+        store: Feature store made with the same backbone
+        train: (video_ids, labels) to train on
+        val: (video_ids, labels) for validation and early stopping (None = none)
+        from_scratch: Re-initialise the head instead of fine-tuning it
+        epochs: Maximum epochs
+        batch_size: Clips per batch
+        learning_rate: Adam learning rate (default 1e-3 from scratch, 1e-4 fine-tuning)
+        patience: Epochs without validation improvement before stopping (0 = never stop early)
+        seed: Seed for initialisation, shuffling and jitter
+
+    Returns:
+        Training history and timings
+    """
+    import keras
+
+    keras.utils.set_random_seed(seed)
+    head = keras.models.clone_model(serving_model.head)
+    if not from_scratch:
+        head.set_weights(serving_model.head.get_weights())
+    head.compile(
+        optimizer=keras.optimizers.Adam(learning_rate or (1e-3 if from_scratch else 1e-4)),
+        loss=keras.losses.SparseCategoricalCrossentropy(),
+        metrics=[
+            keras.metrics.SparseCategoricalAccuracy(name="top1"),
+            keras.metrics.SparseTopKCategoricalAccuracy(k=5, name="top5"),
+        ],
+    )
+
+    sequence_length = serving_model.sequence_length
+    train_data = clip_dataset(store, *train, sequence_length, batch_size, training=True, seed=seed)
+    val_data = clip_dataset(store, *val, sequence_length, batch_size, training=False) if val and val[0] else None
+    callbacks = []
+    if val_data is not None and patience:
+        callbacks.append(keras.callbacks.EarlyStopping(
+            monitor="val_loss", patience=patience, restore_best_weights=True, verbose=1
+        ))
+
+    started = time.perf_counter()
+    history = head.fit(train_data, validation_data=val_data, epochs=epochs, callbacks=callbacks, verbose=2)
+    elapsed = time.perf_counter() - started
+
+    # The serving head shares its layers with the full model, so this updates the model
+    serving_model.head.set_weights(head.get_weights())
+    epochs_run = len(history.history["loss"])
+    return {
+        "epochs": epochs_run,
+        "best_epoch": callbacks[0].best_epoch + 1 if callbacks else epochs_run,
+        "elapsed_seconds": round(elapsed, 3),
+        "seconds_per_epoch": round(elapsed / epochs_run, 3) if epochs_run else 0.0,
+        "clips_per_second": round(len(train[0]) * epochs_run / elapsed, 1) if elapsed else 0.0,
+        "history": {name: [round(float(value), 5) for value in values] for name, values in history.history.items()},
+    }
+
+
+def evaluate_from_store(serving_model, store: FeatureStore, video_ids: list, labels: list,
+                        batch_size: int = 256) -> dict:
+    """Top-1 / top-5 accuracy of a model's head on uniformly sampled stored clips"""
+    hits1 = hits5 = 0
+    for start in range(0, len(video_ids), batch_size):
+        batch_ids = video_ids[start:start + batch_size]
+        clips = np.stack([store.clip(video_id, serving_model.sequence_length) for video_id in batch_ids])
+        probabilities = serving_model.predict_features(clips)
+        top5 = np.argsort(-probabilities, axis=1)[:, :5]
+        batch_labels = np.asarray(labels[start:start + batch_size])
+        hits1 += int(np.sum(top5[:, 0] == batch_labels))
+        hits5 += int(np.sum(np.any(top5 == batch_labels[:, np.newaxis], axis=1)))
+    count = len(video_ids)
+    return {
+        "clips": count,
+        "top1": round(hits1 / count, 4) if count else None,
+        "top5": round(hits5 / count, 4) if count else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train an LRCN head on cached backbone features")
+    parser.add_argument("store", help="Feature store directory written by extract_features.py")
+    parser.add_argument("--output", required=True, help="Trained model (.keras), servable with MODEL_PATH")
+    parser.add_argument("--model", default=None,
+                        help="Model providing the backbone and initial head (default: ../rebuilt_mobilenet.keras)")
+    parser.add_argument("--class-mapping", default=CLASS_MAPPING_PATH)
+    parser.add_argument("--from-scratch", action="store_true", help="Re-initialise the head instead of fine-tuning")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--learning-rate", type=float, default=None,
+                        help="Default: 1e-3 from scratch, 1e-4 when fine-tuning")
+    parser.add_argument("--patience", type=int, default=5, help="Early stopping patience in epochs (0 = off)")
+    parser.add_argument("--val-fraction", type=float, default=0.2, help="Share of video groups held out")
+    parser.add_argument("--val-groups", type=int, nargs="+", default=None,
+                        help="UCF101 group numbers held out instead (split 1: 1 2 3 4 5 6 7)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--summary", default=None,
+                        help="Training summary JSON (default: bench_results/train_head_<timestamp>.json)")
+    args = parser.parse_args()
+
+    if not args.output.endswith(".keras"):
+        raise ValueError("--output must be a .keras file")
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    model_path = args.model or DEFAULT_MODEL_PATH
+    class_names = load_class_names(args.class_mapping)
+
+    print(f"🧠 Loading {model_path}")
+    serving_model = load_serving_model(model_path)
+    if not serving_model.is_split:
+        raise ValueError(f"{model_path} could not be split into backbone and head")
+    if serving_model.num_classes != len(class_names):
+        raise ValueError(f"Model predicts {serving_model.num_classes} classes, "
+                         f"{args.class_mapping} lists {len(class_names)}")
+    store = FeatureStore(args.store, metadata={
+        "backbone": backbone_fingerprint(serving_model),
+        "feature_dim": serving_model.feature_dim,
+        "img_size": serving_model.img_size,
+    })
+
+    class_index = {name: index for index, name in enumerate(class_names)}
+    labelled = [video_id for video_id, entry in store.videos.items() if entry.get("label") in class_index]
+    if len(labelled) < len(store):
+        print(f"⚠️ {len(store) - len(labelled)} videos without a known label are skipped")
+    train_ids, val_ids = split_videos(sorted(labelled), args.val_fraction, args.val_groups)
+    if not train_ids:
+        raise ValueError("No labelled training videos in the store")
+    train = (train_ids, [class_index[store.videos[video_id]["label"]] for video_id in train_ids])
+    val = (val_ids, [class_index[store.videos[video_id]["label"]] for video_id in val_ids])
+    print(f"📂 {len(train_ids)} training and {len(val_ids)} validation videos "
+          f"over {len(set(train[1]) | set(val[1]))} classes")
+
+    before = evaluate_from_store(serving_model, store, *val) if val_ids else None
+    result = train_head(
+        serving_model, store, train, val,
+        from_scratch=args.from_scratch,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        learning_rate=args.learning_rate,
+        patience=args.patience,
+        seed=args.seed,
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    serving_model.model.save(args.output)
+
+    # Reload the way the server does: split, verify against the full model, warm up
+    reloaded = load_serving_model(args.output)
+    after = evaluate_from_store(reloaded, store, *val) if val_ids else None
+    print(f"✅ {result['epochs']} epochs (best: {result['best_epoch']}) in {result['elapsed_seconds']}s "
+          f"({result['seconds_per_epoch']}s/epoch, {result['clips_per_second']} clips/s)")
+    if val_ids:
+        print(f"  validation top-1 {before['top1']:.1%} -> {after['top1']:.1%}, "
+              f"top-5 {before['top5']:.1%} -> {after['top5']:.1%}")
+    print(f"✅ Model saved to {args.output}")
+
+    output = args.summary or os.path.join(BACKEND_DIR, "bench_results", f"train_head_{timestamp}.json")
+    report = {
+        "benchmark": "train_head",
+        "timestamp": timestamp,
+        "commit": git_commit(),
+        "store": os.path.abspath(args.store),
+        "base_model": os.path.abspath(model_path),
+        "output": os.path.abspath(args.output),
+        "config": {
+            "from_scratch": args.from_scratch,
+            "epochs": args.epochs,
+            "batch_size": args.batch_size,
+            "learning_rate": args.learning_rate,
+            "patience": args.patience,
+            "val_fraction": args.val_fraction,
+            "val_groups": args.val_groups,
+            "seed": args.seed,
+        },
+        "train_videos": len(train_ids),
+        "val_videos": len(val_ids),
+        "val_before": before,
+        "val_after": after,
+        "peak_rss_mb": process_memory_mb().get("peak_rss_mb"),
+        **result,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Summary written to {output}")
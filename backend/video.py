@@ -0,0 +1,226 @@
+"""
+Video decoding for the Action Recognition API
+Streams frames out of a video file with OpenCV and keeps only the sampled ones
+"""
+
+import threading
+
+import cv2
+import numpy as np
+
+# Upload types accepted by the video endpoints
+VIDEO_CONTENT_TYPES = [
+    "video/mp4",
+    "video/avi",
+    "video/x-msvideo",
+    "video/msvideo",
+]
+VIDEO_EXTENSIONS = [".mp4", ".avi"]
+
+# Seeking restarts decoding at the previous keyframe, so it only pays off
+# when the next sampled frame is further away than this many frames
+SEEK_THRESHOLD = 30
+
+SAMPLING_MODES = ["uniform", "segment"]
+
+
+def sample_frame_indices(num_frames: int, sequence_length: int = 12, mode: str = "uniform") -> list:
+    """
+    Pick which frames of a video make up the model's input sequence.
+
+    Args:
+        num_frames: Total number of frames in the video
+        sequence_length: Number of frames the model expects
+        mode: "uniform" spreads frames evenly from first to last frame,
+              "segment" splits the video into equal segments and takes the
+              centre frame of each (TSN-style sampling)
+
+    Returns:
+        List of `sequence_length` frame indices in ascending order
+    """
+    if num_frames <= 0:
+        raise ValueError("Video has no frames")
+
+    if mode == "uniform":
+        indices = np.linspace(0, num_frames - 1, sequence_length)
+    elif mode == "segment":
+        segment = num_frames / sequence_length
+        indices = (np.arange(sequence_length) + 0.5) * segment
+    else:
+        raise ValueError(f"Unknown sampling mode: {mode}. Allowed: {SAMPLING_MODES}")
+
+    indices = np.clip(np.floor(indices).astype(int), 0, num_frames - 1)
+    return indices.tolist()
+
+
+def prepare_frame(frame: np.ndarray, img_size: int = 128) -> np.ndarray:
+    """Convert an OpenCV BGR frame into resized uint8 RGB pixels"""
+    frame = cv2.resize(frame, (img_size, img_size), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def count_frames(capture) -> int:
+    """Number of frames reported by the container (0 if unknown)"""
+    return max(0, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+
+
+def read_frames(capture, indices: list, img_size: int = 128) -> np.ndarray:
+    """
+    Decode only the requested frames from an open capture.
+
+    Frames between two sampled indices are skipped with `grab()` (no colour
+    conversion or copy), and long gaps are skipped by seeking, so memory only
+    ever holds the sampled frames.
+
+    Args:
+        capture: Open cv2.VideoCapture positioned at frame 0
+        indices: Frame indices to keep (any order, duplicates allowed)
+        img_size: Output frame size
+
+    Returns:
+        uint8 RGB frames with shape (len(indices), img_size, img_size, 3)
+    """
+    wanted = sorted(set(indices))
+    decoded = {}
+    position = 0
+    last_frame = None
+
+    for index in wanted:
+        gap = index - position
+        if gap > SEEK_THRESHOLD:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            position = index
+        else:
+            while position < index and capture.grab():
+                position += 1
+
+        ok, frame = capture.read()
+        if not ok:
+            # Container over-reported its length; reuse the last good frame
+            break
+        position += 1
+        last_frame = prepare_frame(frame, img_size)
+        decoded[index] = last_frame
+
+    if last_frame is None:
+        raise ValueError("Could not decode any frames from video")
+
+    return np.stack([decoded.get(i, last_frame) for i in indices])
+
+
+def read_video_clip(path: str, sequence_length: int = 12, img_size: int = 128,
+                    mode: str = "uniform") -> tuple:
+    """
+    Sample a fixed-length clip from a video file.
+
+    Args:
+        path: Path to the video file
+        sequence_length: Number of frames to sample
+        img_size: Output frame size
+        mode: Sampling mode, see `sample_frame_indices`
+
+    Returns:
+        (frames, info) where frames is a uint8 array with shape
+        (sequence_length, img_size, img_size, 3) and info describes the video
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("Could not open video file")
+
+    try:
+        num_frames = count_frames(capture)
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+
+        if num_frames == 0:
+            # Length unknown: count by grabbing (no frames are kept), then rewind
+            while capture.grab():
+                num_frames += 1
+            capture.release()
+            capture = cv2.VideoCapture(path)
+
+        indices = sample_frame_indices(num_frames, sequence_length, mode)
+        frames = read_frames(capture, indices, img_size)
+    finally:
+        capture.release()
+
+    info = {
+        "total_frames": num_frames,
+        "fps": round(float(fps), 3),
+        "duration_seconds": round(num_frames / fps, 3) if fps else None,
+        "sampling": mode,
+        "frame_indices": indices,
+    }
+    return frames, info
+
+
+class SampledFrameReader:
+    """
+    Sequential reader that keeps every `step`-th frame of a long video.
+
+    Frames are decoded in chunks on demand, so a video of any length is
+    processed in constant memory; skipped frames are only grabbed. `read`
+    and `close` may be called from different threads.
+
+    Args:
+        path: Path to the video file
+        sample_fps: Frames per second to keep (the video's own rate if higher)
+        img_size: Output frame size
+    """
+
+    def __init__(self, path: str, sample_fps: float, img_size: int = 128):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError("Could not open video file")
+        self.img_size = img_size
+        self.total_frames = count_frames(self.capture)
+        # Containers without a frame rate are assumed to be 25 fps
+        self.fps = float(self.capture.get(cv2.CAP_PROP_FPS) or 0.0) or 25.0
+        self.step = max(1, int(round(self.fps / sample_fps))) if sample_fps > 0 else 1
+        self.position = 0
+        self.finished = False
+        self._lock = threading.Lock()
+
+    @property
+    def sample_fps(self) -> float:
+        return self.fps / self.step
+
+    @property
+    def total_samples(self) -> int:
+        """Frames this reader will return (0 if the container does not know its length)"""
+        return -(-self.total_frames // self.step) if self.total_frames else 0
+
+    def read(self, count: int) -> tuple:
+        """
+        Decode the next `count` sampled frames.
+
+        Returns:
+            (indices, frames): source frame indices and uint8 RGB frames with
+            shape (n, img_size, img_size, 3); n < count only at the end
+        """
+        indices, frames = [], []
+        with self._lock:
+            self._read(count, indices, frames)
+        if not frames:
+            return [], np.zeros((0, self.img_size, self.img_size, 3), dtype=np.uint8)
+        return indices, np.stack(frames)
+
+    def _read(self, count: int, indices: list, frames: list):
+        while len(frames) < count and not self.finished:
+            ok, frame = self.capture.read()
+            if not ok:
+                self.finished = True
+                break
+            indices.append(self.position)
+            frames.append(prepare_frame(frame, self.img_size))
+            self.position += 1
+            # Skip to the next sampled frame without decoding into Python
+            for _ in range(self.step - 1):
+                if not self.capture.grab():
+                    self.finished = True
+                    break
+                self.position += 1
+
+    def close(self):
+        with self._lock:
+            self.finished = True
+            self.capture.release()